@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+index.html 変換エンジンのベンチマーク
+- 従来の逐次 re.sub チェーンとトリガー走査エンジンの出力がバイト一致することを確認
+- 両者の処理時間を計測して高速化率を表示
+
+使い方: python3 bench_index_transform.py [--file index.html] [--repeat 200]
+"""
+
+import argparse
+import sys
+import time
+
+from create_package import transform_index_html, transform_index_html_sequential
+
+
+def measure(func, content, repeat):
+    """func(content) を repeat 回実行し、1回あたりの最良・平均時間（秒）を返す"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(content)
+        timings.append(time.perf_counter() - start)
+    return min(timings), sum(timings) / len(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="index.html 変換エンジンのベンチマーク")
+    parser.add_argument("--file", default="index.html", help="入力HTML（デフォルト: index.html）")
+    parser.add_argument("--repeat", type=int, default=200, help="計測回数（デフォルト: 200）")
+    args = parser.parse_args()
+
+    with open(args.file, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    expected = transform_index_html_sequential(content).encode("utf-8")
+    actual = transform_index_html(content).encode("utf-8")
+    if expected != actual:
+        print(f"❌ 出力が一致しません: 従来 {len(expected)} bytes / 変換エンジン {len(actual)} bytes")
+        return 1
+    print(f"✅ 出力バイト一致: {len(content.encode('utf-8'))} → {len(actual)} bytes")
+
+    legacy_best, legacy_mean = measure(transform_index_html_sequential, content, args.repeat)
+    engine_best, engine_mean = measure(transform_index_html, content, args.repeat)
+
+    print(f"📊 {args.file} × {args.repeat}回")
+    print(f"   従来（逐次 re.sub）: best {legacy_best * 1000:.3f} ms / mean {legacy_mean * 1000:.3f} ms")
+    print(f"   トリガー走査エンジン : best {engine_best * 1000:.3f} ms / mean {engine_mean * 1000:.3f} ms")
+    print(f"⚡ 高速化: {legacy_best / engine_best:.1f}x (best) / {legacy_mean / engine_mean:.1f}x (mean)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
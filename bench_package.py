@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+商用パッケージ生成のスケーリングベンチマーク
+- 実際の assets/ を N 倍に複製した合成アセットツリーを一時ディレクトリに作成
+- 各ツリーで create_commercial_package と validate_package をステージ計測付きで実行
+- ステージごとの処理時間が N に対してどう伸びるかを表示し、JSON で保存
+
+使い方:
+  python3 bench_package.py [--scales 1,2,4,8] [--bundle] [--precompress] [--optimize-png]
+                           [--compact-skeleton] [--fingerprint] [--jobs N] [--output bench.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import create_package
+from create_package import (
+    DIRECTORIES_TO_COPY,
+    SKELETON_PRECISION,
+    StageTimer,
+    create_commercial_package,
+    validate_package,
+)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# パッケージ生成が参照するルート直下のファイル
+ROOT_INPUTS = ["index.html", "server.py", "spine-bounds-integration.js"]
+
+
+def build_synthetic_tree(target, scale):
+    """assets/ を scale 倍にした合成ツリーを target に作る
+
+    1倍目は実際のツリーそのもの、2倍目以降はコピー対象ディレクトリごとに
+    synthetic-<n>/ 以下へ同じ内容を複製する（index.html からは参照されない）。
+    """
+    for name in ROOT_INPUTS:
+        shutil.copy2(os.path.join(ROOT, name), os.path.join(target, name))
+    for dir_path in DIRECTORIES_TO_COPY:
+        source = os.path.join(ROOT, dir_path)
+        if not os.path.isdir(source):
+            continue
+        shutil.copytree(source, os.path.join(target, dir_path))
+        for copy in range(1, scale):
+            shutil.copytree(source, os.path.join(target, dir_path, f"synthetic-{copy}"))
+
+
+def run_once(scale, options, jobs):
+    """合成ツリー1つでパッケージ生成を計測し、StageTimer のレポートを返す"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="bench-package-") as workdir:
+        build_synthetic_tree(workdir, scale)
+        timer = StageTimer()
+        os.chdir(workdir)
+        try:
+            # パッケージ生成の進捗表示は計測結果の邪魔になるので捨てる
+            with contextlib.redirect_stdout(io.StringIO()):
+                package_dir = create_commercial_package(output_dir="package", jobs=jobs,
+                                                        timer=timer, **options)
+                with timer.stage("validate", source=package_dir):
+                    validate_package(package_dir, jobs=jobs)
+        finally:
+            os.chdir(cwd)
+    return timer.report()
+
+
+def parse_scales(value):
+    scales = [int(item) for item in value.split(",") if item.strip()]
+    if not scales or min(scales) < 1:
+        raise argparse.ArgumentTypeError("倍率は1以上の整数をカンマ区切りで指定してください")
+    return sorted(set(scales))
+
+
+def print_table(results):
+    """ステージ × 倍率の処理時間表（最後の列は最小倍率比の伸び）"""
+    scales = [result["scale"] for result in results]
+    names = []
+    for result in results:
+        for record in result["report"]["stages"]:
+            if record["name"] not in names:
+                names.append(record["name"])
+    header = f"  {'ステージ':<12}" + "".join(f"{f'x{scale}':>11}" for scale in scales) + f"{'伸び':>9}"
+    print(header)
+    for name in names:
+        timings = []
+        for result in results:
+            record = next((r for r in result["report"]["stages"] if r["name"] == name), None)
+            timings.append(record["wall_s"] if record else None)
+        cells = "".join(f"{t * 1000:9.1f}ms" if t is not None else f"{'-':>11}" for t in timings)
+        growth = (f"{timings[-1] / timings[0]:8.1f}x"
+                  if timings[0] and timings[-1] is not None else f"{'-':>9}")
+        print(f"  {name:<16}{cells}{growth}")
+    files = "".join(f"{result['files']:>11,}" for result in results)
+    print(f"  {'入力ファイル数':<11}{files}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="商用パッケージ生成のスケーリングベンチマーク")
+    parser.add_argument("--scales", type=parse_scales, default=[1, 2, 4, 8],
+                        help="assets/ の複製倍率（カンマ区切り、デフォルト: 1,2,4,8）")
+    parser.add_argument("--fingerprint", action="store_true", help="フィンガープリント化を含める")
+    parser.add_argument("--bundle", action="store_true", help="バンドル・最小化を含める")
+    parser.add_argument("--precompress", action="store_true", help="事前圧縮を含める")
+    parser.add_argument("--optimize-png", action="store_true", help="PNG 再圧縮を含める（低速）")
+    parser.add_argument("--compact-skeleton", action="store_true", help="スケルトン JSON 軽量化を含める")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help=f"並列ワーカー数（既定: CPUコア数 = {create_package.default_jobs()}）")
+    parser.add_argument("--output", default=None, help="結果を JSON で書き出すパス")
+    args = parser.parse_args()
+
+    options = {
+        "fingerprint": args.fingerprint,
+        "bundle": args.bundle,
+        "precompress": args.precompress,
+        "optimize_png": args.optimize_png,
+        "skeleton_options": ({"precision": SKELETON_PRECISION, "animations": {}, "skins": {}}
+                             if args.compact_skeleton else None),
+    }
+    results = []
+    for scale in args.scales:
+        print(f"📦 x{scale} を計測中...")
+        report = run_once(scale, options, args.jobs)
+        copy = next(r for r in report["stages"] if r["name"] == "copy")
+        results.append({"scale": scale, "files": copy["files_in"], "bytes": copy["bytes_in"],
+                        "report": report})
+
+    print("\n⏱️ ステージ別処理時間（wall）:")
+    print_table(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"options": {k: bool(v) for k, v in options.items()}, "results": results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"💾 計測結果を保存: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
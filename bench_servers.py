@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+同梱サーバーの負荷ベンチマーク
+- server.py / simple-server.py / archive/debug-experiments/debug-server.py を順に起動
+- 標準ライブラリの asyncio クライアントでページ読み込み相当のリクエスト列
+  （index.html → JS → スケルトンJSON → atlas → テクスチャ）を並列度を上げながら送信
+- req/s・p50/p99 レイテンシ・bytes/s を計測し、ベースライン JSON と比較
+
+使い方:
+  python3 bench_servers.py [--servers server,simple,debug] [--concurrency 1,4,16,64]
+                           [--duration 5] [--server-args '--processes 4']
+                           [--save baseline.json] [--baseline baseline.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shlex
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# ベンチ対象サーバー: 名前 → (起動コマンド, ポート)
+# simple-server.py と debug-server.py はポート固定（8000 / 8001）のため、そのまま使う
+SERVERS = {
+    "server": (lambda port: [sys.executable, "server.py", "--port", str(port)], 8790),
+    "simple": (lambda port: [sys.executable, "simple-server.py"], 8000),
+    "debug": (lambda port: [sys.executable, os.path.join("archive", "debug-experiments", "debug-server.py")], 8001),
+}
+
+# 1ページ読み込みで取得する共通アセット（キャラクター別アセットは後ろに追加）
+PAGE_ASSETS = [
+    "/index.html",
+    "/assets/spine/spine-skeleton-bounds.js",
+    "/spine-bounds-integration.js",
+]
+CHARACTER_DIR = os.path.join("assets", "spine", "characters")
+
+STARTUP_TIMEOUT = 10.0
+REQUEST_TIMEOUT = 30.0
+# ベースライン比較で回帰とみなす悪化率
+DEFAULT_TOLERANCE = 0.15
+
+
+def page_load_paths(root=ROOT):
+    """ページ読み込み1回分のリクエストパス（キャラクターごとに JSON → atlas → PNG）"""
+    paths = list(PAGE_ASSETS)
+    characters_dir = os.path.join(root, CHARACTER_DIR)
+    if os.path.isdir(characters_dir):
+        for name in sorted(os.listdir(characters_dir)):
+            for ext in (".json", ".atlas", ".png"):
+                if os.path.isfile(os.path.join(characters_dir, name, name + ext)):
+                    paths.append(f"/{CHARACTER_DIR.replace(os.sep, '/')}/{name}/{name}{ext}")
+    return paths
+
+
+def percentile(sorted_values, q):
+    """ソート済みリストの分位点（最近傍順位法）"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def wait_for_port(port, timeout=STARTUP_TIMEOUT):
+    """サーバーが接続を受け付けるまで待つ"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def port_in_use(port):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        return sock.connect_ex(("127.0.0.1", port)) == 0
+
+
+def start_server(name, port=None, extra_args=()):
+    """ベンチ対象サーバーをリポジトリ直下で起動（出力は捨てる）"""
+    command, default_port = SERVERS[name]
+    port = port or default_port
+    if port_in_use(port):
+        raise RuntimeError(f"ポート {port} は使用中です")
+    process = subprocess.Popen(
+        command(port) + list(extra_args), cwd=ROOT,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    if not wait_for_port(port):
+        stop_server(process)
+        raise RuntimeError(f"{name} が {STARTUP_TIMEOUT:.0f} 秒以内に起動しませんでした")
+    return process, port
+
+
+def stop_server(process):
+    """Ctrl+C 相当で停止し、応答がなければ kill"""
+    if process.poll() is not None:
+        return
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+class Connection:
+    """keep-alive 対応の最小 HTTP/1.1 クライアント接続"""
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+    async def get(self, path):
+        """GET を送り (status, body_bytes) を返す。サーバーが閉じた接続は張り直す"""
+        for attempt in range(2):
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port)
+            try:
+                return await self._request(path)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # keep-alive がサーバー側で切られていた場合は1回だけ再試行
+                await self.close()
+                if attempt:
+                    raise
+
+    async def _request(self, path):
+        self.writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{self.port}\r\n"
+            f"Accept-Encoding: identity\r\nConnection: keep-alive\r\n\r\n".encode("ascii")
+        )
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed")
+        version, status = status_line.split(None, 2)[:2]
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        if "content-length" in headers:
+            body = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await self.reader.read()
+            headers["connection"] = "close"
+        connection = headers.get("connection", "").lower()
+        if connection == "close" or (version == b"HTTP/1.0" and connection != "keep-alive"):
+            await self.close()
+        return int(status), len(body)
+
+
+async def virtual_user(port, paths, deadline, samples):
+    """締め切りまでページ読み込みを繰り返し、(latency, bytes, ok) を記録"""
+    conn = Connection(port)
+    try:
+        while time.perf_counter() < deadline:
+            for path in paths:
+                start = time.perf_counter()
+                try:
+                    status, size = await asyncio.wait_for(conn.get(path), REQUEST_TIMEOUT)
+                    ok = status < 400
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                    await conn.close()
+                    status, size, ok = 0, 0, False
+                samples.append((time.perf_counter() - start, size, ok))
+    finally:
+        await conn.close()
+
+
+async def run_level(port, paths, concurrency, duration):
+    """並列度 concurrency で duration 秒負荷をかけて集計"""
+    samples = []
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(virtual_user(port, paths, deadline, samples) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(latency for latency, _, ok in samples if ok)
+    total_bytes = sum(size for _, size, ok in samples if ok)
+    return {
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "errors": sum(1 for _, _, ok in samples if not ok),
+        "elapsed_s": round(elapsed, 3),
+        "req_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "bytes_per_s": round(total_bytes / elapsed),
+    }
+
+
+def benchmark_server(name, levels, duration, warmup, port=None, extra_args=()):
+    """サーバーを起動して各並列度を計測し、結果のリストを返す"""
+    paths = page_load_paths()
+    process, port = start_server(name, port, extra_args)
+    try:
+        if warmup:
+            asyncio.run(run_level(port, paths, 1, warmup))
+        results = []
+        for concurrency in levels:
+            result = asyncio.run(run_level(port, paths, concurrency, duration))
+            results.append(result)
+            print(f"   c={concurrency:<4} {result['req_per_s']:>9.1f} req/s"
+                  f"  p50 {result['p50_ms']:>8.2f} ms  p99 {result['p99_ms']:>8.2f} ms"
+                  f"  {result['bytes_per_s'] / 1024 / 1024:>8.2f} MiB/s"
+                  f"  errors {result['errors']}")
+        return results
+    finally:
+        stop_server(process)
+
+
+def compare_with_baseline(report, baseline, tolerance):
+    """ベースラインより tolerance 以上悪化した指標を列挙"""
+    regressions = []
+    for name, results in report["servers"].items():
+        previous = {r["concurrency"]: r for r in baseline.get("servers", {}).get(name, [])}
+        for result in results:
+            before = previous.get(result["concurrency"])
+            if not before:
+                continue
+            checks = [
+                ("req_per_s", result["req_per_s"] < before["req_per_s"] * (1 - tolerance)),
+                ("bytes_per_s", result["bytes_per_s"] < before["bytes_per_s"] * (1 - tolerance)),
+                ("p50_ms", result["p50_ms"] > before["p50_ms"] * (1 + tolerance)),
+                ("p99_ms", result["p99_ms"] > before["p99_ms"] * (1 + tolerance)),
+            ]
+            for metric, regressed in checks:
+                if regressed:
+                    regressions.append(
+                        f"{name} c={result['concurrency']} {metric}: {before[metric]} → {result[metric]}")
+    return regressions
+
+
+def parse_levels(value):
+    levels = [int(item) for item in value.split(",") if item.strip()]
+    if not levels or min(levels) < 1:
+        raise argparse.ArgumentTypeError("並列度は1以上の整数をカンマ区切りで指定してください")
+    return levels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="同梱サーバーの負荷ベンチマーク")
+    parser.add_argument("--servers", default=",".join(SERVERS),
+                        help=f"対象サーバー（カンマ区切り、デフォルト: {','.join(SERVERS)}）")
+    parser.add_argument("--concurrency", type=parse_levels, default=[1, 4, 16, 64],
+                        help="並列度（カンマ区切り、デフォルト: 1,4,16,64）")
+    parser.add_argument("--duration", type=float, default=5.0, help="並列度ごとの計測秒数（デフォルト: 5）")
+    parser.add_argument("--warmup", type=float, default=1.0, help="計測前のウォームアップ秒数（デフォルト: 1）")
+    parser.add_argument("--port", type=int, help="server.py の待ち受けポート（デフォルト: 8790）")
+    parser.add_argument("--server-args", default="",
+                        help="server.py に渡す追加引数（例: '--processes 4'）")
+    parser.add_argument("--save", help="結果をベースラインとして JSON 保存")
+    parser.add_argument("--baseline", help="比較するベースライン JSON")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="回帰とみなす悪化率（デフォルト: 0.15）")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.servers.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SERVERS]
+    if unknown:
+        parser.error(f"不明なサーバー: {', '.join(unknown)}")
+
+    paths = page_load_paths()
+    print(f"📄 ページ読み込み: {len(paths)} リクエスト/回")
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "duration_s": args.duration,
+        "server_args": args.server_args,
+        "paths": paths,
+        "servers": {},
+    }
+    for name in names:
+        print(f"🚀 {name}")
+        try:
+            report["servers"][name] = benchmark_server(
+                name, args.concurrency, args.duration, args.warmup,
+                port=args.port if name == "server" else None,
+                extra_args=shlex.split(args.server_args) if name == "server" else ())
+        except RuntimeError as e:
+            print(f"❌ {name}: {e}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 ベースライン保存: {args.save}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(report, baseline, args.tolerance)
+        if regressions:
+            print(f"⚠️  ベースライン比で {len(regressions)} 件の悪化（許容 {args.tolerance:.0%}）")
+            for line in regressions:
+                print(f"   - {line}")
+            return 1
+        print(f"✅ ベースライン比で悪化なし（許容 {args.tolerance:.0%}）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
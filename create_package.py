@@ -11,71 +11,662 @@ import shutil
 import re
 from datetime import datetime
 import json
+import hashlib
+import gzip
+import struct
+import tarfile
+import tempfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import contextmanager
 
-def create_commercial_package():
-    """商用パッケージの生成"""
+from server import parse_atlas
+
+try:
+    import brotli  # 任意依存（pip install brotli）
+except ImportError:
+    brotli = None
+
+# フィンガープリント付きアセットの対応表（サーバーが immutable 判定に使用）
+ASSET_MANIFEST_NAME = "asset-manifest.json"
+
+def default_jobs():
+    """並列処理の既定ワーカー数（CPU コア数）"""
+    return os.cpu_count() or 1
+
+def parallel_map(func, items, jobs=None, processes=False):
+    """func を items に並列適用し、入力順のまま結果を返す
+
+    I/O・hashlib・zlib は GIL を解放するためスレッドで、
+    純 Python の処理（最小化など）は processes=True でプロセスプールで実行する。
+    """
+    items = list(items)
+    jobs = jobs or default_jobs()
+    if jobs <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with executor_class(max_workers=min(jobs, len(items))) as executor:
+        return list(executor.map(func, items))
+
+def tree_stats(paths):
+    """ファイル数と合計バイト数（paths はファイル・ディレクトリのパスまたはそのリスト）"""
+    if isinstance(paths, str):
+        paths = [paths]
+    files = size = 0
+    pending = [path for path in paths if os.path.exists(path)]
+    while pending:
+        path = pending.pop()
+        if os.path.isfile(path):
+            files += 1
+            size += os.path.getsize(path)
+            continue
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.is_file():
+                    files += 1
+                    size += entry.stat().st_size
+    return files, size
+
+def _child_cpu_time():
+    """終了済み子プロセス（プロセスプールのワーカー）の CPU 時間の合計"""
+    times = os.times()
+    return times.children_user + times.children_system
+
+class StageTimer:
+    """ステージごとの経過時間・CPU 時間・入出力サイズを記録
+
+    stage(name, path=..., source=...) のように path を渡すと、ステージ前後で
+    path（入力側は source があればそちら）を走査してファイル数・バイト数を記録する。
+    CPU 時間は自プロセス分（cpu_s）と、プロセスプールのワーカー分（child_cpu_s）を分けて記録。
+    """
+    
+    def __init__(self):
+        self.stages = []
+    
+    @contextmanager
+    def stage(self, name, path=None, source=None):
+        record = {"name": name}
+        if path is not None or source is not None:
+            record["files_in"], record["bytes_in"] = tree_stats(source if source is not None else path)
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        child_cpu = _child_cpu_time()
+        try:
+            yield
+        finally:
+            record["wall_s"] = time.perf_counter() - wall
+            record["cpu_s"] = time.process_time() - cpu
+            record["child_cpu_s"] = _child_cpu_time() - child_cpu
+            if path is not None:
+                record["files_out"], record["bytes_out"] = tree_stats(path)
+            self.stages.append(record)
+    
+    def report(self):
+        """JSON 化できるレポート（ステージ一覧と合計）"""
+        return {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "stages": [dict(record, wall_s=round(record["wall_s"], 6), cpu_s=round(record["cpu_s"], 6),
+                            child_cpu_s=round(record["child_cpu_s"], 6))
+                       for record in self.stages],
+            "total": {
+                "wall_s": round(sum(record["wall_s"] for record in self.stages), 6),
+                "cpu_s": round(sum(record["cpu_s"] + record["child_cpu_s"] for record in self.stages), 6),
+            },
+        }
+    
+    def write_report(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        print(f"📝 ステージ別計測結果を出力: {path}")
+    
+    def print_report(self):
+        if not self.stages:
+            return
+        total = sum(record["wall_s"] for record in self.stages)
+        print("\n⏱️ ステージ別処理時間:")
+        for record in self.stages:
+            cpu = record["cpu_s"] + record["child_cpu_s"]
+            line = f"  {record['name']:<16} {record['wall_s'] * 1000:9.1f} ms (cpu {cpu * 1000:9.1f} ms)"
+            if "bytes_in" in record:
+                line += f"  {record['files_in']:5d}ファイル {record['bytes_in']:>13,}"
+            if "bytes_out" in record:
+                line += f" → {record['files_out']:5d}ファイル {record['bytes_out']:>13,} bytes"
+            print(line)
+        print(f"  {'合計':<16} {total * 1000:9.1f} ms")
+
+@contextmanager
+def _null_stage(name, path=None, source=None):
+    yield
+
+def create_commercial_package(fingerprint=False, bundle=False, strip_logs=True,
+                              output_dir=None, incremental=False, link_mode="copy",
+                              precompress=False, optimize_png=False, skeleton_options=None,
+                              jobs=None, timer=None, prune=False):
+    """商用パッケージの生成
+
+    bundle=True の場合、index.html のスクリプト読み込みをバンドルし JS/CSS を最小化する。
+    fingerprint=True の場合、index.html から参照されるアセットを
+    name.<hash>.ext にリネームし、参照を書き換えてマニフェストを出力する。
+    incremental=True の場合、output_dir の既存パッケージを .build-manifest.json と
+    比較し、変更のあったファイルだけをコピー・再処理する。
+    precompress=True の場合、テキストアセットの .gz（brotli があれば .br も）を出力する。
+    optimize_png=True の場合、PNG を可逆に再圧縮する（小さくなったものだけ置き換え）。
+    skeleton_options を指定した場合、スケルトン JSON を軽量化する（compact_skeletons の
+    引数 precision / animations / skins の辞書）。
+    prune=True の場合、index.html から辿れないアセット（バックアップ・ドキュメント・
+    編集用モジュールなど）をコピーしない。
+    jobs は並列ワーカー数（None なら CPU コア数）、timer は StageTimer。
+    """
+    stage = timer.stage if timer is not None else _null_stage
     
     # パッケージディレクトリの準備
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    package_dir = f"commercial_package_{timestamp}"
+    if output_dir is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_dir = f"commercial_package_{timestamp}"
+    package_dir = output_dir
     
-    if os.path.exists(package_dir):
-        shutil.rmtree(package_dir)
-    os.makedirs(package_dir)
+    options = {
+        "fingerprint": fingerprint,
+        "bundle": bundle,
+        "strip_logs": strip_logs,
+        "precompress": precompress,
+        "optimize_png": optimize_png,
+        "skeleton": skeleton_options,
+        "prune": prune,
+        # スクリプト自体が変わった場合は処理結果が変わるため全体を再生成
+        "tool": file_digest(os.path.abspath(__file__)) if incremental else None,
+    }
+    previous = load_build_manifest(package_dir) if incremental else None
+    if previous is not None and (previous.get("options") != options
+                                 or previous.get("version") != BUILD_MANIFEST_VERSION):
+        print("ℹ️ ビルド設定が変わったため全体を再生成します")
+        previous = None
     
-    print(f"📦 商用パッケージを生成中: {package_dir}")
+    if previous is None:
+        if os.path.exists(package_dir):
+            shutil.rmtree(package_dir)
+        os.makedirs(package_dir)
+        previous = {"files": {}, "inputs": {}, "fingerprints": {}}
     
-    # 必要なディレクトリとファイルのコピー
-    directories_to_copy = [
-        "assets/css",
-        "assets/js",
-        "assets/spine",
-        "assets/images"
-    ]
+    print(f"📦 商用パッケージを生成中: {package_dir}" + (" (差分モード)" if incremental else ""))
     
-    for dir_path in directories_to_copy:
-        if os.path.exists(dir_path):
-            dest_path = os.path.join(package_dir, dir_path)
-            shutil.copytree(dir_path, dest_path)
-            print(f"✅ コピー完了: {dir_path}")
-    
-    # 除外するファイル（編集システム関連）
-    files_to_exclude = [
-        "spine-positioning-system-explanation.html",
-        "spine-positioning-system-explanation.css",
-        "spine-positioning-system-explanation.js",
-        "spine-positioning-v2.js",
-        "spine-positioning-v2.css",
-        "spine-positioning-system-minimal.js"  # 位置復元システムも除外
-    ]
+    # 必要なディレクトリとファイルのコピー（除外ファイルはコピーしない）
+    with stage("scan", source=DIRECTORIES_TO_COPY):
+        sources = collect_source_files()
     
-    # 除外ファイルの削除
-    for root, dirs, files in os.walk(package_dir):
-        for file in files:
-            if file in files_to_exclude:
-                file_path = os.path.join(root, file)
-                os.remove(file_path)
-                print(f"🗑️ 除外: {file}")
+    # index.html から辿れるアセットだけを残す（編集システム除去後の index.html を起点にする）
+    if prune:
+        with stage("prune", source=sources):
+            with open("index.html", "r", encoding="utf-8") as f:
+                page_html = transform_index_html(f.read())
+            sources, dropped = prune_unreachable(sources, page_html)
+            report_pruned(sources, dropped)
+    with stage("copy", path=package_dir, source=sources):
+        files, changed, removed = sync_asset_tree(package_dir, previous["files"], link_mode,
+                                                  incremental, jobs, sources=sources)
+    
+    # フィンガープリント対象が1つでも変われば、相互参照を作り直すため対象全体を再コピー
+    if fingerprint and incremental:
+        fingerprinted = previous.get("fingerprints", {})
+        if set(changed) & fingerprinted.keys():
+            for rel in sorted(fingerprinted.keys() - set(changed)):
+                if rel in files:
+                    remove_package_file(package_dir, files[rel]["output"])
+                    materialize_file(rel, os.path.join(package_dir, rel), link_mode)
+                    files[rel]["output"] = rel
+                    changed.append(rel)
+    
+    inputs = snapshot_inputs(previous.get("inputs", {}), incremental)
+    if incremental and not changed and not removed and inputs == previous.get("inputs"):
+        print("✅ 変更なし - パッケージは最新です")
+        return package_dir
     
     # index.htmlの処理
-    process_index_html(package_dir)
+    with stage("index.html", path=os.path.join(package_dir, "index.html"), source="index.html"):
+        process_index_html(package_dir)
+    
+    # JS/CSS のバンドル・最小化
+    if bundle:
+        with stage("bundle", path=package_dir):
+            report = bundle_assets(package_dir, strip_logs=strip_logs,
+                                   only=set(changed) if incremental else None, jobs=jobs)
+        for item in report["bundles"]:
+            for rel in item["sources"]:
+                inputs.setdefault(rel, None)
+    
+    # スケルトン JSON の軽量化
+    if skeleton_options is not None:
+        with stage("skeleton", path=package_dir):
+            compact_skeletons(package_dir, only=set(changed) if incremental else None, jobs=jobs,
+                              **skeleton_options)
+    
+    # PNG の可逆再圧縮（フィンガープリントのハッシュは最適化後の内容で計算）
+    if optimize_png:
+        with stage("png", path=package_dir):
+            optimize_png_assets(package_dir, only=set(changed) if incremental else None, jobs=jobs)
+    
+    # アセットのフィンガープリント化（長期キャッシュ用）
+    fingerprints = {}
+    if fingerprint:
+        with stage("fingerprint", path=package_dir):
+            fingerprints = fingerprint_assets(package_dir, previous=previous.get("fingerprints"),
+                                              jobs=jobs)
+        for rel, hashed in fingerprints.items():
+            if rel in files:
+                files[rel]["output"] = hashed
+    
+    # 重要アセットのプリロードヒント（ファイル名が確定した後に計算）
+    with stage("preload", path=os.path.join(package_dir, PRELOAD_MANIFEST_NAME)):
+        write_preload_manifest(package_dir)
     
     # server.pyのコピー（配信用）
     shutil.copy("server.py", os.path.join(package_dir, "server.py"))
     
     # README作成
-    create_readme(package_dir)
+    with stage("readme", path=os.path.join(package_dir, "README.txt")):
+        create_readme(package_dir)
+    
+    # 事前圧縮（server.py が .gz / .br を優先して配信）
+    if precompress:
+        with stage("precompress", path=package_dir):
+            precompress_assets(package_dir, jobs=jobs)
+    
+    if incremental:
+        save_build_manifest(package_dir, {
+            "version": BUILD_MANIFEST_VERSION,
+            "options": options,
+            "files": files,
+            "inputs": snapshot_inputs(inputs, True),
+            "fingerprints": fingerprints,
+        })
     
     print(f"\n✅ 商用パッケージ生成完了: {package_dir}")
     print(f"📌 納品準備ができました。")
     
     return package_dir
 
-def process_index_html(package_dir):
-    """index.htmlから編集システム関連を完全に除去"""
+# --- 差分ビルド ---
+
+# コピー対象のディレクトリ
+DIRECTORIES_TO_COPY = [
+    "assets/css",
+    "assets/js",
+    "assets/spine",
+    "assets/images"
+]
+
+# 除外するファイル（編集システム関連）
+FILES_TO_EXCLUDE = [
+    "spine-positioning-system-explanation.html",
+    "spine-positioning-system-explanation.css",
+    "spine-positioning-system-explanation.js",
+    "spine-positioning-v2.js",
+    "spine-positioning-v2.css",
+    "spine-positioning-system-minimal.js"  # 位置復元システムも除外
+]
+
+# アセット以外でパッケージ内容に影響する入力
+BUILD_INPUTS = ["index.html", "server.py"]
+
+BUILD_MANIFEST_NAME = ".build-manifest.json"
+BUILD_MANIFEST_VERSION = 1
+
+LINK_MODES = ("copy", "auto", "reflink", "hardlink")
+
+def load_build_manifest(package_dir):
+    """前回ビルドのマニフェスト（なければ None）"""
+    path = os.path.join(package_dir, BUILD_MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_build_manifest(package_dir, manifest):
+    write_file_atomic(os.path.join(package_dir, BUILD_MANIFEST_NAME),
+                      json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True))
+
+def file_digest(path):
+    """ファイルの SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def write_file_atomic(path, text):
+    """一時ファイル経由で置き換え（ハードリンク元のファイルを書き換えない）"""
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8", newline='') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def collect_source_files():
+    """コピー対象のソースファイル（相対パス、除外ファイルを除く）"""
+    sources = []
+    for dir_path in DIRECTORIES_TO_COPY:
+        for root, dirs, files in os.walk(dir_path):
+            dirs.sort()
+            for file in sorted(files):
+                path = os.path.join(root, file).replace(os.sep, '/')
+                if file in FILES_TO_EXCLUDE:
+                    print(f"🗑️ 除外: {file}")
+                    continue
+                sources.append(path)
+    return sources
+
+def source_unchanged(rel, st, entry):
+    """stat が一致すれば未変更、異なればハッシュで判定"""
+    if entry is None:
+        return False, None
+    if entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+        return True, entry["sha256"]
+    if entry["size"] != st.st_size:
+        return False, None
+    digest = file_digest(rel)
+    return digest == entry["sha256"], digest
+
+def sync_asset_tree(package_dir, previous_files, link_mode="copy", incremental=False, jobs=None,
+                    sources=None):
+    """アセットをパッケージへ同期
+
+    前回のマニフェストと stat / ハッシュが一致するファイルはそのまま残し、
+    変更・追加されたファイルだけをコピーする。ソースから消えたファイルは削除する。
+    ファイル単位の判定・コピーはスレッドプールで並列に行う。
+    sources はコピー対象（None なら collect_source_files で収集）。
+    戻り値: (ファイル情報, 変更されたファイル, 削除されたファイル)
+    """
+    if sources is None:
+        sources = collect_source_files()
+    tasks = [(package_dir, rel, previous_files.get(rel), link_mode, incremental)
+             for rel in sources]
+    files = {}
+    changed = []
+    for rel, entry, was_copied in parallel_map(_sync_file, tasks, jobs):
+        files[rel] = entry
+        if was_copied:
+            changed.append(rel)
     
-    with open("index.html", "r", encoding="utf-8") as f:
-        content = f.read()
+    removed = sorted(previous_files.keys() - files.keys())
+    for rel in removed:
+        remove_package_file(package_dir, previous_files[rel]["output"])
+    
+    copied_dirs = sorted({rel.split('/')[1] for rel in changed if rel.count('/') >= 2})
+    for name in copied_dirs:
+        print(f"✅ コピー完了: assets/{name}")
+    if incremental:
+        print(f"🔁 差分同期: 変更 {len(changed)} / 削除 {len(removed)} / 未変更 {len(files) - len(changed)}")
+    return files, changed, removed
+
+def _sync_file(task):
+    """1ファイルの同期 -> (相対パス, マニフェスト項目, コピーしたか)"""
+    package_dir, rel, entry, link_mode, incremental = task
+    st = os.stat(rel)
+    if entry is not None and os.path.exists(os.path.join(package_dir, entry["output"])):
+        unchanged, digest = source_unchanged(rel, st, entry)
+        if unchanged:
+            return rel, dict(entry, mtime_ns=st.st_mtime_ns), False
+        remove_package_file(package_dir, entry["output"])
+    else:
+        digest = None
+    
+    materialize_file(rel, os.path.join(package_dir, rel), link_mode)
+    return rel, {
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "sha256": digest or (file_digest(rel) if incremental else None),
+        "output": rel,
+    }, True
+
+def snapshot_inputs(previous_inputs, incremental):
+    """アセット以外の入力ファイルの状態（未変更なら前回の値を再利用）"""
+    inputs = {}
+    for rel in sorted(set(BUILD_INPUTS) | previous_inputs.keys()):
+        if not os.path.isfile(rel):
+            continue
+        st = os.stat(rel)
+        entry = previous_inputs.get(rel)
+        unchanged, digest = source_unchanged(rel, st, entry)
+        if unchanged:
+            inputs[rel] = dict(entry, mtime_ns=st.st_mtime_ns)
+        else:
+            inputs[rel] = {
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "sha256": digest or (file_digest(rel) if incremental else None),
+            }
+    return inputs
+
+def remove_package_file(package_dir, rel):
+    path = os.path.join(package_dir, rel)
+    if os.path.lexists(path):
+        os.remove(path)
+
+def materialize_file(src, dst, link_mode="copy"):
+    """ファイルをパッケージへ配置（reflink / ハードリンク / コピー）"""
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if link_mode in ("auto", "reflink") and reflink_file(src, dst):
+        return "reflink"
+    if link_mode == "hardlink":
+        try:
+            os.link(src, dst)
+            return "hardlink"
+        except OSError:
+            pass
+    shutil.copy2(src, dst)
+    return "copy"
+
+def reflink_file(src, dst):
+    """FICLONE によるコピーオンライト複製（btrfs / XFS など、非対応なら False）"""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    FICLONE = 0x40049409
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+# === index.html 変換エンジン ===
+
+# spineManagerの初期化を確実にするため、waitForSpine(); 以降の最初の</script>直前に挿入するコード
+SPINE_INIT_ENHANCEMENT = '''
+        // 🎯 商用版Spine初期化強化
+        (function() {
+            let initAttempts = 0;
+            const maxAttempts = 20;
+            
+            function ensureSpineInitialization() {
+                if (typeof spineManager !== 'undefined' && spineManager) {
+                    console.log('✅ spineManager確認完了');
+                    
+                    // 設定の再確認
+                    const config = document.getElementById('purattokun-config');
+                    if (config) {
+                        const x = parseFloat(config.getAttribute('data-x')) || 18;
+                        const y = parseFloat(config.getAttribute('data-y')) || 49;
+                        const scale = parseFloat(config.getAttribute('data-scale')) || 0.55;
+                        
+                        console.log('📊 Spine設定確認:', { x, y, scale });
+                    }
+                    
+                    return;
+                }
+                
+                initAttempts++;
+                if (initAttempts < maxAttempts) {
+                    console.log(`⏳ spineManager待機中... (${initAttempts}/${maxAttempts})`);
+                    setTimeout(ensureSpineInitialization, 250);
+                } else {
+                    console.error('❌ spineManager初期化タイムアウト');
+                }
+            }
+            
+            // DOMContentLoaded後に初期化チェック開始
+            if (document.readyState === 'loading') {
+                document.addEventListener('DOMContentLoaded', function() {
+                    setTimeout(ensureSpineInitialization, 500);
+                });
+            } else {
+                setTimeout(ensureSpineInitialization, 500);
+            }
+        })();
+    '''
+
+# 除去・置換ルール（元の適用順 = 同一位置での優先順）
+# (トリガー文字列, アンカー付きで試すパターン, 置換文字列)
+# トリガーは各パターンの先頭リテラルで、これが現れた位置でだけパターンを試す
+INDEX_HTML_RULES = [
+    # 1. 編集モードチェックブロック全体を置換して、常に通常モードとして動作させる
+    ('// 🎯 編集モード対応（URLパラメータ）',
+     re.compile(r'// 🎯 編集モード対応（URLパラメータ）[\s\S]*?loadEditingSystem\(versionParam\);\s*\}\s*else\s*\{[\s\S]*?loadPositionSystem\(\);\s*\}'),
+     '''// 商用版：編集モード無効化
+        // 位置情報はHTMLのdata属性から読み込み'''),
+    # 2. loadPositionSystem関数の定義を除去（位置復元システム）
+    ('// 位置復元システム読み込み',
+     re.compile(r'// 位置復元システム読み込み[\s\S]*?function loadPositionSystem\(\)\s*\{[\s\S]*?\}\s*(?=\n\s*//|\n\s*function|\n\s*\}|\n\s*<)'),
+     ''),
+    # 3. loadEditingSystem関数の定義を完全除去
+    ('// 編集システム動的読み込み',
+     re.compile(r'// 編集システム動的読み込み[\s\S]*?function loadEditingSystem\(version\)\s*\{[\s\S]*?\}\s*\}\s*(?=\n\s*//|\n\s*function|\n\s*\}|\n\s*<)'),
+     ''),
+    # 4. spine-positioning関連のscriptタグ
+    ('<script',
+     re.compile(r'<script[^>]*src="[^"]*spine-positioning[^"]*"[^>]*>[\s\S]*?</script>'),
+     ''),
+    # 5. edit-panel要素
+    ('<div',
+     re.compile(r'<div[^>]*id="edit-panel"[^>]*>[\s\S]*?</div>\s*(?=<div|</body>)'),
+     ''),
+    # 6. デバッグパネル
+    ('<!--',
+     re.compile(r'<!--\s*デバッグパネル[\s\S]*?</div>\s*-->'),
+     ''),
+    # 8. exit-edit-btn関連のイベントリスナー
+    ("document.getElementById('exit-edit-btn')",
+     re.compile(r"document\.getElementById\('exit-edit-btn'\)[\s\S]*?\.addEventListener[\s\S]*?\};?\s*\}\);\s*\}"),
+     '}'),
+    # 9. 編集ボタン関連のイベントリスナー
+    ("document.getElementById('edit-character-btn')",
+     re.compile(r"document\.getElementById\('edit-character-btn'\)[\s\S]*?\.addEventListener[\s\S]*?\};?\s*\}\);\s*(?=document\.getElementById|\})"),
+     ''),
+    ("document.getElementById('edit-canvas-btn')",
+     re.compile(r"document\.getElementById\('edit-canvas-btn'\)[\s\S]*?\.addEventListener[\s\S]*?\};?\s*\}\);\s*(?=document\.getElementById|\})"),
+     ''),
+    # 10. 編集モード関連のコンソールログ
+    ('console.log(',
+     re.compile(r'console\.log\([\'"].*編集モード.*[\'"]\);?\s*\n'),
+     ''),
+    # 11. 編集モードという文字列を含むコメント
+    ('//',
+     re.compile(r'//.*編集モード.*\n'),
+     ''),
+    ('/*',
+     re.compile(r'/\*.*編集モード.*\*/'),
+     ''),
+    # 12. confirm内の編集モード文字列
+    ("confirm('編集モード",
+     re.compile(r"confirm\('編集モード[^']*'\)"),
+     'false'),
+]
+
+# 7. 初期化強化コードの挿入位置（waitForSpine(); で有効化し、次の</script>の直前に1回だけ挿入）
+INDEX_HTML_INSERT_AFTER = 'waitForSpine();'
+INDEX_HTML_INSERT_BEFORE = '</script>'
+INDEX_HTML_INSERTION = SPINE_INIT_ENHANCEMENT + '\n    '
+
+class IndexHtmlTransformer:
+    """index.html の除去・置換ルールをまとめて適用する変換エンジン
+
+    ルールごとに全体を re.sub し直す代わりに、全ルールのトリガー文字列を
+    1本の正規表現にまとめて候補位置を探し、トリガーが現れた位置でだけ
+    該当ルールのアンカー付き正規表現を試す。
+    同一位置で複数のルールが該当する場合は INDEX_HTML_RULES の順で優先する。
+    置換結果は再走査しない（逐次適用と異なり、置換文字列に後続ルールが
+    再適用されることはない）。
+    """
+    
+    def __init__(self, rules, insert_after, insert_before, insertion):
+        self.rules = rules
+        self.insert_after = insert_after
+        self.insert_before = insert_before
+        self.insertion = insertion
+        triggers = {trigger for trigger, _, _ in rules}
+        triggers.update((insert_after, insert_before))
+        # 長いトリガーを先に並べ、同一位置では最長のものを拾う
+        self.trigger_pattern = re.compile('|'.join(
+            re.escape(trigger) for trigger in sorted(triggers, key=len, reverse=True)))
+        # 先頭文字ごとに候補ルールを引けるようにしておく
+        self.rules_by_char = {}
+        for rule in rules:
+            self.rules_by_char.setdefault(rule[0][0], []).append(rule)
+    
+    def transform(self, content):
+        output = []
+        emitted = 0
+        pos = 0
+        armed = False
+        inserted = False
+        search = self.trigger_pattern.search
+        
+        # トリガーの出現位置を順に訪れ、その位置で挿入とルールを判定する
+        while True:
+            match = search(content, pos)
+            if not match:
+                break
+            start = match.start()
+            
+            if not inserted:
+                if armed and content.startswith(self.insert_before, start):
+                    output.append(content[emitted:start])
+                    output.append(self.insertion)
+                    emitted = start
+                    inserted = True
+                elif not armed and content.startswith(self.insert_after, start):
+                    armed = True
+            
+            end = None
+            for trigger, pattern, replacement in self.rules_by_char.get(content[start], ()):
+                if not content.startswith(trigger, start):
+                    continue
+                rule_match = pattern.match(content, start)
+                if rule_match:
+                    output.append(content[emitted:start])
+                    output.append(replacement)
+                    end = emitted = rule_match.end()
+                    break
+            
+            if end is None:
+                pos = start + 1
+            else:
+                pos = end
+        
+        output.append(content[emitted:])
+        return ''.join(output)
+
+INDEX_HTML_TRANSFORMER = IndexHtmlTransformer(
+    INDEX_HTML_RULES, INDEX_HTML_INSERT_AFTER, INDEX_HTML_INSERT_BEFORE, INDEX_HTML_INSERTION)
+
+def transform_index_html(content):
+    """index.html の内容から編集システム関連を除去した文字列を返す"""
+    return INDEX_HTML_TRANSFORMER.transform(content)
+
+def transform_index_html_sequential(content):
+    """ルールを1つずつ re.sub で適用する従来の変換（比較・ベンチマーク用の参照実装）"""
     
     # 編集システム関連のコードを段階的に除去
     
@@ -131,54 +722,12 @@ def process_index_html(package_dir):
     
     # 7. spineManagerの初期化を確実にする
     # 既存のSpine初期化コードの後に、確実性を高めるコードを追加
-    spine_init_enhancement = '''
-        // 🎯 商用版Spine初期化強化
-        (function() {
-            let initAttempts = 0;
-            const maxAttempts = 20;
-            
-            function ensureSpineInitialization() {
-                if (typeof spineManager !== 'undefined' && spineManager) {
-                    console.log('✅ spineManager確認完了');
-                    
-                    // 設定の再確認
-                    const config = document.getElementById('purattokun-config');
-                    if (config) {
-                        const x = parseFloat(config.getAttribute('data-x')) || 18;
-                        const y = parseFloat(config.getAttribute('data-y')) || 49;
-                        const scale = parseFloat(config.getAttribute('data-scale')) || 0.55;
-                        
-                        console.log('📊 Spine設定確認:', { x, y, scale });
-                    }
-                    
-                    return;
-                }
-                
-                initAttempts++;
-                if (initAttempts < maxAttempts) {
-                    console.log(`⏳ spineManager待機中... (${initAttempts}/${maxAttempts})`);
-                    setTimeout(ensureSpineInitialization, 250);
-                } else {
-                    console.error('❌ spineManager初期化タイムアウト');
-                }
-            }
-            
-            // DOMContentLoaded後に初期化チェック開始
-            if (document.readyState === 'loading') {
-                document.addEventListener('DOMContentLoaded', function() {
-                    setTimeout(ensureSpineInitialization, 500);
-                });
-            } else {
-                setTimeout(ensureSpineInitialization, 500);
-            }
-        })();
-    '''
     
     # </script>タグの前に初期化強化コードを挿入
     # waitForSpine();の後に挿入
     content = re.sub(
         r'(waitForSpine\(\);[\s\S]*?)(</script>)',
-        r'\1' + spine_init_enhancement + r'\n    \2',
+        r'\1' + SPINE_INIT_ENHANCEMENT + r'\n    \2',
         content,
         count=1
     )
@@ -237,6 +786,16 @@ def process_index_html(package_dir):
         content
     )
     
+    return content
+
+def process_index_html(package_dir):
+    """index.htmlから編集システム関連を完全に除去"""
+    
+    with open("index.html", "r", encoding="utf-8") as f:
+        content = f.read()
+    
+    content = transform_index_html(content)
+    
     # 処理済みのindex.htmlを保存
     output_path = os.path.join(package_dir, "index.html")
     with open(output_path, "w", encoding="utf-8") as f:
@@ -301,97 +860,1787 @@ python server.py --port 8080
     with open(os.path.join(package_dir, "README.txt"), "w", encoding="utf-8") as f:
         f.write(readme_content)
 
-def validate_package(package_dir):
-    """パッケージの検証"""
+# index.html 内のローカル参照（src / href 属性）
+PAGE_REFERENCE_PATTERN = re.compile(
+    r'(?P<attr>\b(?:src|href)\s*=\s*)(?P<quote>["\'])(?P<url>[^"\']+)(?P=quote)'
+)
+
+# index.html 内のキャラクター設定（basePath / atlasFile / jsonFile）
+SPINE_CONFIG_PATTERN = re.compile(
+    r"basePath:\s*(?P<q1>['\"])(?P<base>[^'\"]+)(?P=q1),\s*"
+    r"atlasFile:\s*(?P<q2>['\"])(?P<atlas>[^'\"]+)(?P=q2),\s*"
+    r"jsonFile:\s*(?P<q3>['\"])(?P<json>[^'\"]+)(?P=q3)"
+)
+
+CSS_URL_PATTERN = re.compile(r'url\(\s*(?P<quote>["\']?)(?P<url>[^"\')]+)(?P=quote)\s*\)')
+
+def split_local_url(url):
+    """ローカル参照を (正規化パス, サフィックス) に分解（外部URLなら None）"""
+    if re.match(r'^[a-zA-Z][a-zA-Z0-9+.-]*:', url) or url.startswith('//') or url.startswith('#'):
+        return None
+    match = re.match(r'^([^?#]*)(.*)$', url)
+    path, suffix = match.group(1), match.group(2)
+    if not path:
+        return None
+    return os.path.normpath(path.lstrip('/')).replace(os.sep, '/'), suffix
+
+def find_page_references(html):
+    """index.html が src / href で直接参照するローカルファイル"""
+    references = []
+    for match in PAGE_REFERENCE_PATTERN.finditer(html):
+        local = split_local_url(match.group('url'))
+        if local is not None:
+            references.append(local[0])
+    return references
+
+def find_spine_characters(html):
+    """index.html 内の Spine キャラクター設定を抽出"""
+    characters = []
+    for match in SPINE_CONFIG_PATTERN.finditer(html):
+        base = split_local_url(match.group('base'))
+        if base is None:
+            continue
+        characters.append({
+            "base": base[0],
+            "atlas": match.group('atlas'),
+            "json": match.group('json'),
+        })
+    return characters
+
+def read_atlas_pages(atlas_path):
+    """Atlas ファイルのページ画像名"""
+    with open(atlas_path, "r", encoding="utf-8") as f:
+        return [page["name"] for page in parse_atlas(f.read())]
+
+# index.html の重要アセット（server.py が Link: rel=preload / 103 Early Hints に使用）
+PRELOAD_MANIFEST_NAME = "preload-manifest.json"
+
+def find_script_sources(html):
+    """<script src> の参照を文書順に (URL, crossorigin 属性があるか) で返す（外部URLも含む）"""
+    sources = []
+    for match in SCRIPT_TAG_PATTERN.finditer(html):
+        attrs = {m.group('name').lower(): m.group('value') or ''
+                 for m in TAG_ATTR_PATTERN.finditer(match.group('attrs'))}
+        if attrs.get('src'):
+            sources.append((attrs['src'], 'crossorigin' in attrs))
+    return sources
+
+def build_critical_chain(package_dir):
+    """index.html の重要アセットの依存チェーン
+
+    ブラウザはランタイム JS → 境界モジュール → スケルトン JSON → atlas → テクスチャ PNG と
+    1段ずつ発見していくため、最初の応答で全段をまとめて知らせられるよう列挙する。
+    戻り値: {"scripts": [...], "characters": {名前: [...]}}（各要素は href / as / crossorigin）
+    JSON・atlas は Spine の AssetManager が CORS モードで取得するため crossorigin 付き。
+    """
+    with open(os.path.join(package_dir, "index.html"), "r", encoding="utf-8") as f:
+        html = f.read()
     
-    print("\n📋 パッケージ検証中...")
+    scripts = []
+    for url, crossorigin in find_script_sources(html):
+        local = split_local_url(url)
+        if local is None:
+            if url.startswith(('http://', 'https://', '//')):
+                scripts.append({"href": url, "as": "script", "crossorigin": crossorigin})
+            continue
+        if os.path.isfile(os.path.join(package_dir, local[0])):
+            scripts.append({"href": "/" + local[0] + local[1], "as": "script", "crossorigin": crossorigin})
     
-    # 編集システムファイルが存在しないことを確認
-    excluded_files = [
-        "spine-positioning-system-explanation.html",
-        "spine-positioning-system-explanation.css",
-        "spine-positioning-system-explanation.js",
-        "spine-positioning-v2.js",
-        "spine-positioning-v2.css",
-        "spine-positioning-system-minimal.js"
-    ]
+    characters = {}
+    for character in find_spine_characters(html):
+        chain = []
+        json_rel = os.path.normpath(os.path.join(character["base"], character["json"])).replace(os.sep, '/')
+        atlas_rel = os.path.normpath(os.path.join(character["base"], character["atlas"])).replace(os.sep, '/')
+        for rel in (json_rel, atlas_rel):
+            if os.path.isfile(os.path.join(package_dir, rel)):
+                chain.append({"href": "/" + rel, "as": "fetch", "crossorigin": True})
+        atlas_path = os.path.join(package_dir, atlas_rel)
+        if os.path.isfile(atlas_path):
+            for page in read_atlas_pages(atlas_path):
+                page_rel = os.path.normpath(os.path.join(character["base"], page)).replace(os.sep, '/')
+                if os.path.isfile(os.path.join(package_dir, page_rel)):
+                    chain.append({"href": "/" + page_rel, "as": "image", "crossorigin": True})
+        name = os.path.basename(character["base"].rstrip('/')) or os.path.splitext(character["json"])[0]
+        characters[name] = chain
+    return {"scripts": scripts, "characters": characters}
+
+def write_preload_manifest(package_dir):
+    """重要アセットのチェーンを preload-manifest.json に出力"""
+    chain = build_critical_chain(package_dir)
+    manifest = {
+        "version": 1,
+        "pages": {
+            "index.html": chain["scripts"] + [item for items in chain["characters"].values() for item in items],
+        },
+        "characters": chain["characters"],
+    }
+    with open(os.path.join(package_dir, PRELOAD_MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
     
-    issues = []
+    print(f"✅ プリロードヒント: {len(manifest['pages']['index.html'])}件 "
+          f"(スクリプト {len(chain['scripts'])} / キャラクター {len(chain['characters'])}) ({PRELOAD_MANIFEST_NAME})")
+    return manifest
+
+# JS / インラインスクリプト内の文字列リテラルで参照されるアセット
+JS_ASSET_LITERAL_PATTERN = re.compile(
+    r'(?P<quote>["\'`])(?P<url>[^"\'`\s<>()]+\.(?:js|css|json|atlas|png|jpe?g|webp|gif|svg))(?P=quote)',
+    re.IGNORECASE
+)
+
+def _resolve_reference(base_dir, url):
+    """base_dir 基準のローカル参照を正規化した相対パスに（外部URLなら None）"""
+    local = split_local_url(url)
+    if local is None:
+        return None
+    if url.startswith('/'):
+        return local[0]
+    return os.path.normpath(os.path.join(base_dir, local[0])).replace(os.sep, '/')
+
+def find_reachable_assets(html, root="."):
+    """index.html から辿れるファイル（root 基準の相対パスの集合）
+
+    起点: src / href 属性、インラインの url()、スクリプト内の文字列リテラル、
+    Spine のキャラクター設定（JSON・atlas）、REQUIRED_FILES。
+    辿り方: CSS → url()、JS → 文字列リテラル（ページ基準と JS 自身の位置基準の両方）、
+    atlas → ページ画像。存在しないパスは無視する。
+    """
+    reachable = set()
+    pending = []
     
-    for root, dirs, files in os.walk(package_dir):
-        for file in files:
-            if file in excluded_files:
-                issues.append(f"❌ 編集システムファイルが残存: {file}")
+    def add(rel):
+        if rel and not rel.startswith('..') and rel not in reachable \
+                and os.path.isfile(os.path.join(root, rel)):
+            reachable.add(rel)
+            pending.append(rel)
+    
+    for rel in find_page_references(html):
+        add(rel)
+    for match in CSS_URL_PATTERN.finditer(html):
+        add(_resolve_reference("", match.group('url')))
+    for match in JS_ASSET_LITERAL_PATTERN.finditer(html):
+        add(_resolve_reference("", match.group('url')))
+    for character in find_spine_characters(html):
+        add(os.path.normpath(os.path.join(character["base"], character["json"])).replace(os.sep, '/'))
+        add(os.path.normpath(os.path.join(character["base"], character["atlas"])).replace(os.sep, '/'))
+    for rel in REQUIRED_FILES:
+        add(rel)
+    
+    while pending:
+        rel = pending.pop()
+        base_dir = os.path.dirname(rel)
+        ext = os.path.splitext(rel)[1].lower()
+        path = os.path.join(root, rel)
+        if ext == '.atlas':
+            for page in read_atlas_pages(path):
+                add(os.path.normpath(os.path.join(base_dir, page)).replace(os.sep, '/'))
+        elif ext in ('.css', '.js'):
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                text = f.read()
+            if ext == '.css':
+                for match in CSS_URL_PATTERN.finditer(text):
+                    add(_resolve_reference(base_dir, match.group('url')))
+            else:
+                # スクリプト内の相対パスはページ基準で解決されるが、念のため JS 自身の位置基準も見る
+                for match in JS_ASSET_LITERAL_PATTERN.finditer(text):
+                    add(_resolve_reference("", match.group('url')))
+                    add(_resolve_reference(base_dir, match.group('url')))
+    return reachable
+
+def prune_unreachable(sources, html, root="."):
+    """sources のうち index.html から辿れるものだけを残す -> (残すファイル, 除外したファイル)"""
+    reachable = find_reachable_assets(html, root)
+    kept = [rel for rel in sources if rel in reachable]
+    dropped = [rel for rel in sources if rel not in reachable]
+    return kept, dropped
+
+def report_pruned(kept, dropped, root=".", limit=15):
+    """除外したファイルとサイズ削減量を表示し、集計を返す"""
+    kept_bytes = sum(os.path.getsize(os.path.join(root, rel)) for rel in kept)
+    dropped_sizes = sorted(((os.path.getsize(os.path.join(root, rel)), rel) for rel in dropped), reverse=True)
+    dropped_bytes = sum(size for size, _ in dropped_sizes)
+    total = kept_bytes + dropped_bytes
+    ratio = dropped_bytes / total if total else 0.0
+    print(f"✂️ 到達不能なアセットを除外: {len(dropped)}ファイル {dropped_bytes:,} bytes "
+          f"({total:,} → {kept_bytes:,} bytes, -{ratio:.1%})")
+    by_dir = {}
+    for size, rel in dropped_sizes:
+        directory = os.path.dirname(rel)
+        count, subtotal = by_dir.get(directory, (0, 0))
+        by_dir[directory] = (count + 1, subtotal + size)
+    for directory, (count, subtotal) in sorted(by_dir.items(), key=lambda item: -item[1][1]):
+        print(f"  🗑️ {directory}/: {count}ファイル {subtotal:,} bytes")
+    for size, rel in dropped_sizes[:limit]:
+        print(f"    - {rel} ({size:,} bytes)")
+    if len(dropped_sizes) > limit:
+        print(f"    ... 他 {len(dropped_sizes) - limit}ファイル")
+    return {
+        "kept": len(kept),
+        "dropped": [rel for _, rel in dropped_sizes],
+        "bytes_before": total,
+        "bytes_after": kept_bytes,
+    }
+
+def fingerprinted_name(rel_path, digest):
+    """assets/x/name.ext -> assets/x/name.<hash>.ext"""
+    directory, filename = os.path.split(rel_path)
+    stem, ext = os.path.splitext(filename)
+    return f"{directory}/{stem}.{digest}{ext}" if directory else f"{stem}.{digest}{ext}"
+
+# 参照される側から先に処理する（ハッシュは書き換え後の内容で計算）
+FINGERPRINT_ORDER = {'.atlas': 1, '.json': 2, '.css': 3, '.js': 4}
+
+def fingerprint_assets(package_dir, hash_length=10, previous=None, jobs=None):
+    """index.html から参照されるアセットをコンテンツハッシュ付きの名前に変更
+
+    対象は index.html が直接参照するファイル、Spine 設定の atlas / JSON、
+    および atlas のページ画像。動的に組み立てたパスで読み込まれる
+    可能性のあるその他のファイルは名前を変えない。
+    previous（差分ビルド時の前回の対応表）のうち、リネーム済みのまま
+    残っているものは再利用する。参照関係の同じ段（画像 → atlas → JSON →
+    CSS → JS）のファイルは並列にハッシュ計算する。
+    """
+    print("\n🔖 アセットのフィンガープリント化中...")
+    
+    index_path = os.path.join(package_dir, "index.html")
+    with open(index_path, "r", encoding="utf-8") as f:
+        html = f.read()
+    
+    targets = set(find_page_references(html))
+    for character in find_spine_characters(html):
+        atlas_rel = os.path.normpath(os.path.join(character["base"], character["atlas"])).replace(os.sep, '/')
+        json_rel = os.path.normpath(os.path.join(character["base"], character["json"])).replace(os.sep, '/')
+        targets.update([atlas_rel, json_rel])
+        atlas_path = os.path.join(package_dir, atlas_rel)
+        if os.path.exists(atlas_path):
+            for page in read_atlas_pages(atlas_path):
+                targets.add(os.path.normpath(os.path.join(character["base"], page)).replace(os.sep, '/'))
+    
+    targets = sorted(
+        (rel for rel in targets
+         if rel != "index.html" and os.path.isfile(os.path.join(package_dir, rel))),
+        key=lambda rel: (FINGERPRINT_ORDER.get(os.path.splitext(rel)[1].lower(), 0), rel)
+    )
+    
+    renamed = {}
+    for rel, hashed in (previous or {}).items():
+        if (not os.path.exists(os.path.join(package_dir, rel))
+                and os.path.exists(os.path.join(package_dir, hashed))):
+            renamed[rel] = hashed
+    
+    levels = {}
+    for rel in targets:
+        levels.setdefault(FINGERPRINT_ORDER.get(os.path.splitext(rel)[1].lower(), 0), []).append(rel)
+    
+    for level in sorted(levels):
+        snapshot = dict(renamed)
+        tasks = [(package_dir, rel, snapshot, hash_length) for rel in levels[level]]
+        for rel, new_rel in parallel_map(_fingerprint_file, tasks, jobs):
+            renamed[rel] = new_rel
+            print(f"  🔖 {rel} -> {os.path.basename(new_rel)}")
+    
+    # 前回の古いハッシュ名のファイルを削除
+    for rel, hashed in (previous or {}).items():
+        if renamed.get(rel) != hashed:
+            remove_package_file(package_dir, hashed)
+    
+    html = rewrite_page_references(html, renamed)
+    write_file_atomic(index_path, html)
+    
+    manifest = {
+        "version": 1,
+        "algorithm": "sha256",
+        "hash_length": hash_length,
+        "assets": renamed,
+    }
+    with open(os.path.join(package_dir, ASSET_MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    
+    print(f"✅ フィンガープリント化完了: {len(renamed)}ファイル ({ASSET_MANIFEST_NAME})")
+    return renamed
+
+def _fingerprint_file(task):
+    """参照を書き換えてからハッシュ付きの名前に変更 -> (元の相対パス, 新しい相対パス)"""
+    package_dir, rel, renamed, hash_length = task
+    full_path = os.path.join(package_dir, rel)
+    ext = os.path.splitext(rel)[1].lower()
+    
+    if ext == '.atlas':
+        rewrite_atlas_pages(full_path, rel, renamed)
+    elif ext == '.css':
+        rewrite_css_urls(full_path, rel, renamed)
+    
+    digest = file_digest(full_path)[:hash_length]
+    new_rel = fingerprinted_name(rel, digest)
+    os.replace(full_path, os.path.join(package_dir, new_rel))
+    return rel, new_rel
+
+def rewrite_atlas_pages(atlas_path, atlas_rel, renamed):
+    """Atlas のページ画像行をリネーム後の名前に書き換え"""
+    base = os.path.dirname(atlas_rel)
+    with open(atlas_path, "r", encoding="utf-8") as f:
+        lines = f.read().split('\n')
+    pages = set(read_atlas_pages(atlas_path))
+    for i, line in enumerate(lines):
+        name = line.strip()
+        if name in pages:
+            page_rel = os.path.normpath(os.path.join(base, name)).replace(os.sep, '/')
+            if page_rel in renamed:
+                lines[i] = line.replace(name, os.path.basename(renamed[page_rel]))
+    write_file_atomic(atlas_path, '\n'.join(lines))
+
+def rewrite_css_urls(css_path, css_rel, renamed):
+    """CSS の url() 参照をリネーム後の名前に書き換え"""
+    base = os.path.dirname(css_rel)
+    with open(css_path, "r", encoding="utf-8") as f:
+        css = f.read()
+    
+    def replace(match):
+        local = split_local_url(match.group('url'))
+        if local is None:
+            return match.group(0)
+        target = os.path.normpath(os.path.join(base, local[0])).replace(os.sep, '/')
+        if target not in renamed:
+            return match.group(0)
+        new_url = os.path.relpath(renamed[target], base or '.').replace(os.sep, '/')
+        return f"url({match.group('quote')}{new_url}{local[1]}{match.group('quote')})"
+    
+    write_file_atomic(css_path, CSS_URL_PATTERN.sub(replace, css))
+
+def rewrite_page_references(html, renamed):
+    """index.html の src / href と Spine 設定をリネーム後の名前に書き換え"""
+    
+    def replace_reference(match):
+        url = match.group('url')
+        local = split_local_url(url)
+        if local is None or local[0] not in renamed:
+            return match.group(0)
+        prefix = './' if url.startswith('./') else ('/' if url.startswith('/') else '')
+        new_url = prefix + renamed[local[0]] + local[1]
+        return f"{match.group('attr')}{match.group('quote')}{new_url}{match.group('quote')}"
+    
+    def replace_config(match):
+        config = match.group(0)
+        base = split_local_url(match.group('base'))[0]
+        # 後ろのグループから置換して前のグループの位置をずらさない
+        for key in ('json', 'atlas'):
+            name = match.group(key)
+            rel = os.path.normpath(os.path.join(base, name)).replace(os.sep, '/')
+            if rel in renamed:
+                start, end = match.span(key)
+                offset = match.start()
+                new_name = os.path.basename(renamed[rel])
+                config = config[:start - offset] + new_name + config[end - offset:]
+        return config
+    
+    html = PAGE_REFERENCE_PATTERN.sub(replace_reference, html)
+    return SPINE_CONFIG_PATTERN.sub(replace_config, html)
+
+# --- JS/CSS バンドル・最小化 ---
+
+# これらのキーワードの直後の "/" は正規表現リテラル
+JS_REGEX_KEYWORDS = {
+    'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void',
+    'throw', 'case', 'do', 'else', 'yield', 'await',
+}
+
+# 除去対象のコンソール出力（console.warn / console.error は残す）
+JS_LOG_CALL_PATTERN = re.compile(r'\s*\.\s*(?:log|debug|info)\s*\(')
+
+# 引数に副作用がありうる呼び出し（代入・インクリメント・関数呼び出し・new 等）は除去しない
+JS_SIDE_EFFECT_PATTERN = re.compile(
+    r'\+\+|--|(?<![=!<>])=(?![=>])|\(|\bnew\b|\bawait\b|\byield\b|\bdelete\b'
+)
+
+# コード部分から取り除くコメント（残った "/" は正規表現リテラルか除算）
+JS_COMMENT_PATTERN = re.compile(r'//[^\n]*|/\*[\s\S]*?\*/')
+
+# 改行の次がこれらの文字なら前の行と式が続く（ログ呼び出しを文として除去できない）
+JS_CONTINUATION_CHARS = set('([`+-*/%,.?:=<>&|^')
+
+BUNDLE_DIR = "assets/bundles"
+
+def _is_js_word_char(c):
+    return c.isalnum() or c in '_$' or ord(c) > 127
+
+def _skip_js_string(src, i):
+    """'...' / "..." の終端の次の位置"""
+    quote = src[i]
+    i += 1
+    while i < len(src):
+        c = src[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == quote or c == '\n':
+            return i + 1
+        i += 1
+    return i
+
+def _skip_js_template(src, i):
+    """`...${...}...` の終端の次の位置（埋め込み式の入れ子に対応）"""
+    i += 1
+    while i < len(src):
+        c = src[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '`':
+            return i + 1
+        if c == '$' and src.startswith('${', i):
+            i = _skip_js_balanced(src, i + 1)
+            continue
+        i += 1
+    return i
+
+def _skip_js_regex(src, i):
+    """正規表現リテラルの終端の次の位置（改行に当たれば None）"""
+    j = i + 1
+    in_class = False
+    while j < len(src):
+        c = src[j]
+        if c == '\n':
+            return None
+        if c == '\\':
+            j += 2
+            continue
+        if c == '[':
+            in_class = True
+        elif c == ']':
+            in_class = False
+        elif c == '/' and not in_class:
+            j += 1
+            while j < len(src) and _is_js_word_char(src[j]):
+                j += 1
+            return j
+        j += 1
+    return None
+
+def _skip_js_balanced(src, i):
+    """src[i] の開き括弧に対応する閉じ括弧の次の位置（文字列・コメントは読み飛ばす）
+
+    正規表現リテラルは解釈しないため、中の括弧・引用符で位置がずれうる。
+    呼び出し側は範囲内に "/" があれば結果を信用しないこと。
+    """
+    depth = 0
+    while i < len(src):
+        c = src[i]
+        if c in '"\'':
+            i = _skip_js_string(src, i)
+            continue
+        if c == '`':
+            i = _skip_js_template(src, i)
+            continue
+        if src.startswith('//', i):
+            end = src.find('\n', i)
+            i = len(src) if end < 0 else end
+            continue
+        if src.startswith('/*', i):
+            end = src.find('*/', i + 2)
+            i = len(src) if end < 0 else end + 2
+            continue
+        if c in '([{':
+            depth += 1
+        elif c in ')]}':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return i
+
+def _js_code_only(src):
+    """文字列・テンプレート・コメントを除いたコード部分（副作用判定用）
+
+    ${...} を含むテンプレートは式を判定できるよう元のまま残す。
+    """
+    parts = []
+    i = 0
+    while i < len(src):
+        c = src[i]
+        if c in '"\'':
+            i = _skip_js_string(src, i)
+            parts.append('""')
+        elif c == '`':
+            start = i
+            i = _skip_js_template(src, i)
+            parts.append(src[start:i] if '${' in src[start:i] else '""')
+        else:
+            parts.append(c)
+            i += 1
+    return ''.join(parts)
+
+def _js_statement_end(src, i):
+    """src[i:] が文の終わり（; 改行 } 末尾）ならそこまで読み飛ばした位置、式が続くなら None
+
+    ; は読み飛ばし、改行と } は残す。改行の後が前の行に続く演算子・括弧なら None。
+    """
+    n = len(src)
+    while i < n and src[i] in ' \t\r\f\v':
+        i += 1
+    if i >= n or src[i] == '}':
+        return i
+    if src[i] == ';':
+        return i + 1
+    if src[i] != '\n':
+        return None
+    k = i
+    while k < n and src[k] in ' \t\r\n\f\v':
+        k += 1
+    if k < n and src[k] in JS_CONTINUATION_CHARS:
+        return None
+    return i
+
+def _js_regex_allowed(last):
+    """直前のトークンから "/" が正規表現の開始かを判定"""
+    if not last:
+        return True
+    if last in JS_REGEX_KEYWORDS:
+        return True
+    return not (_is_js_word_char(last[-1]) or last[-1] in ')]"\'`')
+
+def _js_needs_space(prev, token):
+    """間の空白を詰めるとトークンが結合してしまう組み合わせか"""
+    if not prev:
+        return False
+    a, b = prev[-1], token[0]
+    if _is_js_word_char(a) and _is_js_word_char(b):
+        return True
+    if a in '+-' and b == a:
+        return True
+    if a == '/' and b in '/*':
+        return True
+    if prev[0].isdigit() and b == '.':
+        return True
+    return False
+
+def minify_js(source, strip_logs=True):
+    """保守的な JavaScript 最小化
+
+    コメントと余分な空白を除去する。改行は 1 つにまとめて残すため
+    自動セミコロン挿入の挙動は変わらない。strip_logs=True の場合、
+    副作用のない console.log / debug / info 呼び出しを除去する。
+    戻り値: (最小化後ソース, 除去したログ呼び出し数)
+    """
+    out = []
+    last = ''
+    pending_space = False
+    pending_newline = False
+    removed_logs = 0
+    i = 0
+    n = len(source)
+    
+    while i < n:
+        c = source[i]
+        if c in ' \t\r\f\v\ufeff':
+            pending_space = True
+            i += 1
+            continue
+        if c == '\n':
+            pending_newline = True
+            i += 1
+            continue
+        if source.startswith('//', i):
+            end = source.find('\n', i)
+            i = n if end < 0 else end
+            continue
+        if source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            end = n if end < 0 else end + 2
+            if '\n' in source[i:end]:
+                pending_newline = True
+            else:
+                pending_space = True
+            i = end
+            continue
+        
+        token = None
+        regex_end = None
+        if c == '/' and _js_regex_allowed(last):
+            regex_end = _skip_js_regex(source, i)
+        
+        if c in '"\'':
+            j = _skip_js_string(source, i)
+        elif c == '`':
+            j = _skip_js_template(source, i)
+        elif regex_end is not None:
+            j = regex_end
+        elif _is_js_word_char(c):
+            j = i + 1
+            while j < n and _is_js_word_char(source[j]):
+                j += 1
+            if strip_logs and source[i:j] == 'console' and last != '.':
+                match = JS_LOG_CALL_PATTERN.match(source, j)
+                if match:
+                    call_end = _skip_js_balanced(source, match.end() - 1)
+                    args = source[match.end():call_end - 1]
+                    code = JS_COMMENT_PATTERN.sub(' ', _js_code_only(args))
+                    # 正規表現リテラル（かもしれない "/"）があると範囲の判定を信用できないので残す
+                    if '/' not in code and not JS_SIDE_EFFECT_PATTERN.search(code):
+                        if last in ('', ';', '{', '}'):
+                            # 呼び出しだけで文が終わる場合に限り文全体を除去（続くセミコロンも含む）
+                            statement_end = _js_statement_end(source, call_end)
+                            if statement_end is not None:
+                                removed_logs += 1
+                                i = statement_end
+                                continue
+                        else:
+                            # 式の位置にある呼び出しは void 0 に置換
+                            removed_logs += 1
+                            token = 'void 0'
+                            j = call_end
+        else:
+            j = i + 1
+        
+        if token is None:
+            token = source[i:j]
+        if pending_newline and out:
+            out.append('\n')
+        elif pending_space and _js_needs_space(last, token):
+            out.append(' ')
+        pending_space = False
+        pending_newline = False
+        out.append(token)
+        last = token
+        i = j
+    
+    return ''.join(out).strip() + '\n', removed_logs
+
+def minify_css(source):
+    """CSS の最小化（コメント・余分な空白の除去。/*! で始まるコメントは残す）"""
+    out = []
+    pending_space = False
+    i = 0
+    n = len(source)
+    while i < n:
+        c = source[i]
+        if c in '"\'':
+            j = _skip_js_string(source, i)
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            end = n if end < 0 else end + 2
+            if not source.startswith('/*!', i):
+                pending_space = True
+                i = end
+                continue
+            j = end
+        elif c.isspace():
+            pending_space = True
+            i += 1
+            continue
+        else:
+            j = i + 1
+        
+        token = source[i:j]
+        if token == '}' and out and out[-1] == ';':
+            out.pop()
+        if pending_space and out and out[-1][-1] not in '{};,>:' and token[0] not in '{};,>!':
+            out.append(' ')
+        pending_space = False
+        out.append(token)
+        i = j
+    return ''.join(out).strip() + '\n'
+
+def rebase_css_urls(css, from_dir, to_dir):
+    """CSS を別ディレクトリへ移す際に url() の相対パスを付け替え"""
+    
+    def replace(match):
+        local = split_local_url(match.group('url'))
+        if local is None or match.group('url').startswith('/'):
+            return match.group(0)
+        target = os.path.normpath(os.path.join(from_dir, local[0]))
+        new_url = os.path.relpath(target, to_dir or '.').replace(os.sep, '/')
+        return f"url({match.group('quote')}{new_url}{local[1]}{match.group('quote')})"
     
-    # index.htmlの内容チェック
+    return CSS_URL_PATTERN.sub(replace, css)
+
+SCRIPT_TAG_PATTERN = re.compile(r'<script\b(?P<attrs>[^>]*)>(?P<body>[\s\S]*?)</script\s*>', re.IGNORECASE)
+STYLESHEET_TAG_PATTERN = re.compile(
+    r'<link\b(?P<attrs>[^>]*\brel\s*=\s*["\']?stylesheet["\']?[^>]*?)/?>', re.IGNORECASE
+)
+TAG_ATTR_PATTERN = re.compile(r'\b(?P<name>[a-zA-Z-]+)(?:\s*=\s*(?P<quote>["\']?)(?P<value>[^"\'\s>]*)(?P=quote))?')
+
+# これらの属性を持つタグは読み込み順・評価方法が変わるためバンドルしない
+UNBUNDLEABLE_ATTRS = {'async', 'defer', 'nomodule', 'integrity', 'crossorigin', 'media', 'disabled'}
+
+def _bundleable_reference(match, url_attr, package_dir):
+    """バンドル可能なタグなら参照先の相対パス、そうでなければ None"""
+    attrs = {m.group('name').lower(): m.group('value') or '' for m in TAG_ATTR_PATTERN.finditer(match.group('attrs'))}
+    if UNBUNDLEABLE_ATTRS & attrs.keys():
+        return None
+    if attrs.get('type', 'text/javascript').lower() not in ('text/javascript', 'application/javascript', 'text/css'):
+        return None
+    if (match.groupdict().get('body') or '').strip():
+        return None
+    local = split_local_url(attrs.get(url_attr, ''))
+    if local is None:
+        return None
+    if not os.path.isfile(os.path.join(package_dir, local[0])):
+        # パッケージに含まれないファイルはバンドルにも入れない（元のタグのまま残す）
+        if os.path.isfile(local[0]):
+            print(f"  ⚠️ パッケージに含まれないためバンドル対象外: {local[0]}")
+        return None
+    return local[0]
+
+def find_bundle_groups(html, tag_pattern, url_attr, package_dir):
+    """連続して並ぶバンドル可能なタグのグループ（2個以上）"""
+    groups = []
+    current = []
+    prev_end = None
+    for match in tag_pattern.finditer(html):
+        rel = _bundleable_reference(match, url_attr, package_dir)
+        adjacent = prev_end is not None and re.fullmatch(r'\s*(?:<!--[\s\S]*?-->\s*)*', html[prev_end:match.start()])
+        if rel is not None and current and adjacent:
+            current.append((match, rel))
+        else:
+            if len(current) >= 2:
+                groups.append(current)
+            current = [(match, rel)] if rel is not None else []
+        prev_end = match.end()
+    if len(current) >= 2:
+        groups.append(current)
+    return groups
+
+def _read_bundle_source(package_dir, rel):
+    """パッケージ内にあるファイルの元の内容を読む
+
+    差分ビルドではパッケージ内のファイルが前回その場で最小化済みのことがあるため、
+    ソースツリーにあればそちらを優先する（パッケージにないファイルはバンドル対象外）。
+    """
+    path = rel
+    if not os.path.isfile(path):
+        path = os.path.join(package_dir, rel)
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def bundle_assets(package_dir, strip_logs=True, only=None, jobs=None):
+    """index.html のスクリプト/スタイル読み込みをバンドルし、JS/CSS を最小化
+
+    index.html に連続して並ぶローカルの <script src> / <link rel="stylesheet"> を
+    読み込み順どおりに連結して assets/bundles/ に出力する。元ファイルは動的読み込み
+    に備えてそのまま残し、パッケージ内の JS/CSS はすべてその場で最小化する
+    （libs/ 配下と .min.* のベンダーファイルは対象外）。
+    only を指定した場合、その場最小化はそこに含まれるファイルだけに行う（差分ビルド用）。
+    最小化はプロセスプールで並列に実行する。
+    """
+    print("\n📦 JS/CSS バンドル・最小化中...")
+    
+    report = {"bundles": [], "files": [], "removed_logs": 0}
+    
+    # 1. バンドル（元ファイルの内容から生成）
     index_path = os.path.join(package_dir, "index.html")
-    if os.path.exists(index_path):
-        with open(index_path, "r", encoding="utf-8") as f:
-            content = f.read()
+    with open(index_path, "r", encoding="utf-8") as f:
+        html = f.read()
+    
+    replacements = []
+    for kind, pattern, url_attr, ext in (
+        ("scripts", SCRIPT_TAG_PATTERN, "src", ".js"),
+        ("styles", STYLESHEET_TAG_PATTERN, "href", ".css"),
+    ):
+        for number, group in enumerate(find_bundle_groups(html, pattern, url_attr, package_dir), 1):
+            bundle_rel = f"{BUNDLE_DIR}/{kind}-{number}{ext}"
+            sources = [(rel, _read_bundle_source(package_dir, rel)) for _, rel in group]
+            before = sum(len(source.encode("utf-8")) for _, source in sources)
+            if ext == ".js":
+                results = parallel_map(_minify_js_task, [(source, strip_logs) for _, source in sources],
+                                       jobs, processes=True)
+                report["removed_logs"] += sum(removed for _, removed in results)
+                pieces = [f"/* {rel} */\n{minified}" for (rel, _), (minified, _) in zip(sources, results)]
+                content = "\n;\n".join(pieces)
+            else:
+                content = "".join(
+                    minify_css(rebase_css_urls(source, os.path.dirname(rel), BUNDLE_DIR))
+                    for rel, source in sources
+                )
+            
+            os.makedirs(os.path.join(package_dir, BUNDLE_DIR), exist_ok=True)
+            write_file_atomic(os.path.join(package_dir, bundle_rel), content)
+            after = len(content.encode("utf-8"))
+            report["bundles"].append({
+                "bundle": bundle_rel,
+                "sources": [rel for _, rel in group],
+                "bytes_before": before,
+                "bytes_after": after,
+            })
             
-        # 編集システム関連の文字列が残っていないか確認
-        edit_patterns = [
-            "loadEditingSystem",
-            "spine-positioning-system",
-            "spine-positioning-v2",
-            "edit-panel",
-            "urlParams.get('edit')",
-            "編集モード",
-            "loadPositionSystem"
+            if ext == ".js":
+                tag = f'<script src="{bundle_rel}"></script>'
+            else:
+                tag = f'<link rel="stylesheet" href="{bundle_rel}">'
+            replacements.append((group[0][0].start(), group[-1][0].end(), tag))
+            print(f"  🧩 {bundle_rel}: {len(group)}ファイル {before:,} → {after:,} bytes")
+    
+    for start, end, tag in sorted(replacements, reverse=True):
+        html = html[:start] + tag + html[end:]
+    write_file_atomic(index_path, html)
+    
+    # 2. パッケージ内 JS/CSS のその場最小化
+    tasks = []
+    for root, dirs, files in os.walk(os.path.join(package_dir, "assets")):
+        dirs[:] = sorted(d for d in dirs if d != "libs")
+        for file in sorted(files):
+            ext = os.path.splitext(file)[1].lower()
+            if ext not in (".js", ".css") or ".min." in file:
+                continue
+            path = os.path.join(root, file)
+            rel = os.path.relpath(path, package_dir).replace(os.sep, '/')
+            if rel.startswith(BUNDLE_DIR + "/") or (only is not None and rel not in only):
+                continue
+            tasks.append((path, rel, strip_logs))
+    
+    for item in parallel_map(_minify_file_task, tasks, jobs, processes=True):
+        report["removed_logs"] += item.pop("removed_logs")
+        report["files"].append(item)
+    
+    total_before = sum(item["bytes_before"] for item in report["files"])
+    total_after = sum(item["bytes_after"] for item in report["files"])
+    report["bytes_before"] = total_before
+    report["bytes_after"] = total_after
+    saved = total_before - total_after
+    ratio = (saved / total_before * 100) if total_before else 0.0
+    print(f"  📉 最小化: {len(report['files'])}ファイル {total_before:,} → {total_after:,} bytes "
+          f"(-{saved:,} bytes, -{ratio:.1f}%)")
+    print(f"  🔇 除去したログ呼び出し: {report['removed_logs']}箇所")
+    print("✅ バンドル・最小化完了")
+    return report
+
+def _minify_js_task(task):
+    source, strip_logs = task
+    return minify_js(source, strip_logs)
+
+def _minify_file_task(task):
+    """1ファイルのその場最小化（プロセスプールから呼ばれる）"""
+    path, rel, strip_logs = task
+    with open(path, "r", encoding="utf-8") as f:
+        source = f.read()
+    removed = 0
+    if path.lower().endswith(".js"):
+        minified, removed = minify_js(source, strip_logs)
+    else:
+        minified = minify_css(source)
+    write_file_atomic(path, minified)
+    return {
+        "file": rel,
+        "bytes_before": len(source.encode("utf-8")),
+        "bytes_after": len(minified.encode("utf-8")),
+        "removed_logs": removed,
+    }
+
+# --- Spine スケルトン JSON の軽量化 ---
+
+# 数値を丸める小数点以下の桁数（既定）
+SKELETON_PRECISION = 3
+# 許可リストに関係なく残すスキン（Spine ランタイムが既定で使用）
+SKELETON_REQUIRED_SKINS = {"default"}
+
+def quantize_skeleton(value, precision):
+    """小数を precision 桁に丸める（整数になった値は整数として出力）"""
+    if isinstance(value, float):
+        rounded = round(value, precision)
+        if rounded.is_integer():
+            return int(rounded)
+        return rounded
+    if isinstance(value, dict):
+        return {key: quantize_skeleton(item, precision) for key, item in value.items()}
+    if isinstance(value, list):
+        return [quantize_skeleton(item, precision) for item in value]
+    return value
+
+def prune_skeleton(data, animations=None, skins=None):
+    """許可リストにないアニメーション・スキンを除去し、除去した名前を返す
+
+    animations / skins が None の場合はすべて残す。
+    """
+    removed = {"animations": [], "skins": []}
+    if animations is not None and isinstance(data.get("animations"), dict):
+        for name in list(data["animations"]):
+            if name not in animations:
+                del data["animations"][name]
+                removed["animations"].append(name)
+    if skins is not None:
+        keep = set(skins) | SKELETON_REQUIRED_SKINS
+        if isinstance(data.get("skins"), list):
+            # Spine 4.x: [{"name": ..., "attachments": ...}]
+            removed["skins"] = [skin.get("name") for skin in data["skins"] if skin.get("name") not in keep]
+            data["skins"] = [skin for skin in data["skins"] if skin.get("name") in keep]
+        elif isinstance(data.get("skins"), dict):
+            # Spine 3.x: {"name": {...}}
+            for name in list(data["skins"]):
+                if name not in keep:
+                    del data["skins"][name]
+                    removed["skins"].append(name)
+    return removed
+
+def compare_skeleton(expected, actual, tolerance, path="$"):
+    """2つのスケルトンデータが許容誤差内で等しいか比較し、最初の差異を返す（一致なら None）"""
+    if isinstance(expected, bool) or isinstance(actual, bool):
+        return None if expected is actual else f"{path}: {expected!r} != {actual!r}"
+    if isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+        return None if abs(expected - actual) <= tolerance else f"{path}: {expected!r} != {actual!r}"
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        if expected.keys() != actual.keys():
+            return f"{path}: キーが一致しません"
+        for key in expected:
+            difference = compare_skeleton(expected[key], actual[key], tolerance, f"{path}.{key}")
+            if difference:
+                return difference
+        return None
+    if isinstance(expected, list) and isinstance(actual, list):
+        if len(expected) != len(actual):
+            return f"{path}: 要素数が一致しません"
+        for index, (a, b) in enumerate(zip(expected, actual)):
+            difference = compare_skeleton(a, b, tolerance, f"{path}[{index}]")
+            if difference:
+                return difference
+        # キーフレームの時刻の前後関係（同時刻になってしまうなど）が変わっていないこと
+        times = [(item.get("time", 0), other.get("time", 0)) for item, other in zip(expected, actual)
+                 if isinstance(item, dict) and isinstance(other, dict)]
+        for (before, after), (next_before, next_after) in zip(times, times[1:]):
+            if (before < next_before) != (after < next_after):
+                return f"{path}: キーフレームの順序が変わりました"
+        return None
+    return None if expected == actual else f"{path}: {expected!r} != {actual!r}"
+
+def compact_skeleton(text, precision=SKELETON_PRECISION, animations=None, skins=None):
+    """スケルトン JSON を軽量化 -> (軽量化した JSON, 除去した名前)
+
+    空白を除いて小数を丸め、許可リストにないアニメーション・スキンを除去する。
+    出力を読み直して、除去後の元データと許容誤差内で一致しなければ ValueError。
+    """
+    reference = json.loads(text)
+    removed = prune_skeleton(reference, animations, skins)
+    compact = json.dumps(quantize_skeleton(reference, precision), ensure_ascii=False,
+                         separators=(',', ':'))
+    difference = compare_skeleton(reference, json.loads(compact), 0.5 * 10 ** -precision + 1e-9)
+    if difference:
+        raise ValueError(f"軽量化後のデータが一致しません: {difference}")
+    return compact, removed
+
+def compact_skeletons(package_dir, precision=SKELETON_PRECISION, animations=None, skins=None,
+                      only=None, jobs=None):
+    """index.html の Spine 設定が参照するスケルトン JSON を軽量化
+
+    animations / skins はキャラクター名（JSON のファイル名）-> 残す名前のリスト。
+    指定のないキャラクターはすべて残す。
+    """
+    print("\n🦴 スケルトンJSON軽量化中...")
+    with open(os.path.join(package_dir, "index.html"), "r", encoding="utf-8") as f:
+        html = f.read()
+    
+    tasks = []
+    for character in find_spine_characters(html):
+        rel = os.path.normpath(os.path.join(character["base"], character["json"])).replace(os.sep, '/')
+        name = os.path.splitext(os.path.basename(rel))[0]
+        if not os.path.exists(os.path.join(package_dir, rel)) or (only is not None and rel not in only):
+            continue
+        tasks.append((package_dir, rel, precision,
+                      (animations or {}).get(name), (skins or {}).get(name)))
+    
+    results = parallel_map(_compact_skeleton_file, tasks, jobs)
+    for rel, original_size, compact_size, removed in results:
+        print(f"  ✅ {rel}: {original_size:,} → {compact_size:,} bytes")
+        for kind in ("animations", "skins"):
+            if removed[kind]:
+                print(f"     🗑️ {kind}: {', '.join(removed[kind])}")
+    print(f"✅ スケルトンJSON軽量化完了 (小数{precision}桁): {len(results)}ファイル")
+    return results
+
+def _compact_skeleton_file(task):
+    """1ファイルの軽量化 -> (相対パス, 元サイズ, 軽量化後サイズ, 除去した名前)"""
+    package_dir, rel, precision, animations, skins = task
+    path = os.path.join(package_dir, rel)
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    compact, removed = compact_skeleton(text, precision, animations, skins)
+    write_file_atomic(path, compact)
+    return rel, len(text.encode("utf-8")), len(compact.encode("utf-8")), removed
+
+def parse_name_lists(values):
+    """NAME=a,b,c 形式の指定を {NAME: [a, b, c]} に変換"""
+    lists = {}
+    for value in values:
+        name, sep, items = value.partition("=")
+        if not sep or not name.strip():
+            raise ValueError(value)
+        lists[name.strip()] = [item.strip() for item in items.split(",") if item.strip()]
+    return lists
+
+# --- PNG 最適化 ---
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# 残すチャンク（必須チャンクと、透過・色の見え方に影響する補助チャンク）
+PNG_KEEP_CHUNKS = {b'IHDR', b'PLTE', b'IDAT', b'IEND',
+                   b'tRNS', b'gAMA', b'cHRM', b'sRGB', b'iCCP', b'sBIT', b'cICP'}
+# カラータイプごとのチャンネル数
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# フィルタを選び直す画像の展開後サイズ上限（Paeth は純 Python のため大きい画像は再圧縮のみ）
+PNG_REFILTER_MAX_RAW = 4 * 1024 * 1024
+PNG_ZLIB_STRATEGIES = (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED)
+# 行ごとのフィルタ選択で使う「符号付きバイトの絶対値」表
+_PNG_ABS_TABLE = bytes(min(b, 256 - b) for b in range(256))
+
+def read_png_chunks(data):
+    """PNG を (チャンク種別, 内容) のリストに分解（CRC 不一致などは ValueError）"""
+    if not data.startswith(PNG_SIGNATURE):
+        raise ValueError("PNG シグネチャがありません")
+    chunks = []
+    pos = len(PNG_SIGNATURE)
+    while pos + 12 <= len(data):
+        length, chunk_type = struct.unpack('>I4s', data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        crc_bytes = data[pos + 8 + length:pos + 12 + length]
+        if len(body) != length or len(crc_bytes) != 4:
+            raise ValueError("チャンクが途中で切れています")
+        if zlib.crc32(chunk_type + body) != struct.unpack('>I', crc_bytes)[0]:
+            raise ValueError(f"CRC が一致しません: {chunk_type!r}")
+        chunks.append((chunk_type, body))
+        pos += 12 + length
+        if chunk_type == b'IEND':
+            return chunks
+    raise ValueError("IEND がありません")
+
+def png_chunk(chunk_type, body):
+    return struct.pack('>I', len(body)) + chunk_type + body + struct.pack('>I', zlib.crc32(chunk_type + body))
+
+class _ByteLanes:
+    """行全体を1つの整数として、バイト単位（mod 256）の演算をまとめて行う"""
+    
+    def __init__(self, length):
+        self.length = length
+        self.high = int.from_bytes(b'\x80' * length, 'big')
+        self.low = int.from_bytes(b'\x7f' * length, 'big')
+        self.even = int.from_bytes(b'\xfe' * length, 'big')
+    
+    def add(self, x, y):
+        return ((x & self.low) + (y & self.low)) ^ ((x ^ y) & self.high)
+    
+    def sub(self, x, y):
+        return ((x | self.high) - (y & self.low)) ^ ((x ^ y ^ self.high) & self.high)
+    
+    def average(self, x, y):
+        """floor((x + y) / 2)"""
+        return (x & y) + (((x ^ y) & self.even) >> 1)
+    
+    def to_bytes(self, x):
+        return x.to_bytes(self.length, 'big')
+
+def unfilter_png_rows(raw, height, row_len, bpp):
+    """フィルタ済みの画像データを行ごとの画素バイト列に戻す"""
+    lanes = _ByteLanes(row_len)
+    stride = row_len + 1
+    rows = []
+    prior = bytes(row_len)
+    for y in range(height):
+        filter_type = raw[y * stride]
+        line = raw[y * stride + 1:(y + 1) * stride]
+        if filter_type == 0:
+            row = line
+        elif filter_type == 1:
+            # Sub は bpp 間隔の累積和（シフト幅を倍々にして log 回で計算）
+            acc = int.from_bytes(line, 'big')
+            shift = bpp
+            while shift < row_len:
+                acc = lanes.add(acc, acc >> (8 * shift))
+                shift *= 2
+            row = lanes.to_bytes(acc)
+        elif filter_type == 2:
+            row = lanes.to_bytes(lanes.add(int.from_bytes(line, 'big'), int.from_bytes(prior, 'big')))
+        elif filter_type == 3:
+            out = bytearray(line)
+            for i in range(row_len):
+                left = out[i - bpp] if i >= bpp else 0
+                out[i] = (out[i] + ((left + prior[i]) >> 1)) & 0xff
+            row = bytes(out)
+        elif filter_type == 4:
+            out = bytearray(line)
+            for i in range(row_len):
+                if i >= bpp:
+                    out[i] = (out[i] + _paeth_predictor(out[i - bpp], prior[i], prior[i - bpp])) & 0xff
+                else:
+                    out[i] = (out[i] + prior[i]) & 0xff
+            row = bytes(out)
+        else:
+            raise ValueError(f"不明なフィルタ種別: {filter_type}")
+        rows.append(row)
+        prior = row
+    return rows
+
+def _paeth_predictor(a, b, c):
+    pa = abs(b - c)
+    pb = abs(a - c)
+    pc = abs(a + b - c - c)
+    if pa <= pb and pa <= pc:
+        return a
+    if pb <= pc:
+        return b
+    return c
+
+def _paeth_filter_row(row, prior, bpp):
+    out = bytearray(len(row))
+    for i in range(len(row)):
+        if i >= bpp:
+            out[i] = (row[i] - _paeth_predictor(row[i - bpp], prior[i], prior[i - bpp])) & 0xff
+        else:
+            out[i] = (row[i] - prior[i]) & 0xff
+    return bytes(out)
+
+def filter_png_rows(rows, row_len, bpp, mode):
+    """画素行をフィルタして IDAT 用のデータにする
+
+    mode="none" は全行フィルタなし、"adaptive" は行ごとに5種類のフィルタから
+    絶対値の和が最小のもの（libpng と同じ経験則）を選ぶ。
+    """
+    lanes = _ByteLanes(row_len)
+    shift = 8 * bpp
+    output = []
+    prior = bytes(row_len)
+    prior_value = 0
+    for row in rows:
+        if mode == "none":
+            output.append(b'\x00')
+            output.append(row)
+            continue
+        value = int.from_bytes(row, 'big')
+        candidates = [
+            row,
+            lanes.to_bytes(lanes.sub(value, value >> shift)),
+            lanes.to_bytes(lanes.sub(value, prior_value)),
+            lanes.to_bytes(lanes.sub(value, lanes.average(value >> shift, prior_value))),
+            _paeth_filter_row(row, prior, bpp),
         ]
-        
-        for pattern in edit_patterns:
-            # 商用版コメントは除外
-            if pattern == "編集モード" and "商用版：編集モード無効化" in content:
+        costs = [sum(line.translate(_PNG_ABS_TABLE)) for line in candidates]
+        filter_type = costs.index(min(costs))
+        output.append(bytes((filter_type,)))
+        output.append(candidates[filter_type])
+        prior = row
+        prior_value = value
+    return b''.join(output)
+
+def _deflate(data, strategy):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, strategy)
+    return compressor.compress(data) + compressor.flush()
+
+def optimize_png(data):
+    """PNG を可逆に再圧縮し、元より小さくなった場合だけ新しいバイト列を返す
+
+    画素データは変えずに、フィルタの選び直し・最大圧縮レベルでの再 deflate・
+    表示に影響しない補助チャンク（テキスト・Exif・タイムスタンプなど）の除去を行う。
+    APNG など扱えない形式や、小さくならない場合は None。
+    """
+    chunks = read_png_chunks(data)
+    chunk_types = {chunk_type for chunk_type, _ in chunks}
+    if chunks[0][0] != b'IHDR' or b'acTL' in chunk_types or b'IDAT' not in chunk_types:
+        return None
+    width, height, bit_depth, color_type, _, _, interlace = struct.unpack('>IIBBBBB', chunks[0][1])
+    if color_type not in PNG_CHANNELS:
+        return None
+    
+    filtered = zlib.decompress(b''.join(body for chunk_type, body in chunks if chunk_type == b'IDAT'))
+    streams = [filtered]
+    rows = None
+    
+    # インターレースなしで展開後サイズが上限以下なら、フィルタを選び直した候補も作る
+    bits_per_pixel = PNG_CHANNELS[color_type] * bit_depth
+    row_len = (width * bits_per_pixel + 7) // 8
+    bpp = max(1, bits_per_pixel // 8)
+    if not interlace and len(filtered) == height * (row_len + 1) and len(filtered) <= PNG_REFILTER_MAX_RAW:
+        rows = unfilter_png_rows(filtered, height, row_len, bpp)
+        for mode in ("none", "adaptive"):
+            stream = filter_png_rows(rows, row_len, bpp, mode)
+            if stream != filtered:
+                streams.append(stream)
+    
+    best_stream, best_idat = min(((stream, _deflate(stream, strategy))
+                                  for stream in streams for strategy in PNG_ZLIB_STRATEGIES),
+                                 key=lambda candidate: len(candidate[1]))
+    
+    output = [PNG_SIGNATURE]
+    idat_written = False
+    for chunk_type, body in chunks:
+        if chunk_type not in PNG_KEEP_CHUNKS:
+            continue
+        if chunk_type == b'IDAT':
+            if not idat_written:
+                output.append(png_chunk(b'IDAT', best_idat))
+                idat_written = True
+            continue
+        output.append(png_chunk(chunk_type, body))
+    optimized = b''.join(output)
+    if len(optimized) >= len(data):
+        return None
+    
+    # 画素データが変わっていないことを確認
+    if zlib.decompress(best_idat) != best_stream:
+        raise ValueError("再圧縮後の画像データが一致しません")
+    if best_stream is not filtered and unfilter_png_rows(best_stream, height, row_len, bpp) != rows:
+        raise ValueError("フィルタ変更後の画素データが一致しません")
+    return optimized
+
+def optimize_png_assets(package_dir, only=None, jobs=None):
+    """パッケージ内の PNG を可逆圧縮し直す（小さくならないファイルはそのまま）
+
+    only を指定した場合はその相対パス（差分ビルドで変更されたファイル）だけを対象にする。
+    """
+    print("\n🖼️ PNG 最適化中...")
+    tasks = []
+    for root, dirs, files in os.walk(package_dir):
+        dirs.sort()
+        for file in sorted(files):
+            if not file.lower().endswith('.png'):
                 continue
-            if pattern in content:
-                # より厳密なチェック（コメント化されたものは除外）
-                import re
-                # パターンが実際のコードに含まれているかチェック
-                pattern_regex = re.escape(pattern)
-                # コメント外でパターンが見つかった場合のみ問題とする
-                matches = re.findall(rf'(?<!//\s)(?<!/\*)\b{pattern_regex}\b', content)
-                if matches:
-                    issues.append(f"❌ 編集システムの痕跡: {pattern} ({len(matches)}箇所)")
-    
-    # 必要なファイルの存在確認
-    required_files = [
-        "assets/spine/spine-integration-v2.js",
-        "assets/spine/spine-character-manager.js",
-        "assets/spine/characters/purattokun/purattokun.json",
-        "assets/spine/characters/purattokun/purattokun.atlas",
-        "assets/spine/characters/purattokun/purattokun.png",
-        "server.py"
-    ]
+            rel = os.path.relpath(os.path.join(root, file), package_dir).replace(os.sep, '/')
+            if only is None or rel in only:
+                tasks.append((package_dir, rel))
     
-    for file_path in required_files:
-        full_path = os.path.join(package_dir, file_path)
-        if not os.path.exists(full_path):
-            issues.append(f"❌ 必要ファイル不足: {file_path}")
+    results = parallel_map(_optimize_png_file, tasks, jobs, processes=True)
+    before = after = 0
+    for rel, original_size, optimized_size, error in results:
+        before += original_size
+        after += optimized_size
+        if error:
+            print(f"  ⚠️ {rel}: スキップ ({error})")
+        elif optimized_size < original_size:
+            print(f"  ✅ {rel}: {original_size:,} → {optimized_size:,} bytes "
+                  f"(-{original_size - optimized_size:,})")
+        else:
+            print(f"  ➖ {rel}: 縮小なし ({original_size:,} bytes)")
+    print(f"✅ PNG 最適化完了: {len(tasks)}ファイル {before:,} → {after:,} bytes (-{before - after:,})")
+    return results
+
+def _optimize_png_file(task):
+    """1ファイルの最適化 -> (相対パス, 元サイズ, 最適化後サイズ, エラー)"""
+    package_dir, rel = task
+    path = os.path.join(package_dir, rel)
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        optimized = optimize_png(data)
+    except (ValueError, zlib.error) as e:
+        return rel, len(data), len(data), str(e)
+    if optimized is None:
+        return rel, len(data), len(data), None
+    # 一時ファイル経由で置き換え（ハードリンク元のファイルを書き換えない）
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(optimized)
+    os.replace(tmp_path, path)
+    return rel, len(data), len(optimized), None
+
+# --- 事前圧縮 ---
+
+PRECOMPRESS_EXTENSIONS = {'.html', '.js', '.css', '.json', '.atlas', '.svg', '.txt'}
+PRECOMPRESS_MIN_SIZE = 256
+
+def precompress_assets(package_dir, jobs=None):
+    """テキストアセットの .gz / .br を生成（元より小さくならないものは作らない）
+
+    出力は mtime=0 の gzip で、同じ入力からは同じバイト列になる。
+    """
+    print("\n🗜️ 事前圧縮中...")
+    tasks = []
+    for root, dirs, files in os.walk(package_dir):
+        dirs.sort()
+        for file in sorted(files):
+            path = os.path.join(root, file)
+            ext = os.path.splitext(file)[1].lower()
+            if ext in ('.gz', '.br'):
+                # 元ファイルがなくなった古い圧縮ファイルを削除
+                if not os.path.exists(path[:-len(ext)]):
+                    os.remove(path)
+                continue
+            if ext in PRECOMPRESS_EXTENSIONS and file != "server.py":
+                tasks.append(path)
+    
+    results = parallel_map(_precompress_file, tasks, jobs)
+    before = sum(size for size, _ in results)
+    after = sum(compressed for _, compressed in results)
+    encodings = "gzip + brotli" if brotli is not None else "gzip"
+    print(f"✅ 事前圧縮完了 ({encodings}): {len(tasks)}ファイル {before:,} → {after:,} bytes")
+    return results
+
+def _precompress_file(path):
+    """1ファイルの圧縮 -> (元サイズ, 最小の圧縮サイズ)"""
+    with open(path, "rb") as f:
+        data = f.read()
+    best = len(data)
+    variants = []
+    if len(data) >= PRECOMPRESS_MIN_SIZE:
+        variants.append(('.gz', gzip.compress(data, compresslevel=9, mtime=0)))
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(data, quality=11)))
+    for suffix, compressed in variants:
+        target = path + suffix
+        if len(compressed) < len(data):
+            with open(target + ".tmp", "wb") as f:
+                f.write(compressed)
+            os.replace(target + ".tmp", target)
+            best = min(best, len(compressed))
+        elif os.path.exists(target):
+            os.remove(target)
+    return len(data), best
+
+def resolve_package_path(package_dir, rel_path):
+    """マニフェストがあればフィンガープリント後のパスを返す"""
+    manifest_path = os.path.join(package_dir, ASSET_MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)["assets"].get(rel_path, rel_path)
+    return rel_path
+
+# --- アーカイブ出力 ---
+
+ARCHIVE_FORMATS = {".zip": "zip", ".tar.gz": "tar.gz", ".tgz": "tar.gz"}
+# 既定のエントリ時刻（SOURCE_DATE_EPOCH があればそちら）: zip で表せる最小の 1980-01-01
+ARCHIVE_EPOCH = 315532800
+# 圧縮済み形式は zip では無圧縮で格納する
+ARCHIVE_STORED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.webp', '.gif', '.gz', '.br', '.zip'}
+ARCHIVE_COMPRESS_LEVEL = 9
+# ビルド用の内部ファイルは納品物に含めない
+ARCHIVE_EXCLUDED_FILES = {BUILD_MANIFEST_NAME}
+
+def archive_format(path):
+    """拡張子からアーカイブ形式を判定（未対応なら ValueError）"""
+    lower = path.lower()
+    for ext, fmt in ARCHIVE_FORMATS.items():
+        if lower.endswith(ext):
+            return fmt
+    raise ValueError(f"未対応のアーカイブ形式です（.zip / .tar.gz / .tgz）: {path}")
+
+def archive_root_name(path):
+    """アーカイブ内の最上位ディレクトリ名（ファイル名から拡張子を除いたもの）"""
+    name = os.path.basename(path)
+    for ext in ARCHIVE_FORMATS:
+        if name.lower().endswith(ext):
+            return name[:-len(ext)]
+    return name
+
+def archive_epoch():
+    """エントリに付ける固定時刻（SOURCE_DATE_EPOCH を尊重、zip の下限 1980 年に切り上げ）"""
+    try:
+        epoch = int(os.environ.get("SOURCE_DATE_EPOCH", ARCHIVE_EPOCH))
+    except ValueError:
+        epoch = ARCHIVE_EPOCH
+    return max(epoch, ARCHIVE_EPOCH)
+
+def collect_archive_entries(package_dir, root_name):
+    """(アーカイブ内の名前, ファイルパス) をパス名順に列挙（順序を固定して再現性を保つ）"""
+    entries = []
+    for root, dirs, files in os.walk(package_dir):
+        dirs.sort()
+        for file in files:
+            path = os.path.join(root, file)
+            rel = os.path.relpath(path, package_dir).replace(os.sep, '/')
+            if rel in ARCHIVE_EXCLUDED_FILES:
+                continue
+            entries.append((f"{root_name}/{rel}" if root_name else rel, path))
+    entries.sort()
+    return entries
+
+def ordered_parallel_map(func, items, jobs=None):
+    """parallel_map と同じく入力順に結果を返すが、先行する実行数を jobs×2 に抑えて逐次 yield する
+
+    大きなパッケージでも圧縮結果を全件メモリに抱えずに書き出せる。
+    """
+    jobs = jobs or default_jobs()
+    if jobs <= 1:
+        for item in items:
+            yield func(item)
+        return
+    window = deque()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for item in items:
+            window.append(executor.submit(func, item))
+            if len(window) >= jobs * 2:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+def _zip_dos_datetime(epoch):
+    """UNIX 時刻を zip の (DOS 時刻, DOS 日付) に変換（UTC）"""
+    t = time.gmtime(epoch)
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+def _zip_member(task):
+    """1ファイルを読み込んで圧縮 -> (名前, 方式, CRC, 圧縮後データ, 元サイズ)"""
+    name, path = task
+    with open(path, "rb") as f:
+        data = f.read()
+    crc = zlib.crc32(data)
+    if os.path.splitext(name)[1].lower() in ARCHIVE_STORED_EXTENSIONS:
+        return name, 0, crc, data, len(data)
+    compressor = zlib.compressobj(ARCHIVE_COMPRESS_LEVEL, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    if len(compressed) >= len(data):
+        return name, 0, crc, data, len(data)
+    return name, 8, crc, compressed, len(data)
+
+def write_zip_stream(out, entries, epoch, jobs=None):
+    """決定的な zip を out に書き出す（ファイル単位の deflate をスレッドで並列実行）
+
+    zipfile はエントリを1つずつ圧縮するため、圧縮済みデータを受け取って
+    ローカルヘッダー・セントラルディレクトリを自前で書く。時刻・属性は固定値。
+    """
+    dos_time, dos_date = _zip_dos_datetime(epoch)
+    central = []
+    offset = 0
+    for name, method, crc, data, size in ordered_parallel_map(_zip_member, entries, jobs):
+        encoded = name.encode("utf-8")
+        if offset + len(data) > 0xFFFFFFFF:
+            raise ValueError("4GB を超える zip（ZIP64）には対応していません")
+        # flags 0x0800: ファイル名は UTF-8
+        header = struct.pack("<IHHHHHIIIHH", 0x04034B50, 20, 0x0800, method, dos_time, dos_date,
+                             crc, len(data), size, len(encoded), 0)
+        out.write(header)
+        out.write(encoded)
+        out.write(data)
+        central.append(struct.pack("<IHHHHHHIIIHHHHHII", 0x02014B50, (3 << 8) | 20, 20, 0x0800,
+                                   method, dos_time, dos_date, crc, len(data), size, len(encoded),
+                                   0, 0, 0, 0, 0o100644 << 16, offset) + encoded)
+        offset += len(header) + len(encoded) + len(data)
+    central_size = sum(len(record) for record in central)
+    for record in central:
+        out.write(record)
+    out.write(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, len(central), len(central),
+                          central_size, offset, 0))
+    return len(central)
+
+def _tar_member(task):
+    """1ファイル分の tar ブロック（ヘッダー＋本文＋パディング）を gzip メンバーに圧縮
+
+    戻り値: (gzip メンバー, 圧縮前の tar ブロック長)
+    """
+    name, path, epoch = task
+    with open(path, "rb") as f:
+        data = f.read()
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = epoch
+    info.mode = 0o644
+    info.uid = info.gid = 0
+    info.uname = info.gname = ""
+    block = info.tobuf(format=tarfile.PAX_FORMAT, encoding="utf-8")
+    raw = block + data + b"\0" * (-len(data) % tarfile.BLOCKSIZE)
+    return gzip.compress(raw, compresslevel=ARCHIVE_COMPRESS_LEVEL, mtime=0), len(raw)
+
+def write_tar_gz_stream(out, entries, epoch, jobs=None):
+    """決定的な tar.gz を out に書き出す
+
+    gzip は複数メンバーの連結を1つのストリームとして読めるため、ファイルごとの
+    tar ブロックを独立した gzip メンバーとして並列に圧縮し、順番に連結する。
+    """
+    tasks = [(name, path, epoch) for name, path in entries]
+    written = 0
+    tar_length = 0
+    for member, raw_length in ordered_parallel_map(_tar_member, tasks, jobs):
+        out.write(member)
+        written += 1
+        tar_length += raw_length
+    # 終端の空ブロック2つ＋レコード境界（RECORDSIZE）までのパディング（tarfile と同じ）
+    trailer = 2 * tarfile.BLOCKSIZE
+    trailer += -(tar_length + trailer) % tarfile.RECORDSIZE
+    out.write(gzip.compress(b"\0" * trailer, compresslevel=ARCHIVE_COMPRESS_LEVEL, mtime=0))
+    return written
+
+def write_package_archive(package_dir, archive_path, jobs=None):
+    """パッケージを .zip / .tar.gz に書き出す（同じ入力ならバイト単位で同一）
+
+    エントリはパス名順、時刻は SOURCE_DATE_EPOCH（なければ 1980-01-01）、
+    権限は 0644、所有者は 0 に正規化する。一時ファイルに書いてから置き換える。
+    """
+    fmt = archive_format(archive_path)
+    entries = collect_archive_entries(package_dir, archive_root_name(archive_path))
+    epoch = archive_epoch()
+    directory = os.path.dirname(os.path.abspath(archive_path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = archive_path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as out:
+            if fmt == "zip":
+                count = write_zip_stream(out, entries, epoch, jobs)
+            else:
+                count = write_tar_gz_stream(out, entries, epoch, jobs)
+        os.replace(tmp_path, archive_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    size = os.path.getsize(archive_path)
+    print(f"🗜️ アーカイブ出力: {archive_path} ({fmt}, {count}ファイル, {size:,} bytes)")
+    return archive_path
+
+# 検証で中身を走査するテキストファイル
+VALIDATE_TEXT_EXTENSIONS = {'.html', '.js', '.css', '.json', '.atlas'}
+# 走査対象の合計がこれ以上ならプロセスプールで走査（小さいパッケージは起動コストの方が大きい）
+VALIDATE_PROCESS_MIN_BYTES = 4 * 1024 * 1024
+
+# 編集システムファイル（パッケージに残っていてはいけない）
+EXCLUDED_EDIT_FILES = [
+    "spine-positioning-system-explanation.html",
+    "spine-positioning-system-explanation.css",
+    "spine-positioning-system-explanation.js",
+    "spine-positioning-v2.js",
+    "spine-positioning-v2.css",
+    "spine-positioning-system-minimal.js"
+]
+
+# 編集システム関連の文字列（テキストファイルに残っていてはいけない）
+EDIT_TRACE_PATTERNS = [
+    "loadEditingSystem",
+    "spine-positioning-system",
+    "spine-positioning-v2",
+    "edit-panel",
+    "urlParams.get('edit')",
+    "編集モード",
+    "loadPositionSystem"
+]
+
+# 全パターンを1本の正規表現にまとめ、1ファイル1回の走査で全パターンの候補を拾う
+# （長いパターンを先に並べて同一位置では最長一致。境界とコメントの判定は候補だけに行う）
+EDIT_TRACE_PATTERN = re.compile(
+    '|'.join(re.escape(pattern) for pattern in sorted(EDIT_TRACE_PATTERNS, key=len, reverse=True))
+)
+
+# このマーカーを含むファイルでは「編集モード」を痕跡として扱わない（商用版コメント）
+EDIT_TRACE_EXEMPTIONS = {"編集モード": "商用版：編集モード無効化"}
+
+REQUIRED_FILES = [
+    "assets/spine/spine-integration-v2.js",
+    "assets/spine/spine-character-manager.js",
+    "assets/spine/characters/purattokun/purattokun.json",
+    "assets/spine/characters/purattokun/purattokun.atlas",
+    "assets/spine/characters/purattokun/purattokun.png",
+    "server.py"
+]
+
+def validate_package(package_dir, jobs=None, report_path=None):
+    """パッケージの検証（テキストファイルは並列に1パス走査）
+
+    report_path を指定すると検証結果を JSON で書き出す。
+    """
+    
+    print("\n📋 パッケージ検証中...")
+    
+    text_files = []
+    text_bytes = 0
+    issues = []
+    for root, dirs, files in os.walk(package_dir):
+        dirs.sort()
+        for file in sorted(files):
+            rel = os.path.relpath(os.path.join(root, file), package_dir).replace(os.sep, "/")
+            if file in EXCLUDED_EDIT_FILES:
+                issues.append({"check": "excluded_file", "file": rel})
+            if os.path.splitext(file)[1].lower() in VALIDATE_TEXT_EXTENSIONS:
+                text_files.append(rel)
+                text_bytes += os.path.getsize(os.path.join(root, file))
+    
+    tasks = [(package_dir, rel) for rel in text_files]
+    use_processes = text_bytes >= VALIDATE_PROCESS_MIN_BYTES
+    for file_issues in parallel_map(_scan_text_file, tasks, jobs, processes=use_processes):
+        issues.extend(file_issues)
+    issues.extend(_check_required_files(package_dir))
     
     # 結果出力
     if issues:
         print("\n⚠️ 検証で問題が見つかりました:")
         for issue in issues:
-            print(f"  {issue}")
+            print(f"  {format_validation_issue(issue)}")
     else:
         print("✅ パッケージ検証成功 - 問題なし")
+    print(f"🔎 テキストファイル {len(text_files)}個を走査")
+    
+    if report_path:
+        report = {
+            "package": package_dir,
+            "valid": not issues,
+            "files_scanned": len(text_files),
+            "patterns": EDIT_TRACE_PATTERNS,
+            "issues": issues,
+        }
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"📝 検証結果を出力: {report_path}")
     
     return len(issues) == 0
 
+def format_validation_issue(issue):
+    """検証結果1件を表示用の文字列にする"""
+    if issue["check"] == "excluded_file":
+        return f"❌ 編集システムファイルが残存: {issue['file']}"
+    if issue["check"] == "required_file":
+        return f"❌ 必要ファイル不足: {issue['file']}"
+    locations = ", ".join(f"{loc['line']}:{loc['column']}" for loc in issue["locations"][:5])
+    if len(issue["locations"]) > 5:
+        locations += ", ..."
+    return (f"❌ 編集システムの痕跡: {issue['pattern']} "
+            f"({issue['file']} {issue['count']}箇所 - {locations})")
+
+def _scan_text_file(task):
+    """テキストファイル1つを全パターン同時に走査し、痕跡をパターンごとにまとめて返す"""
+    package_dir, rel = task
+    with open(os.path.join(package_dir, rel), "r", encoding="utf-8", errors="replace") as f:
+        content = f.read()
+    
+    exempt = {pattern for pattern, marker in EDIT_TRACE_EXEMPTIONS.items() if marker in content}
+    found = {}
+    line = 1
+    line_start = 0
+    scanned = 0
+    for match in EDIT_TRACE_PATTERN.finditer(content):
+        pattern = match.group(0)
+        if pattern in exempt or not _is_code_trace(content, match.start(), match.end()):
+            continue
+        # 行番号は前回のマッチ位置からの差分だけ数える
+        pos = match.start()
+        newlines = content.count("\n", scanned, pos)
+        if newlines:
+            line += newlines
+            line_start = content.rindex("\n", scanned, pos) + 1
+        scanned = pos
+        found.setdefault(pattern, []).append({"line": line, "column": pos - line_start + 1})
+    
+    return [
+        {"check": "trace", "file": rel, "pattern": pattern,
+         "count": len(locations), "locations": locations}
+        for pattern, locations in found.items()
+    ]
+
+def _is_word_char(char):
+    return char.isalnum() or char == "_"
+
+def _is_code_trace(content, start, end):
+    """候補がコメント直後でなく、より長い識別子の一部でもないかを判定"""
+    # 「// 」「/*」の直後はコメント化されたものとして除外
+    if content.startswith("/*", start - 2, start):
+        return False
+    if start >= 3 and content.startswith("//", start - 3) and content[start - 1].isspace():
+        return False
+    # 英数字で始まる・終わるパターンは前後が識別子文字なら別の単語の一部
+    if _is_word_char(content[start]) and start > 0 and _is_word_char(content[start - 1]):
+        return False
+    if _is_word_char(content[end - 1]) and end < len(content) and _is_word_char(content[end]):
+        return False
+    return True
+
+def _check_required_files(package_dir):
+    """必要なファイルの存在確認"""
+    issues = []
+    for file_path in REQUIRED_FILES:
+        full_path = os.path.join(package_dir, resolve_package_path(package_dir, file_path))
+        if not os.path.exists(full_path):
+            issues.append({"check": "required_file", "file": file_path})
+    return issues
+
 if __name__ == "__main__":
-    # 既存のパッケージディレクトリを削除
+    import argparse
     import glob
-    for old_package in glob.glob("commercial_package_*"):
-        if os.path.isdir(old_package):
-            shutil.rmtree(old_package)
-            print(f"🗑️ 古いパッケージを削除: {old_package}")
+    
+    parser = argparse.ArgumentParser(description="商用パッケージ生成")
+    parser.add_argument("--fingerprint", action="store_true",
+                        help="アセット名にコンテンツハッシュを付与し asset-manifest.json を出力")
+    parser.add_argument("--bundle", action="store_true",
+                        help="index.html のスクリプトをバンドルし JS/CSS を最小化")
+    parser.add_argument("--keep-logs", action="store_true",
+                        help="最小化時に console.log / debug / info を残す")
+    parser.add_argument("--incremental", action="store_true",
+                        help="既存パッケージとの差分だけを更新（--output のディレクトリを再利用）")
+    parser.add_argument("--output", default=None,
+                        help="出力ディレクトリ（差分モードの既定: commercial_package）")
+    parser.add_argument("--precompress", action="store_true",
+                        help="テキストアセットの .gz（brotli があれば .br も）を生成")
+    parser.add_argument("--optimize-png", action="store_true",
+                        help="PNG を可逆に再圧縮（フィルタ再選択・最大圧縮・補助チャンク除去）")
+    parser.add_argument("--compact-skeleton", action="store_true",
+                        help="スケルトン JSON の空白除去・小数の丸め・未使用アニメーション/スキンの除去")
+    parser.add_argument("--skeleton-precision", type=int, default=SKELETON_PRECISION,
+                        help=f"スケルトン JSON の小数桁数（既定: {SKELETON_PRECISION}）")
+    parser.add_argument("--skeleton-animations", action="append", default=[], metavar="NAME=A,B",
+                        help="キャラクターごとに残すアニメーション（例: purattokun=syutugen,taiki,yarare）")
+    parser.add_argument("--skeleton-skins", action="append", default=[], metavar="NAME=A,B",
+                        help="キャラクターごとに残すスキン（default は常に残す）")
+    parser.add_argument("--prune", action="store_true",
+                        help="index.html から辿れないアセットを含めない（除外したファイルとサイズ削減量を表示）")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help=f"並列ワーカー数（既定: CPUコア数 = {default_jobs()}）")
+    parser.add_argument("--link", choices=LINK_MODES, default=None,
+                        help="ファイル配置方法（既定: 通常 copy / 差分モード auto=reflink→copy）")
+    parser.add_argument("--archive", default=None, metavar="PATH",
+                        help="パッケージを .zip / .tar.gz / .tgz に書き出す（同じ入力ならバイト単位で同一）。"
+                             "--output 未指定ならハードリンクの一時ツリーから書き出して削除する")
+    parser.add_argument("--validate-report", default=None,
+                        help="検証結果を JSON で書き出すパス")
+    parser.add_argument("--timing-report", default=None,
+                        help="ステージ別の処理時間・入出力サイズを JSON で書き出すパス")
+    args = parser.parse_args()
+    
+    skeleton_options = None
+    if args.compact_skeleton:
+        if not 0 <= args.skeleton_precision <= 10:
+            parser.error("--skeleton-precision は0〜10を指定してください")
+        try:
+            skeleton_options = {
+                "precision": args.skeleton_precision,
+                "animations": parse_name_lists(args.skeleton_animations),
+                "skins": parse_name_lists(args.skeleton_skins),
+            }
+        except ValueError as e:
+            parser.error(f"NAME=A,B の形式が不正です: {e}")
+    
+    output_dir = args.output
+    if args.incremental and output_dir is None:
+        output_dir = "commercial_package"
+    link_mode = args.link or ("auto" if args.incremental else "copy")
+    timer = StageTimer()
+    
+    # アーカイブだけを出力する場合は、ソースへのハードリンクで一時ツリーを組む
+    # （内容はコピーせず、変換するファイルだけがアトミックな書き換えで実体化される）
+    staging_dir = None
+    if args.archive:
+        try:
+            archive_format(args.archive)
+        except ValueError as e:
+            parser.error(str(e))
+        if output_dir is None:
+            staging_dir = tempfile.mkdtemp(prefix=".package-staging-", dir=".")
+            output_dir = staging_dir
+            link_mode = args.link or "hardlink"
+    
+    # 既存のパッケージディレクトリを削除（差分モード・アーカイブのみの出力では残す）
+    if not args.incremental and staging_dir is None:
+        for old_package in glob.glob("commercial_package_*"):
+            if os.path.isdir(old_package):
+                shutil.rmtree(old_package)
+                print(f"🗑️ 古いパッケージを削除: {old_package}")
     
     # 新しいパッケージを生成
-    package_dir = create_commercial_package()
-    if validate_package(package_dir):
+    package_dir = create_commercial_package(
+        fingerprint=args.fingerprint,
+        bundle=args.bundle,
+        strip_logs=not args.keep_logs,
+        output_dir=output_dir,
+        incremental=args.incremental,
+        link_mode=link_mode,
+        precompress=args.precompress,
+        optimize_png=args.optimize_png,
+        skeleton_options=skeleton_options,
+        jobs=args.jobs,
+        timer=timer,
+        prune=args.prune,
+    )
+    try:
+        with timer.stage("validate", source=package_dir):
+            valid = validate_package(package_dir, jobs=args.jobs, report_path=args.validate_report)
+        if args.archive:
+            with timer.stage("archive", path=args.archive, source=package_dir):
+                write_package_archive(package_dir, args.archive, jobs=args.jobs)
+    finally:
+        if staging_dir is not None:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+    timer.print_report()
+    if args.timing_report:
+        timer.write_report(args.timing_report)
+    if valid:
         print(f"\n🎉 商用パッケージの生成が完了しました！")
-        print(f"📦 パッケージ: {package_dir}")
+        print(f"📦 パッケージ: {args.archive if staging_dir is not None else package_dir}")
         print(f"🚀 配布準備完了")
     else:
         print(f"\n⚠️ パッケージに問題があります。修正が必要です。")
\ No newline at end of file
@@ -8,149 +8,2033 @@ import http.server
 import socketserver
 import mimetypes
 import os
+import json
+import re
+import datetime
+import urllib.parse
+import email.utils
+import uuid
+import socket
+import select
+import sys
+import time
+import queue
+import random
+import gzip
+
+try:
+    import ssl
+except ImportError:  # ssl なしでビルドされた Python
+    ssl = None
+
+try:
+    import brotli  # 任意依存（pip install brotli）
+except ImportError:
+    brotli = None
+import threading
+import bisect
+import signal
+import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 
 # .atlasファイルをtext/plainとして認識させる
 mimetypes.add_type('text/plain', '.atlas')
 mimetypes.add_type('application/json', '.json')
 
+# アセット種別ごとの Cache-Control（--cache-control で上書き可能）
+CACHE_CONTROL_POLICY = {
+    'atlas': 'public, max-age=3600',
+    'json': 'public, max-age=3600',
+    'png': 'public, max-age=86400',
+    'image': 'public, max-age=86400',
+    'js': 'public, max-age=3600',
+    'css': 'public, max-age=3600',
+    'html': 'no-cache',
+    'default': 'public, max-age=300',
+    'immutable': 'public, max-age=31536000, immutable',
+}
+
+# create_package.py --fingerprint が出力するマニフェスト
+ASSET_MANIFEST_NAME = 'asset-manifest.json'
+
+# フィンガープリント付きアセットの絶対パス（load_asset_manifest で設定）
+IMMUTABLE_ASSETS = set()
+
+# 元のパス -> フィンガープリント付きパス（load_asset_manifest で設定）
+FINGERPRINTED_PATHS = {}
+
+ASSET_CLASSES = {
+    '.atlas': 'atlas',
+    '.json': 'json',
+    '.png': 'png',
+    '.jpg': 'image',
+    '.jpeg': 'image',
+    '.gif': 'image',
+    '.webp': 'image',
+    '.svg': 'image',
+    '.ico': 'image',
+    '.js': 'js',
+    '.mjs': 'js',
+    '.css': 'css',
+    '.html': 'html',
+    '.htm': 'html',
+}
+
+def asset_class_for(path):
+    """拡張子からアセット種別を判定"""
+    return ASSET_CLASSES.get(os.path.splitext(path)[1].lower(), 'default')
+
+def cache_control_for(path):
+    """アセット種別に応じた Cache-Control 値（フィンガープリント付きは immutable）"""
+    if IMMUTABLE_ASSETS and os.path.abspath(path) in IMMUTABLE_ASSETS:
+        return CACHE_CONTROL_POLICY['immutable']
+    return CACHE_CONTROL_POLICY.get(asset_class_for(path), CACHE_CONTROL_POLICY['default'])
+
+def load_asset_manifest(root='.'):
+    """asset-manifest.json を読み込み、フィンガープリント付きアセットを登録"""
+    manifest_path = os.path.join(root, ASSET_MANIFEST_NAME)
+    IMMUTABLE_ASSETS.clear()
+    FINGERPRINTED_PATHS.clear()
+    if not os.path.exists(manifest_path):
+        return 0
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    for source_path, hashed_path in manifest.get('assets', {}).items():
+        IMMUTABLE_ASSETS.add(os.path.abspath(os.path.join(root, hashed_path)))
+        FINGERPRINTED_PATHS[source_path] = hashed_path
+    return len(IMMUTABLE_ASSETS)
+
+# create_package.py が出力する重要アセットの一覧（ページ → Link: rel=preload ヘッダー値）
+PRELOAD_MANIFEST_NAME = 'preload-manifest.json'
+PRELOAD_LINKS = {}
+
+def format_link_header(items):
+    """プリロード項目を Link ヘッダーの値に整形（非ASCIIのパスはパーセントエンコード）"""
+    links = []
+    for item in items:
+        href = urllib.parse.quote(item['href'], safe="/:@?=&%+-._~")
+        link = f"<{href}>; rel=preload; as={item['as']}"
+        if item.get('crossorigin'):
+            link += "; crossorigin"
+        links.append(link)
+    return ", ".join(links)
+
+def load_preload_manifest(root='.'):
+    """preload-manifest.json を読み込み、ページごとの Link ヘッダーを登録"""
+    PRELOAD_LINKS.clear()
+    manifest_path = os.path.join(root, PRELOAD_MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return 0
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    for page, items in manifest.get('pages', {}).items():
+        if not items:
+            continue
+        header = format_link_header(items)
+        PRELOAD_LINKS['/' + page] = header
+        if page == 'index.html' or page.endswith('/index.html'):
+            PRELOAD_LINKS['/' + page[:-len('index.html')]] = header
+    return sum(len(items) for items in manifest.get('pages', {}).values())
+
+def resolve_asset_path(rel_path):
+    """フィンガープリント済みならハッシュ付きのパスを返す"""
+    return FINGERPRINTED_PATHS.get(rel_path, rel_path)
+
+def make_etag(st, encoding=None):
+    """mtime とサイズから強いETagを生成（圧縮表現ごとに別の値）"""
+    if encoding:
+        return f'"{st.st_mtime_ns:x}-{st.st_size:x}-{encoding}"'
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+# 圧縮対象のアセット種別とサイズ範囲
+COMPRESSIBLE_CLASSES = {'atlas', 'json', 'js', 'css', 'html'}
+COMPRESSIBLE_TYPES = {'image/svg+xml', 'application/xml', 'application/json', 'text/javascript'}
+MIN_COMPRESS_SIZE = 256
+MAX_COMPRESS_SIZE = 8 * 1024 * 1024
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+
+# サーバー側の優先順位と事前圧縮ファイルの拡張子
+CONTENT_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+def is_compressible(path, ctype):
+    """圧縮して送る価値のあるファイルか"""
+    if asset_class_for(path) in COMPRESSIBLE_CLASSES:
+        return True
+    ctype = ctype.split(';', 1)[0].strip().lower()
+    return ctype.startswith('text/') or ctype in COMPRESSIBLE_TYPES
+
+def parse_accept_encoding(value):
+    """Accept-Encoding を {coding: q} に変換"""
+    codings = {}
+    for item in value.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, val = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(val)
+                except ValueError:
+                    q = 0.0
+        codings[coding] = q
+    if 'x-gzip' in codings and 'gzip' not in codings:
+        codings['gzip'] = codings['x-gzip']
+    return codings
+
+def compress_body(data, encoding):
+    """オンザフライ圧縮（gzip は mtime=0 で再現性を保つ）"""
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+# キャッシュ対象外ファイルのコピー単位
+COPY_BUFSIZE = 64 * 1024
+
+# 1リクエストで受け付ける Range の最大数（これを超える場合は Range を無視して200）
+MAX_RANGES = 16
+
+def parse_range_header(value, size):
+    """Range ヘッダーを解析して (start, end) のリストを返す
+
+    None: ヘッダーが不正・未対応（Range を無視して全体を返す）
+    []:   満たせる範囲がない（416）
+    重なる・隣接する範囲は結合する。
+    """
+    unit, sep, spec = value.partition('=')
+    if not sep or unit.strip().lower() != 'bytes':
+        return None
+    
+    ranges = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, dash, last = part.partition('-')
+        first, last = first.strip(), last.strip()
+        if not dash or not (first.isdigit() or first == '') or not (last.isdigit() or last == ''):
+            return None
+        if first == '':
+            # サフィックス指定: 末尾 N バイト
+            if last == '':
+                return None
+            length = int(last)
+            if length == 0 or size == 0:
+                # 空ファイルの末尾 N バイトは満たせない
+                continue
+            ranges.append((max(0, size - length), size - 1))
+            continue
+        start = int(first)
+        end = int(last) if last else size - 1
+        if last and end < start:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+    
+    if len(ranges) > MAX_RANGES:
+        return None
+    
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def plan_byte_ranges(ranges, size, ctype):
+    """206 応答の構成を計算
+
+    戻り値: (Content-Type, Content-Length, parts, trailer)
+    parts は (前置きバイト列, start, end) のリスト。単一範囲なら前置きは空。
+    """
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        return ctype, end - start + 1, [(b'', start, end)], b''
+    
+    boundary = uuid.uuid4().hex
+    parts = []
+    length = 0
+    for start, end in ranges:
+        prefix = (f"\r\n--{boundary}\r\n"
+                  f"Content-Type: {ctype}\r\n"
+                  f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n").encode('latin-1')
+        parts.append((prefix, start, end))
+        length += len(prefix) + end - start + 1
+    trailer = f"\r\n--{boundary}--\r\n".encode('latin-1')
+    length += len(trailer)
+    return f"multipart/byteranges; boundary={boundary}", length, parts, trailer
+
+# 解析済み atlas API（/api/atlas/<キャラクター名>）
+ATLAS_API_PREFIX = '/api/atlas/'
+ATLAS_CHARACTER_DIR = 'assets/spine/characters'
+ATLAS_CHARACTER_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+
+# 旧形式（Spine 3.x）の行を新形式（Spine 4.x）の bounds / offsets にまとめる
+_ATLAS_LEGACY_KEYS = {'xy', 'size', 'orig', 'offset'}
+
+def _parse_atlas_value(value):
+    """atlas の値をカンマ区切りで解釈（数値・真偽値は変換、1要素ならスカラー）"""
+    items = []
+    for item in value.split(','):
+        item = item.strip()
+        if item == 'true':
+            items.append(True)
+        elif item == 'false':
+            items.append(False)
+        else:
+            try:
+                items.append(int(item))
+            except ValueError:
+                try:
+                    items.append(float(item))
+                except ValueError:
+                    items.append(item)
+    return items[0] if len(items) == 1 else items
+
+def _normalize_atlas_region(region):
+    """リージョンを新形式に正規化し、既定値の項目を省く"""
+    if 'xy' in region:
+        x, y = region.pop('xy')
+        width, height = region.pop('size')
+        region['bounds'] = [x, y, width, height]
+        orig = region.pop('orig', [width, height])
+        offset = region.pop('offset', [0, 0])
+        if offset != [0, 0] or orig != [width, height]:
+            region['offsets'] = offset + orig
+    rotate = region.get('rotate')
+    if rotate is True:
+        region['rotate'] = 90
+    elif rotate is False or rotate == 0:
+        del region['rotate']
+    if region.get('index') == -1:
+        del region['index']
+    return region
+
+def parse_atlas(text):
+    """Spine の .atlas テキストを解析してページのリストを返す
+
+    各ページは {'name', 'size', 'filter', 'pma', ..., 'regions': [...]}、
+    各リージョンは {'name', 'bounds': [x, y, w, h], 'offsets': [...], ...}。
+    Spine 3.x 形式（xy / size / orig / offset）は 4.x 形式に揃える。
+    """
+    pages = []
+    page = None
+    region = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            # 空行でページが終わる
+            page = None
+            region = None
+            continue
+        if page is None:
+            page = {'name': line, 'regions': []}
+            pages.append(page)
+        elif ':' in line:
+            key, value = line.split(':', 1)
+            target = region if region is not None else page
+            target[key.strip()] = _parse_atlas_value(value)
+        else:
+            region = {'name': line}
+            page['regions'].append(region)
+    
+    for page in pages:
+        # ページ属性の後にリージョン一覧を並べる
+        page['regions'] = [_normalize_atlas_region(region) for region in page.pop('regions')]
+    return pages
+
+def atlas_to_json(text):
+    """atlas テキストを解析済みのコンパクトな JSON（bytes）に変換"""
+    return json.dumps({'pages': parse_atlas(text)}, ensure_ascii=False,
+                      separators=(',', ':')).encode('utf-8')
+
+# 起動時インデックスの既定ポーリング間隔（秒）と走査しないディレクトリ
+ASSET_INDEX_INTERVAL = 2.0
+ASSET_INDEX_SKIP_DIRS = {'.git', '__pycache__', 'node_modules'}
+
+def guess_content_type(path):
+    """SimpleHTTPRequestHandler.guess_type と同じ規則で MIME タイプを判定"""
+    extensions_map = http.server.SimpleHTTPRequestHandler.extensions_map
+    base, ext = os.path.splitext(path)
+    if ext in extensions_map:
+        return extensions_map[ext]
+    ext = ext.lower()
+    if ext in extensions_map:
+        return extensions_map[ext]
+    guess, _ = mimetypes.guess_type(path)
+    return guess or 'application/octet-stream'
+
+class IndexedAsset:
+    """インデックス済みファイルの情報（パス・stat・MIME・ETag）"""
+    __slots__ = ('path', 'st', 'ctype', 'etag')
+
+    def __init__(self, path, st, ctype, etag):
+        self.path = path
+        self.st = st
+        self.ctype = ctype
+        self.etag = etag
+
+class AssetIndex:
+    """配信ツリーの path → (size, mtime, MIME, ETag) 表
+
+    起動時に1回ツリーを走査し、以降はバックグラウンドスレッドが interval 秒ごとに
+    再走査して差し替える（stat が変わっていないファイルは前回の項目を再利用）。
+    リクエスト処理はパス解決・MIME 判定・ETag 計算をこの表で済ませる。サイズと
+    更新時刻は開いたファイルの fstat から取るため、ポーリング間に書き換えられた
+    ファイルでも長さはずれない。ファイルの追加・削除は最大 interval 秒遅れて反映される。
+    """
+
+    def __init__(self, root='.', interval=ASSET_INDEX_INTERVAL, skip_dirs=ASSET_INDEX_SKIP_DIRS):
+        self.root = os.path.abspath(root)
+        self.interval = interval
+        self.skip_dirs = set(skip_dirs)
+        # (URL パス → 項目, 絶対パス → 項目) を1つのタプルで丸ごと差し替える
+        self._maps = ({}, {})
+        self._stop = threading.Event()
+        self._thread = None
+        self.refreshes = 0
+        self.last_refresh_ms = 0.0
+
+    def __len__(self):
+        return len(self._maps[0])
+
+    def lookup(self, url_path):
+        """URL パス（クエリなし・アンエスケープ済み）から項目を引く"""
+        return self._maps[0].get(url_path)
+
+    def lookup_path(self, file_path):
+        """ファイルパスから項目を引く"""
+        return self._maps[1].get(os.path.abspath(file_path))
+
+    def is_within_root(self, path):
+        """リンクを解決した実体がルート以下にあるか"""
+        real_root = os.path.realpath(self.root)
+        return os.path.commonpath([real_root, os.path.realpath(path)]) == real_root
+
+    def total_bytes(self):
+        return sum(entry.st.st_size for entry in self._maps[0].values())
+
+    def refresh(self):
+        """ツリーを再走査して表を差し替え、変更のあったファイル数を返す"""
+        started = time.perf_counter()
+        previous = self._maps[1]
+        by_url = {}
+        by_path = {}
+        changed = 0
+        pending = [self.root]
+        while pending:
+            directory = pending.pop()
+            try:
+                entries = os.scandir(directory)
+            except OSError:
+                continue
+            with entries:
+                for dir_entry in entries:
+                    try:
+                        # シンボリックリンクのディレクトリは辿らない（ルート外・循環を防ぐ）
+                        if dir_entry.is_dir(follow_symlinks=False):
+                            if dir_entry.name not in self.skip_dirs and not dir_entry.name.startswith('.'):
+                                pending.append(dir_entry.path)
+                            continue
+                        if not dir_entry.is_file():
+                            continue
+                        if dir_entry.is_symlink() and not self.is_within_root(dir_entry.path):
+                            continue
+                        st = dir_entry.stat()
+                    except OSError:
+                        continue
+                    entry = previous.get(dir_entry.path)
+                    if (entry is None or entry.st.st_mtime_ns != st.st_mtime_ns
+                            or entry.st.st_size != st.st_size or entry.st.st_ino != st.st_ino):
+                        entry = IndexedAsset(dir_entry.path, st, guess_content_type(dir_entry.path),
+                                             make_etag(st))
+                        changed += 1
+                    rel = os.path.relpath(dir_entry.path, self.root).replace(os.sep, '/')
+                    by_url['/' + rel] = entry
+                    by_path[dir_entry.path] = entry
+        changed += len(previous.keys() - by_path.keys())
+        self._maps = (by_url, by_path)
+        self.refreshes += 1
+        self.last_refresh_ms = (time.perf_counter() - started) * 1000
+        return changed
+
+    def start(self):
+        """バックグラウンドでのポーリングを開始（interval が 0 以下なら何もしない）"""
+        if self.interval and self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._poll, name="asset-index", daemon=True)
+            self._thread.start()
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[INDEX] 再走査に失敗: {e}")
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self):
+        return {
+            "files": len(self),
+            "refreshes": self.refreshes,
+            "last_refresh_ms": round(self.last_refresh_ms, 3),
+            "interval_s": self.interval,
+        }
+
+class FileContentCache:
+    """ファイル内容のLRUキャッシュ（バイト数上限付き）
+
+    パスごとに (mtime, size) を記録し、ディスク上のファイルが変更されていれば
+    自動的に読み直す。圧縮済み表現などの派生データも同じ予算で保持する。
+    複数スレッドから安全に利用できる。
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, max_entry_bytes=4 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self._entries = OrderedDict()  # (path, variant) -> (mtime_ns, size, data)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, path, st=None, fileobj=None):
+        """ファイル内容を返す（キャッシュになければ読み込んで登録）
+
+        st: 取得済みの os.stat 結果（省略時はここで stat する）
+        fileobj: 既に開いているファイル（ミス時はここから読む）
+        """
+        return self.fetch(path, st, fileobj)[0]
+
+    def fetch(self, path, st=None, fileobj=None):
+        """get と同じだが (データ, キャッシュヒットしたか) を返す"""
+        if st is None:
+            st = os.stat(path)
+        key = (os.path.abspath(path), None)
+        
+        data = self._lookup(key, st)
+        if data is not None:
+            return data, True
+        
+        if fileobj is not None:
+            data = fileobj.read()
+        else:
+            with open(path, 'rb') as f:
+                data = f.read()
+        
+        # 読み込み中に変更された場合は登録しない
+        if len(data) == st.st_size and st.st_size <= self.max_entry_bytes:
+            self._store(key, st, data)
+        return data, False
+
+    def get_derived(self, path, st, variant, build):
+        """ファイルから派生したデータ（圧縮結果など）を返す
+
+        build() は未登録または元ファイル変更時にのみ呼ばれる。
+        """
+        return self.fetch_derived(path, st, variant, build)[0]
+
+    def fetch_derived(self, path, st, variant, build):
+        """get_derived と同じだが (データ, キャッシュヒットしたか) を返す"""
+        key = (os.path.abspath(path), variant)
+        data = self._lookup(key, st)
+        if data is not None:
+            return data, True
+        data = build()
+        if len(data) <= self.max_entry_bytes:
+            self._store(key, st, data)
+        return data, False
+
+    def _lookup(self, key, st):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2]
+                # ディスク上で変更された
+                self._remove(key)
+                self.invalidations += 1
+            self.misses += 1
+        return None
+
+    def _store(self, key, st, data):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (st.st_mtime_ns, st.st_size, data)
+            self.current_bytes += len(data)
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, _, data = self._entries.pop(key)
+        self.current_bytes -= len(data)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """キャッシュ統計（予算サイズ調整用）"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "max_entry_bytes": self.max_entry_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+# アクセスログのプロファイル（sample_rate: 正常応答を記録する割合、エラーは常に記録）
+LOG_PROFILES = {
+    'verbose': {'sample_rate': 1.0, 'debug': True},
+    'default': {'sample_rate': 1.0, 'debug': False},
+    'quiet': {'sample_rate': 0.0, 'debug': False},
+}
+LOG_QUEUE_SIZE = 10000
+LOG_BATCH_SIZE = 512
+
+class AccessLogger:
+    """バックグラウンドスレッドでアクセスログを JSON Lines として書き出す
+
+    リクエスト処理スレッドはキューに積むだけで、出力を待たない。
+    キューが溢れた場合は記録を捨てて dropped を数える。
+    書き出しスレッドはキューに溜まった分をまとめて1回で書き込む。
+    """
+
+    _STOP = object()
+
+    def __init__(self, stream=None, sample_rate=1.0, debug=False,
+                 queue_size=LOG_QUEUE_SIZE, batch_size=LOG_BATCH_SIZE):
+        self.stream = stream if stream is not None else sys.stdout
+        self.sample_rate = sample_rate
+        self.debug = debug
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self._thread = threading.Thread(target=self._run, name="spine-access-log", daemon=True)
+        self._thread.start()
+
+    def access(self, record):
+        """アクセス記録（エラー応答は常に、正常応答は sample_rate の割合で記録）"""
+        if record['status'] < 400 and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            with self._lock:
+                self.sampled_out += 1
+            return
+        self.log(record)
+
+    def log(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = self._STOP in batch
+            lines = [self.format_record(record) for record in batch if record is not self._STOP]
+            if lines:
+                try:
+                    self.stream.write('\n'.join(lines) + '\n')
+                    self.stream.flush()
+                except (OSError, ValueError):
+                    pass
+                with self._lock:
+                    self.written += len(lines)
+            if stop:
+                return
+
+    @staticmethod
+    def format_record(record):
+        record = dict(record)
+        ts = record.pop('ts', None)
+        if ts is not None:
+            moment = datetime.datetime.fromtimestamp(ts, datetime.timezone.utc)
+            record = {'time': moment.isoformat(timespec='milliseconds'), **record}
+        return json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+
+    def close(self, timeout=2.0):
+        """キューに残った記録を書き出して終了"""
+        self._queue.put(self._STOP)
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "written": self.written,
+                "dropped": self.dropped,
+                "sampled_out": self.sampled_out,
+                "queued": self._queue.qsize(),
+            }
+
+# レイテンシヒストグラムのバケット上限（ミリ秒、最後は +Inf）
+LATENCY_BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+def route_for(path):
+    """メトリクス集計用のルート名（ラベル数が増えないよう種別単位にまとめる）"""
+    path = path.split('?', 1)[0].split('#', 1)[0]
+    if path in ('/__cache', '/__metrics'):
+        return path
+    if path.startswith(ATLAS_API_PREFIX):
+        return '/api/atlas'
+    if path.endswith('/'):
+        return 'directory'
+    return f'static:{asset_class_for(path)}'
+
+def histogram_quantile(q, counts, bounds=LATENCY_BUCKETS_MS, maximum=None):
+    """バケットの度数から分位点を推定（バケット内は線形補間）"""
+    total = sum(counts)
+    if not total:
+        return 0.0
+    rank = q * total
+    cumulative = 0
+    lower = 0.0
+    for index, count in enumerate(counts):
+        upper = bounds[index] if index < len(bounds) else (maximum if maximum is not None else lower)
+        if count and cumulative + count >= rank:
+            estimate = lower + (upper - lower) * (rank - cumulative) / count
+            return min(estimate, maximum) if maximum is not None else estimate
+        cumulative += count
+        lower = upper
+    return lower
+
+class ServerMetrics:
+    """ルートごとのリクエスト数・送信バイト数・ステータス・レイテンシを集計
+
+    レイテンシは固定バケットのヒストグラムで保持するため、メモリ使用量は
+    リクエスト数によらず一定。記録はロック1回とバケット探索のみ。
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._routes = {}  # route -> {"requests", "bytes", "status", "counts", "sum_ms", "max_ms"}
+        self.connections_in_flight = 0
+        self.connections_total = 0
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections_in_flight += 1
+            self.connections_total += 1
+
+    def connection_closed(self):
+        with self._lock:
+            self.connections_in_flight -= 1
+
+    def record(self, route, status, sent_bytes, latency_ms):
+        bucket = bisect.bisect_left(self.buckets, latency_ms)
+        with self._lock:
+            entry = self._routes.get(route)
+            if entry is None:
+                entry = self._routes[route] = {
+                    "requests": 0, "bytes": 0, "status": {},
+                    "counts": [0] * (len(self.buckets) + 1), "sum_ms": 0.0, "max_ms": 0.0,
+                }
+            entry["requests"] += 1
+            entry["bytes"] += sent_bytes
+            entry["status"][status] = entry["status"].get(status, 0) + 1
+            entry["counts"][bucket] += 1
+            entry["sum_ms"] += latency_ms
+            if latency_ms > entry["max_ms"]:
+                entry["max_ms"] = latency_ms
+
+    def snapshot(self):
+        """集計値のコピー（ロック外で整形するため）"""
+        with self._lock:
+            routes = {route: dict(entry, status=dict(entry["status"]), counts=list(entry["counts"]))
+                      for route, entry in self._routes.items()}
+            return routes, self.connections_in_flight, self.connections_total
+
+    def to_json(self, cache=None, logger=None):
+        routes, in_flight, total = self.snapshot()
+        report = {
+            "pid": os.getpid(),
+            "uptime_s": round(time.time() - self.started, 3),
+            "connections": {"in_flight": in_flight, "total": total},
+            "routes": {},
+        }
+        for route, entry in sorted(routes.items()):
+            counts = entry["counts"]
+            report["routes"][route] = {
+                "requests": entry["requests"],
+                "bytes": entry["bytes"],
+                "status": {str(status): count for status, count in sorted(entry["status"].items())},
+                "latency_ms": {
+                    "p50": round(histogram_quantile(0.5, counts, self.buckets, entry["max_ms"]), 3),
+                    "p90": round(histogram_quantile(0.9, counts, self.buckets, entry["max_ms"]), 3),
+                    "p99": round(histogram_quantile(0.99, counts, self.buckets, entry["max_ms"]), 3),
+                    "max": round(entry["max_ms"], 3),
+                    "mean": round(entry["sum_ms"] / entry["requests"], 3),
+                },
+            }
+        if cache is not None:
+            report["cache"] = cache.stats()
+        if logger is not None:
+            report["access_log"] = logger.stats()
+        return report
+
+    def to_prometheus(self, cache=None, logger=None):
+        """Prometheus テキスト形式（version 0.0.4）"""
+        routes, in_flight, total = self.snapshot()
+        lines = [
+            "# HELP spine_http_requests_total HTTP requests by route and status.",
+            "# TYPE spine_http_requests_total counter",
+        ]
+        for route, entry in sorted(routes.items()):
+            for status, count in sorted(entry["status"].items()):
+                lines.append(f'spine_http_requests_total{{route="{route}",status="{status}"}} {count}')
+        lines += [
+            "# HELP spine_http_response_bytes_total Response body bytes by route.",
+            "# TYPE spine_http_response_bytes_total counter",
+        ]
+        for route, entry in sorted(routes.items()):
+            lines.append(f'spine_http_response_bytes_total{{route="{route}"}} {entry["bytes"]}')
+        lines += [
+            "# HELP spine_http_request_duration_seconds Request latency by route.",
+            "# TYPE spine_http_request_duration_seconds histogram",
+        ]
+        for route, entry in sorted(routes.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (None,), entry["counts"]):
+                cumulative += count
+                le = "+Inf" if bound is None else f"{bound / 1000:g}"
+                lines.append(f'spine_http_request_duration_seconds_bucket{{route="{route}",le="{le}"}} {cumulative}')
+            lines.append(f'spine_http_request_duration_seconds_sum{{route="{route}"}} {entry["sum_ms"] / 1000:.6f}')
+            lines.append(f'spine_http_request_duration_seconds_count{{route="{route}"}} {entry["requests"]}')
+        lines += [
+            "# HELP spine_http_connections_in_flight Open client connections.",
+            "# TYPE spine_http_connections_in_flight gauge",
+            f"spine_http_connections_in_flight {in_flight}",
+            "# HELP spine_http_connections_total Accepted client connections.",
+            "# TYPE spine_http_connections_total counter",
+            f"spine_http_connections_total {total}",
+        ]
+        if cache is not None:
+            stats = cache.stats()
+            lines += [
+                "# TYPE spine_cache_hits_total counter", f"spine_cache_hits_total {stats['hits']}",
+                "# TYPE spine_cache_misses_total counter", f"spine_cache_misses_total {stats['misses']}",
+                "# TYPE spine_cache_hit_ratio gauge", f"spine_cache_hit_ratio {stats['hit_ratio']}",
+                "# TYPE spine_cache_bytes gauge", f"spine_cache_bytes {stats['bytes']}",
+                "# TYPE spine_cache_evictions_total counter", f"spine_cache_evictions_total {stats['evictions']}",
+            ]
+        if logger is not None:
+            stats = logger.stats()
+            lines += [
+                "# TYPE spine_access_log_dropped_total counter",
+                f"spine_access_log_dropped_total {stats['dropped']}",
+            ]
+        return "\n".join(lines) + "\n"
+
+# keep-alive の既定値（アイドル秒数・1接続あたりの最大リクエスト数）
+KEEPALIVE_TIMEOUT = 5.0
+KEEPALIVE_MAX_REQUESTS = 100
+# アイドル接続が他の接続の待ちを確認する間隔（秒）
+KEEPALIVE_POLL_INTERVAL = 0.25
+
 class SpineHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     """Spine WebGL用のカスタムHTTPハンドラー - 修正版"""
     
+    # run_server で設定される共有キャッシュ（None ならキャッシュ無効）
+    content_cache = None
+    
+    # このサイズ以上のファイルは sendfile で送信（None なら sendfile 無効）
+    sendfile_min_size = 64 * 1024
+    
+    # run_server で設定されるアクセスログ（None なら標準の stderr 出力）
+    access_logger = None
+    
+    # run_server で設定されるメトリクス（None なら集計しない）
+    metrics = None
+    
+    # run_server で設定される起動時アセットインデックス（None なら毎回 stat する）
+    asset_index = None
+    
+    # プリロード対象ページへの応答前に 103 Early Hints を送るか（run_server で設定）
+    early_hints = False
+    
+    # HTTP/1.1 keep-alive（run_server で設定、timeout が None なら HTTP/1.0 で毎回切断）
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT
+    keepalive_max_requests = KEEPALIVE_MAX_REQUESTS
+    
+    def handle(self):
+        """1接続で複数のリクエストを処理（アイドル時間・リクエスト数に上限）"""
+        self.requests_handled = 0
+        self.close_connection = True
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.connection_opened()
+        try:
+            self.handle_one_request()
+            while not self.close_connection:
+                if not self.wait_for_request():
+                    break
+                self.handle_one_request()
+        finally:
+            if metrics is not None:
+                metrics.connection_closed()
+    
+    def wait_for_request(self):
+        """次のリクエストを待つ（タイムアウトや他の接続が待っている場合は False）
+
+        待機中の接続があればアイドルな接続を閉じてワーカーを譲る。
+        """
+        if self.has_buffered_request():
+            return True
+        deadline = time.monotonic() + self.timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([self.connection], [], [], min(remaining, KEEPALIVE_POLL_INTERVAL))
+            if readable:
+                return True
+            if self.server_has_waiting_connections() or getattr(self.server, 'draining', False):
+                return False
+    
+    def has_buffered_request(self):
+        """次のリクエストが既に読み込みバッファにあるか（パイプライン）"""
+        self.connection.settimeout(0)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+    
+    def server_has_waiting_connections(self):
+        waiting = getattr(self.server, 'waiting_connections', None)
+        if waiting is not None:
+            return waiting() > 0
+        # 逐次処理のサーバーでは listen キューに接続があるか確認
+        readable, _, _ = select.select([self.server.socket], [], [], 0)
+        return bool(readable)
+    
+    def handle_one_request(self):
+        """1リクエストを処理し、応答内容をアクセスログに記録"""
+        self.request_started = time.perf_counter()
+        self.response_status = None
+        self.response_length = None
+        self.cache_status = None
+        super().handle_one_request()
+        if self.response_status is None:
+            return
+        latency_ms = (time.perf_counter() - self.request_started) * 1000
+        sent_bytes = 0 if self.command == 'HEAD' else (self.response_length or 0)
+        if self.metrics is not None:
+            self.metrics.record(route_for(self.path), self.response_status, sent_bytes, latency_ms)
+        if self.access_logger is not None:
+            self.access_logger.access({
+                "ts": time.time(),
+                "client": self.client_address[0],
+                "method": self.command,
+                "path": self.path,
+                "status": self.response_status,
+                "bytes": sent_bytes,
+                "ms": round(latency_ms, 3),
+                "cache": self.cache_status,
+            })
+    
+    def send_response(self, code, message=None):
+        super().send_response(code, message)
+        self.requests_handled += 1
+    
+    def send_header(self, keyword, value):
+        if keyword.lower() == 'content-length':
+            self.response_length = int(value)
+        super().send_header(keyword, value)
+    
     def end_headers(self):
         # CORS対応
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        if self.requests_handled >= self.keepalive_max_requests and not self.close_connection:
+            self.send_header('Connection', 'close')
+        if self.request_version == 'HTTP/1.1' and not self.close_connection:
+            remaining = self.keepalive_max_requests - self.requests_handled
+            self.send_header('Keep-Alive', f'timeout={int(self.timeout)}, max={remaining}')
         super().end_headers()
     
+    def request_path(self):
+        """クエリ・フラグメントを除いたリクエストパス"""
+        return self.path.split('?', 1)[0].split('#', 1)[0]
+    
+    def indexed_asset(self):
+        """アセットインデックスからリクエストされたファイルを引く（なければ None）
+
+        / で終わるパスはディレクトリ内の index.html を引く。
+        """
+        if self.asset_index is None:
+            return None
+        url_path = urllib.parse.unquote(self.request_path())
+        if url_path.endswith('/'):
+            url_path += 'index.html'
+        return self.asset_index.lookup(url_path)
+    
+    def send_early_hints(self):
+        """プリロード対象ページなら 103 Early Hints を送る（HTTP/1.1 クライアントのみ）
+
+        1xx は最終応答ではないため、アクセスログ・メトリクスには記録しない。
+        """
+        if not self.early_hints or self.request_version != 'HTTP/1.1':
+            return
+        link = PRELOAD_LINKS.get(self.request_path())
+        if link:
+            self.wfile.write(f"HTTP/1.1 103 Early Hints\r\nLink: {link}\r\n\r\n".encode('latin-1'))
+    
     def do_GET(self):
         """GET リクエストの処理をオーバーライド"""
+        request_path = self.request_path()
+        if request_path == '/__cache':
+            self.send_cache_stats()
+        elif request_path == '/__metrics':
+            self.send_metrics()
+        elif self.path.startswith(ATLAS_API_PREFIX):
+            self.send_atlas_api()
         # .atlasファイルの特別処理
-        if self.path.endswith('.atlas'):
+        elif request_path.endswith('.atlas'):
             self.send_atlas_file()
         else:
-            super().do_GET()
+            self.send_early_hints()
+            entry = self.indexed_asset()
+            if entry is None or not self.send_indexed_asset(entry):
+                super().do_GET()
     
     def do_HEAD(self):
         """HEAD リクエストの処理をオーバーライド"""
+        if self.path.startswith(ATLAS_API_PREFIX):
+            self.send_atlas_api(head_only=True)
         # .atlasファイルの特別処理
-        if self.path.endswith('.atlas'):
+        elif self.request_path().endswith('.atlas'):
             self.send_atlas_head()
         else:
-            super().do_HEAD()
+            entry = self.indexed_asset()
+            if entry is None or not self.send_indexed_asset(entry, head_only=True):
+                super().do_HEAD()
+    
+    def send_indexed_asset(self, entry, head_only=False):
+        """インデックス済みファイルを送信（パス解決・MIME 判定なし）
+
+        長さは開いたファイルの fstat から取り、インデックスは MIME と ETag にだけ使う。
+        インデックス後に書き換えられていれば ETag を計算し直す。
+        開けなければ（インデックス後に削除された）False を返し、通常の処理に任せる。
+        """
+        try:
+            f = open(entry.path, 'rb')
+        except OSError:
+            return False
+        with f:
+            st = os.fstat(f.fileno())
+            cached = entry.st
+            etag = entry.etag if (st.st_mtime_ns == cached.st_mtime_ns and st.st_size == cached.st_size
+                                  and st.st_ino == cached.st_ino) else None
+            if self.send_file_headers(entry.path, st, entry.ctype, etag) and not head_only:
+                self.send_file_body(entry.path, st, f)
+        return True
     
     def send_atlas_file(self):
         """Atlasファイル専用送信処理"""
         try:
-            # ファイルパスを正規化
-            file_path = self.path.lstrip('/')
+            # ファイルパスを正規化（クエリ文字列・%エスケープを除去し、配信ディレクトリ内に限定）
+            file_path = self.translate_path(self.path)
             
-            print(f"[SERVE] Serving .atlas file: {file_path}")
+            self.log_debug(f"Serving .atlas file: {file_path}")
             
             with open(file_path, 'rb') as f:
-                content = f.read()
-            
-            # 正常なHTTPレスポンス送信
-            self.send_response(200)
-            self.send_header('Content-type', 'text/plain')
-            self.send_header('Content-Length', str(len(content)))
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-            self.end_headers()
-            
-            self.wfile.write(content)
-            print(f"[OK] Successfully served .atlas file: {file_path} ({len(content)} bytes)")
+                st = os.fstat(f.fileno())
+                
+                # 正常なHTTPレスポンス送信（条件付きGETなら304）
+                if not self.send_file_headers(file_path, st, 'text/plain'):
+                    self.log_debug(f".atlas file not modified: {file_path} (304)")
+                    return
+                
+                self.send_file_body(file_path, st, f)
+            self.log_debug(f"Successfully served .atlas file: {file_path} ({st.st_size} bytes)")
             
         except FileNotFoundError:
-            print(f"[ERROR] Atlas file not found: {file_path}")
+            self.log_error("Atlas file not found: %s", file_path)
             self.send_error(404, "Atlas file not found")
         except Exception as e:
-            print(f"[ERROR] Error serving atlas file: {e}")
+            self.log_error("Error serving atlas file: %s", e)
             self.send_error(500, f"Server error: {e}")
     
     def send_atlas_head(self):
         """Atlasファイル専用HEADレスポンス処理"""
         try:
-            # ファイルパスを正規化
-            file_path = self.path.lstrip('/')
+            # ファイルパスを正規化（クエリ文字列・%エスケープを除去し、配信ディレクトリ内に限定）
+            file_path = self.translate_path(self.path)
             
-            print(f"[HEAD] HEAD request for .atlas file: {file_path}")
+            self.log_debug(f"HEAD request for .atlas file: {file_path}")
             
-            # ファイルサイズ取得
-            file_size = os.path.getsize(file_path)
+            # ファイル情報取得
+            st = os.stat(file_path)
             
             # HEAD レスポンス送信（内容は送らない）
-            self.send_response(200)
-            self.send_header('Content-type', 'text/plain')
-            self.send_header('Content-Length', str(file_size))
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-            self.end_headers()
+            self.send_file_headers(file_path, st, 'text/plain')
             
-            print(f"[OK] Successfully sent HEAD response for .atlas file: {file_path} ({file_size} bytes)")
+            self.log_debug(f"Successfully sent HEAD response for .atlas file: {file_path} ({st.st_size} bytes)")
             
         except FileNotFoundError:
-            print(f"[ERROR] Atlas file not found: {file_path}")
+            self.log_error("Atlas file not found: %s", file_path)
             self.send_error(404, "Atlas file not found")
         except Exception as e:
-            print(f"[ERROR] Error in HEAD request for atlas file: {e}")
+            self.log_error("Error in HEAD request for atlas file: %s", e)
             self.send_error(500, f"Server error: {e}")
     
-    def log_message(self, format, *args):
-        """ログメッセージをより詳細に"""
-        message = format % args
-        print(f"[HTTP] HTTP: {message}")
+    def send_atlas_api(self, head_only=False):
+        """解析済み atlas を JSON で返す（/api/atlas/<キャラクター名>）
+
+        解析結果は atlas ファイルの派生データとしてキャッシュし、
+        ファイルが更新されると自動的に解析し直す。
+        """
+        request_path = self.request_path()
+        character = urllib.parse.unquote(request_path[len(ATLAS_API_PREFIX):]).strip('/')
+        if not ATLAS_CHARACTER_PATTERN.match(character):
+            self.send_error(404, "Unknown character")
+            return
+        
+        atlas_path = resolve_asset_path(f"{ATLAS_CHARACTER_DIR}/{character}/{character}.atlas")
+        try:
+            f = open(atlas_path, 'rb')
+        except FileNotFoundError:
+            self.log_error("Atlas file not found: %s", atlas_path)
+            self.send_error(404, "Atlas file not found")
+            return
+        with f:
+            self.send_parsed_atlas(atlas_path, f, head_only)
+    
+    def send_parsed_atlas(self, atlas_path, f, head_only):
+        """開いた atlas ファイルの解析結果を送信（304 判定付き）"""
+        st = os.fstat(f.fileno())
+        etag = make_etag(st, 'parsed')
+        last_modified = self.date_time_string(st.st_mtime)
+        cache_control = cache_control_for(atlas_path)
+        if self.is_not_modified(etag, st):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+            self.send_header('Cache-Control', cache_control)
+            self.end_headers()
+            return
+        
+        try:
+            body = self.parsed_atlas(atlas_path, st, f)
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            self.log_error("Error parsing atlas file: %s: %s", atlas_path, e)
+            self.send_error(500, f"Atlas parse error: {e}")
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Last-Modified', last_modified)
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', cache_control)
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+    
+    def parsed_atlas(self, atlas_path, st, fileobj=None):
+        """atlas の解析結果（JSON bytes）を返す（キャッシュ有効時はキャッシュ経由）"""
+        def build():
+            return atlas_to_json(self.read_file(atlas_path, st, fileobj).decode('utf-8'))
+        
+        if self.content_cache is not None:
+            body, hit = self.content_cache.fetch_derived(atlas_path, st, 'parsed-atlas', build)
+            self.cache_status = 'hit' if hit else 'miss'
+            return body
+        return build()
+    
+    def send_head(self):
+        """通常ファイルのヘッダー送信（ETag・Last-Modified・Cache-Control付き）
+
+        ディレクトリ・リダイレクト・404 は SimpleHTTPRequestHandler に任せる。
+        """
+        path = self.translate_path(self.path)
+        request_path = self.request_path()
+        if request_path.endswith('/') and os.path.isfile(os.path.join(path, 'index.html')):
+            path = os.path.join(path, 'index.html')
+        elif os.path.isdir(path) or request_path.endswith('/'):
+            return super().send_head()
+        
+        ctype = self.guess_type(path)
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self.send_error(404, "File not found")
+            return None
+        
+        try:
+            st = os.fstat(f.fileno())
+            if not self.send_file_headers(path, st, ctype):
+                f.close()
+                return None
+            return f
+        except:
+            f.close()
+            raise
+    
+    def send_file_headers(self, file_path, st, ctype, etag=None):
+        """ファイル応答のヘッダーを送信
+
+        etag はインデックスで計算済みの非圧縮表現の ETag（None ならここで計算）。
+
+        条件付きリクエストが一致した場合（304）や Range が満たせない場合（416）は
+        False を返す。本文を送るべき場合は True を返し、送信範囲を
+        self.range_parts / self.range_trailer に、圧縮表現を self.encoded_body に記録する。
+        """
+        self.range_parts = None
+        self.range_trailer = b''
+        self.encoded_body = None
+        
+        compressible = is_compressible(file_path, ctype)
+        encoding = self.negotiate_encoding(file_path, st) if compressible else None
+        if encoding or etag is None:
+            etag = make_etag(st, encoding)
+        last_modified = self.date_time_string(st.st_mtime)
+        cache_control = cache_control_for(file_path)
         
-        # .atlasファイルのリクエストを特別に監視
-        if '.atlas' in message:
-            print(f"[ATLAS] ATLAS REQUEST DETECTED: {message}")
+        if self.is_not_modified(etag, st):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+            self.send_header('Cache-Control', cache_control)
+            if compressible:
+                self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return False
+        
+        ranges = None if encoding else self.requested_ranges(etag, st)
+        if ranges == []:
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{st.st_size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return False
+        
+        if encoding:
+            length = self.prepare_encoded_body(file_path, st, encoding)
+            self.send_response(200)
+            self.send_header('Content-type', ctype)
+            self.send_header('Content-Encoding', encoding)
+            self.send_header('Content-Length', str(length))
+        elif ranges:
+            content_type, length, parts, trailer = plan_byte_ranges(ranges, st.st_size, ctype)
+            self.range_parts = parts
+            self.range_trailer = trailer
+            self.send_response(206)
+            self.send_header('Content-type', content_type)
+            self.send_header('Content-Length', str(length))
+            if len(parts) == 1:
+                _, start, end = parts[0]
+                self.send_header('Content-Range', f'bytes {start}-{end}/{st.st_size}')
+        else:
+            self.send_response(200)
+            self.send_header('Content-type', ctype)
+            self.send_header('Content-Length', str(st.st_size))
+        if not encoding:
+            self.send_header('Accept-Ranges', 'bytes')
+        if compressible:
+            self.send_header('Vary', 'Accept-Encoding')
+        if not ranges:
+            link = PRELOAD_LINKS.get(self.request_path())
+            if link:
+                self.send_header('Link', link)
+        self.send_header('Last-Modified', last_modified)
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', cache_control)
+        self.end_headers()
+        return True
+    
+    def negotiate_encoding(self, file_path, st):
+        """Accept-Encoding から送信する圧縮方式を決定（None なら非圧縮）
 
-def run_server(port=8000):
-    """Spineファイル対応サーバーを起動"""
+        Range 付きリクエストは非圧縮で応答し、部分取得を優先する。
+        """
+        accept = self.headers.get('Accept-Encoding')
+        if not accept or self.headers.get('Range'):
+            return None
+        if st.st_size < MIN_COMPRESS_SIZE or st.st_size > MAX_COMPRESS_SIZE:
+            return None
+        
+        codings = parse_accept_encoding(accept)
+        default_q = codings.get('*', 0.0)
+        best = None
+        best_q = 0.0
+        for encoding, suffix in CONTENT_ENCODINGS:
+            q = codings.get(encoding, default_q)
+            if q <= best_q:
+                continue
+            if self.find_precompressed(file_path, st, suffix) is None:
+                if encoding == 'br' and brotli is None:
+                    continue
+            best, best_q = encoding, q
+        return best
+    
+    def find_precompressed(self, file_path, st, suffix):
+        """パッケージ時に生成された圧縮済みファイル（元ファイルより新しいもの）
+
+        インデックス有効時はインデックスにないものを stat せずに除外する。
+        """
+        variant_path = file_path + suffix
+        if self.asset_index is not None and self.asset_index.lookup_path(variant_path) is None:
+            return None
+        try:
+            variant_st = os.stat(variant_path)
+        except OSError:
+            return None
+        if variant_st.st_mtime_ns < st.st_mtime_ns:
+            return None
+        return variant_path, variant_st
+    
+    def prepare_encoded_body(self, file_path, st, encoding):
+        """圧縮表現を用意して長さを返す（事前圧縮ファイル優先、なければ圧縮してキャッシュ）"""
+        suffix = dict(CONTENT_ENCODINGS)[encoding]
+        precompressed = self.find_precompressed(file_path, st, suffix)
+        if precompressed is not None:
+            # 長さは開いたファイルから読んだ内容で決める（stat 後の書き換えに備える）
+            variant_path = precompressed[0]
+            try:
+                with open(variant_path, 'rb') as f:
+                    variant_st = os.fstat(f.fileno())
+                    self.cache_status = 'precompressed'
+                    self.encoded_body = self.read_file(variant_path, variant_st, f)
+                return len(self.encoded_body)
+            except OSError:
+                self.cache_status = None
+        
+        def build():
+            return compress_body(self.read_file(file_path, st), encoding)
+        
+        if self.content_cache is not None:
+            self.encoded_body, hit = self.content_cache.fetch_derived(file_path, st, encoding, build)
+            self.cache_status = 'hit' if hit else 'miss'
+        else:
+            self.encoded_body = build()
+        return len(self.encoded_body)
+    
+    def requested_ranges(self, etag, st):
+        """Range / If-Range を評価して送信範囲を返す（None なら全体）"""
+        range_header = self.headers.get('Range')
+        if not range_header or self.command not in ('GET', 'HEAD'):
+            return None
+        
+        if_range = self.headers.get('If-Range')
+        if if_range:
+            if_range = if_range.strip()
+            if if_range.startswith('"') or if_range.startswith('W/'):
+                # 強い比較（弱いETagは一致しない）
+                if if_range != etag:
+                    return None
+            elif if_range != self.date_time_string(st.st_mtime):
+                return None
+        
+        return parse_range_header(range_header, st.st_size)
+    
+    def is_not_modified(self, etag, st):
+        """If-None-Match / If-Modified-Since の評価（RFC 7232）"""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            # If-None-Match がある場合は If-Modified-Since を無視する
+            for tag in if_none_match.split(','):
+                tag = tag.strip()
+                if tag == '*' or tag.removeprefix('W/') == etag:
+                    return True
+            return False
+        
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, IndexError, OverflowError, ValueError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=datetime.timezone.utc)
+            return int(st.st_mtime) <= since.timestamp()
+        return False
+    
+    def read_file(self, file_path, st=None, fileobj=None):
+        """ファイル内容を取得（キャッシュ有効時はキャッシュ経由）"""
+        if self.content_cache is not None:
+            data, hit = self.content_cache.fetch(file_path, st, fileobj)
+            if self.cache_status is None:
+                self.cache_status = 'hit' if hit else 'miss'
+            return data
+        if fileobj is not None:
+            return fileobj.read()
+        with open(file_path, 'rb') as f:
+            return f.read()
+    
+    def copyfile(self, source, outputfile):
+        """通常ファイルの本文送信（キャッシュ・Range 対応）"""
+        name = getattr(source, 'name', None)
+        if not isinstance(name, str):
+            return super().copyfile(source, outputfile)
+        st = os.fstat(source.fileno())
+        self.send_file_body(name, st, source)
+    
+    def send_file_body(self, file_path, st, fileobj=None):
+        """send_file_headers で決めた範囲・表現の本文を送信"""
+        if self.encoded_body is not None:
+            self.wfile.write(self.encoded_body)
+            return
+        if self.range_parts is None:
+            self.write_file_segment(file_path, st, fileobj, 0, st.st_size - 1)
+            return
+        for prefix, start, end in self.range_parts:
+            if prefix:
+                self.wfile.write(prefix)
+            self.write_file_segment(file_path, st, fileobj, start, end)
+        if self.range_trailer:
+            self.wfile.write(self.range_trailer)
+    
+    def write_file_segment(self, file_path, st, fileobj, start, end):
+        """ファイルの start〜end バイトを送信
+
+        大きいファイルは平文TCPなら sendfile（ゼロコピー）、キャッシュ対象サイズなら
+        メモリから、それ以外はシークして分割コピーする。
+        """
+        if end < start:
+            return
+        if self.can_sendfile(st):
+            if fileobj is None:
+                with open(file_path, 'rb') as f:
+                    return self.write_file_segment(file_path, st, f, start, end)
+            self.wfile.flush()
+            self.connection.sendfile(fileobj, start, end - start + 1)
+            if self.cache_status is None:
+                self.cache_status = 'sendfile'
+            return
+        
+        cache = self.content_cache
+        if cache is not None and st.st_size <= cache.max_entry_bytes:
+            if fileobj is not None:
+                fileobj.seek(0)
+            data = self.read_file(file_path, st, fileobj)
+            self.wfile.write(memoryview(data)[start:end + 1])
+            return
+        
+        if fileobj is None:
+            with open(file_path, 'rb') as f:
+                return self.write_file_segment(file_path, st, f, start, end)
+        if self.cache_status is None:
+            self.cache_status = 'bypass'
+        fileobj.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = fileobj.read(min(COPY_BUFSIZE, remaining))
+            if not chunk:
+                break
+            self.wfile.write(chunk)
+            remaining -= len(chunk)
+    
+    def can_sendfile(self, st):
+        """sendfile を使えるか（平文TCPかつ閾値以上のサイズ）"""
+        if self.sendfile_min_size is None or st.st_size < self.sendfile_min_size:
+            return False
+        conn = self.connection
+        if not isinstance(conn, socket.socket):
+            return False
+        if ssl is not None and isinstance(conn, ssl.SSLSocket):
+            return False
+        return True
+    
+    def send_cache_stats(self):
+        """キャッシュ統計をJSONで返す"""
+        stats = self.content_cache.stats() if self.content_cache is not None else {"enabled": False}
+        body = json.dumps(stats).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_metrics(self):
+        """メトリクスを JSON（既定）または Prometheus テキスト形式で返す
+
+        ?format=prometheus、または Accept が text/plain / OpenMetrics を求める場合は
+        Prometheus 形式にする。
+        """
+        if self.metrics is None:
+            self.send_error(404, "Metrics disabled")
+            return
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        requested = query.get('format', [''])[0]
+        accept = self.headers.get('Accept', '')
+        prometheus = requested == 'prometheus' or (
+            not requested and 'application/json' not in accept
+            and ('text/plain' in accept or 'openmetrics' in accept))
+        if prometheus:
+            body = self.metrics.to_prometheus(self.content_cache, self.access_logger).encode('utf-8')
+            ctype = 'text/plain; version=0.0.4; charset=utf-8'
+        else:
+            report = self.metrics.to_json(self.content_cache, self.access_logger)
+            body = json.dumps(report, ensure_ascii=False).encode('utf-8')
+            ctype = 'application/json'
+        self.send_response(200)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_request(self, code='-', size='-'):
+        """応答ステータスを記録（出力は handle_one_request でまとめて行う）
+
+        アクセスログが無効なら標準の stderr 出力にする。
+        """
+        if isinstance(code, int):
+            self.response_status = int(code)
+        if self.access_logger is None:
+            super().log_request(code, size)
+    
+    def log_message(self, format, *args):
+        """エラーなどのメッセージをアクセスログへ（ロガーがなければ stderr）"""
+        if self.access_logger is None:
+            return super().log_message(format, *args)
+        self.access_logger.log({
+            "ts": time.time(),
+            "event": "message",
+            "client": self.client_address[0],
+            "message": format % args,
+        })
+    
+    def log_debug(self, message):
+        """詳細ログ（verbose プロファイルのときだけ出力）"""
+        if self.access_logger is not None and self.access_logger.debug:
+            self.access_logger.log({"ts": time.time(), "event": "debug", "message": message})
+
+class ThreadPoolHTTPServer(socketserver.TCPServer):
+    """スレッドプールで並行処理するHTTPサーバー
+
+    ワーカー数とコネクション数に上限を設け、遅いクライアントが
+    他のリクエストを止めないようにする。上限に達した接続は
+    listenキューで待機する。
+    """
+
+    allow_reuse_address = True
+    request_queue_size = 128
+    draining = False
+    # 接続上限で待機中に shutdown の要求を確認する間隔（秒）
+    slot_wait_interval = 0.5
+
+    def __init__(self, server_address, RequestHandlerClass, workers=8, max_connections=64,
+                 bind_and_activate=True):
+        super().__init__(server_address, RequestHandlerClass, bind_and_activate)
+        self.workers = workers
+        self.max_connections = max(max_connections, workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="spine-http")
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+        self._waiting = 0
+        self._waiting_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def shutdown(self):
+        """serve_forever を止める（接続上限での待機中でも抜けられるよう先に通知）"""
+        self._stopping.set()
+        super().shutdown()
+
+    def waiting_connections(self):
+        """受け付け済みでワーカーの空きを待っている接続数"""
+        return self._waiting
+
+    def process_request(self, request, client_address):
+        """接続をワーカースレッドへ渡す（上限到達時はacceptを一時停止）
+
+        空きを待つ間も shutdown を確認し、停止要求があれば接続を閉じて戻る。
+        """
+        while not self._slots.acquire(timeout=self.slot_wait_interval):
+            if self._stopping.is_set():
+                self.shutdown_request(request)
+                return
+        with self._waiting_lock:
+            self._waiting += 1
+        try:
+            future = self._executor.submit(self._process_request_worker, request, client_address)
+        except RuntimeError:
+            # シャットダウン中
+            with self._waiting_lock:
+                self._waiting -= 1
+            self._slots.release()
+            self.shutdown_request(request)
+            return
+        future.add_done_callback(lambda future: self._close_if_cancelled(future, request))
+
+    def _close_if_cancelled(self, future, request):
+        """server_close で取り消された（ワーカー待ちのまま終わった）接続を閉じる"""
+        if not future.cancelled():
+            return
+        with self._waiting_lock:
+            self._waiting -= 1
+        self.shutdown_request(request)
+        self._slots.release()
+
+    def _process_request_worker(self, request, client_address):
+        with self._waiting_lock:
+            self._waiting -= 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def drain(self, timeout):
+        """新規接続の受け付けを止め、処理中の接続が終わるまで最大 timeout 秒待つ
+
+        draining 中は keep-alive の待機を打ち切るため、アイドル接続はすぐ閉じられる。
+        全接続が終われば True を返す。
+        """
+        self.draining = True
+        self.socket.close()
+        deadline = time.monotonic() + timeout
+        for _ in range(self.max_connections):
+            if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                return False
+        return True
+
+    def server_close(self):
+        """待ち受けを閉じ、ワーカー待ちの接続は取り消して閉じる（処理中の接続は待たない）"""
+        super().server_close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+SERVER_ENGINES = ("threadpool", "single")
+
+def create_server(port=8000, engine="threadpool", workers=8, max_connections=64,
+                  listen_socket=None, reuse_port=False):
+    """指定エンジンでサーバーインスタンスを生成
+
+    listen_socket: 親プロセスから引き継いだ待ち受けソケット（prefork の inherit 方式）
+    reuse_port: SO_REUSEPORT を付けて bind する（prefork の reuseport 方式）
+    """
+    if engine == "threadpool":
+        httpd = ThreadPoolHTTPServer(("", port), SpineHTTPRequestHandler, workers=workers,
+                                     max_connections=max_connections, bind_and_activate=False)
+    elif engine == "single":
+        httpd = socketserver.TCPServer(("", port), SpineHTTPRequestHandler, bind_and_activate=False)
+    else:
+        raise ValueError(f"Unknown server engine: {engine}")
     try:
-        with socketserver.TCPServer(("", port), SpineHTTPRequestHandler) as httpd:
-            print(f"[SERVER] Spine対応HTTPサーバー起動:")
-            print(f"   [PORT] ポート: {port}")
-            print(f"   [URL] URL: http://localhost:{port}")
-            print(f"   [ATLAS] .atlasファイルサポート: 有効")
-            print(f"   [MIME] MIMEタイプ設定: .atlas -> text/plain")
-            print(f"   [READY] ぷらっとくん用サーバー準備完了!")
-            print(f"   [STOP] 停止: Ctrl+C")
-            print()
+        if listen_socket is not None:
+            httpd.socket.close()
+            httpd.socket = listen_socket
+            httpd.server_address = listen_socket.getsockname()
+        else:
+            httpd.allow_reuse_address = True
+            if reuse_port:
+                # allow_reuse_port は Python 3.11 以降でしか効かないため直接設定する
+                httpd.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            httpd.server_bind()
+            httpd.server_activate()
+    except:
+        httpd.server_close()
+        raise
+    return httpd
+
+# prefork モードの既定値
+PREFORK_MODES = ("auto", "reuseport", "inherit")
+PREFORK_GRACE = 10.0          # 停止時に処理中のリクエストを待つ秒数
+PREFORK_RESTART_WINDOW = 30.0  # この秒数内に
+PREFORK_MAX_RESTARTS = 10      # これを超えて再起動したら異常とみなして停止
+
+def run_prefork(processes, prefork_mode="auto", port=8000, grace=PREFORK_GRACE, **options):
+    """N 個のワーカープロセスで同じポートを待ち受ける（GIL を超えてコア数までスケール）
+
+    reuseport: 各ワーカーが SO_REUSEPORT 付きで bind し、カーネルが接続を分散する
+    inherit: 親が bind したソケットを fork で引き継ぎ、各ワーカーが accept する
+    親プロセスは監視のみ行い、異常終了（0 以外の終了コード・シグナル）したワーカーを
+    再起動する。Ctrl+C または親への SIGTERM で全ワーカーに SIGTERM を送り、
+    処理中のリクエストを最大 grace 秒待って停止する。
+    options は run_server の引数（キャッシュ・ログ・インデックスはワーカーごとに持つ）。
+    """
+    if not hasattr(os, 'fork'):
+        print("[PREFORK] このOSでは prefork を使えないため単一プロセスで起動します")
+        return run_server(port=port, **options)
+    if prefork_mode == "auto":
+        prefork_mode = "reuseport" if hasattr(socket, 'SO_REUSEPORT') else "inherit"
+    if prefork_mode == "reuseport" and not hasattr(socket, 'SO_REUSEPORT'):
+        print("[ERROR] このOSは SO_REUSEPORT に対応していません（--prefork-mode inherit を使用してください）")
+        return
+    
+    listen_socket = None
+    if prefork_mode == "inherit":
+        try:
+            listen_socket = socket.create_server(("", port),
+                                                 backlog=ThreadPoolHTTPServer.request_queue_size)
+        except OSError as e:
+            print(f"[ERROR] サーバー起動エラー: {e}")
+            print(f"[INFO] ポート {port} が既に使用中の可能性があります")
+            return
+    
+    children = {}  # pid -> ワーカー番号
+    
+    def spawn(slot, banner):
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                # Ctrl+C は親がまとめて処理し、ワーカーには SIGTERM で停止を伝える
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                run_server(port=port, listen_socket=listen_socket,
+                           reuse_port=prefork_mode == "reuseport", worker=slot,
+                           banner=banner, grace=grace, **options)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        children[pid] = slot
+    
+    def request_stop(signum, frame):
+        # SIGTERM も Ctrl+C と同じ停止処理（ワーカーの終了待ち）に流す
+        raise KeyboardInterrupt
+    
+    previous_sigterm = signal.signal(signal.SIGTERM, request_stop)
+    print(f"[PREFORK] {processes}プロセスで起動 (方式: {prefork_mode}, 監視プロセス pid {os.getpid()})")
+    for slot in range(processes):
+        spawn(slot, banner=slot == 0)
+    
+    restarts = deque()
+    try:
+        while children:
+            pid, status = os.wait()
+            slot = children.pop(pid, None)
+            if slot is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if code == 0:
+                # 自ら正常終了したワーカー（起動失敗で run_server が戻った場合など）は再起動しない
+                print(f"[PREFORK] ワーカー {slot} (pid {pid}) が正常終了しました（再起動しません）")
+                continue
+            now = time.monotonic()
+            restarts.append(now)
+            while restarts and now - restarts[0] > PREFORK_RESTART_WINDOW:
+                restarts.popleft()
+            if len(restarts) > PREFORK_MAX_RESTARTS:
+                print(f"[ERROR] ワーカーが{PREFORK_RESTART_WINDOW:g}秒間に{len(restarts)}回終了したため停止します")
+                break
+            reason = f"シグナル {-code}" if code < 0 else f"code {code}"
+            print(f"[PREFORK] ワーカー {slot} (pid {pid}) が異常終了 ({reason}) - 再起動します")
+            spawn(slot, banner=False)
+    except KeyboardInterrupt:
+        print("\n[STOP] サーバーを停止しています（処理中のリクエストを待機）...")
+    finally:
+        stop_workers(children, grace)
+        signal.signal(signal.SIGTERM, previous_sigterm)
+        if listen_socket is not None:
+            listen_socket.close()
+        print("[STOP] 全ワーカーを停止しました")
+
+def stop_workers(children, grace):
+    """ワーカーに SIGTERM を送り、grace 秒待っても終わらなければ SIGKILL"""
+    for pid in children:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    deadline = time.monotonic() + grace + 1
+    try:
+        while children and time.monotonic() < deadline:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                time.sleep(0.05)
+            else:
+                children.pop(pid, None)
+    except ChildProcessError:
+        children.clear()
+    except KeyboardInterrupt:
+        # 2回目の Ctrl+C は待たずに強制終了
+        pass
+    for pid in list(children):
+        try:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass
+        children.pop(pid, None)
+
+def run_server(port=8000, engine="threadpool", workers=8, max_connections=64, cache_mb=32,
+               sendfile_min_kb=64, keepalive_timeout=KEEPALIVE_TIMEOUT,
+               keepalive_max_requests=KEEPALIVE_MAX_REQUESTS, log_profile='default',
+               log_sample_rate=None, access_log=None, asset_index=True,
+               index_interval=ASSET_INDEX_INTERVAL, listen_socket=None, reuse_port=False,
+               worker=None, banner=True, grace=PREFORK_GRACE, early_hints=False):
+    """Spineファイル対応サーバーを起動
+
+    access_log: アクセスログの出力先ファイル（None なら標準出力）
+    asset_index: 起動時に配信ツリーをインデックス化し、リクエストごとの stat を省く
+    index_interval: インデックスの再走査間隔（秒、0 なら再走査しない）
+    early_hints: preload-manifest.json のあるページに 103 Early Hints を送る
+    listen_socket / reuse_port / worker / banner / grace は run_prefork がワーカー起動時に使う
+    （worker はワーカー番号。SIGTERM で受け付けを止め、処理中の接続を grace 秒待って終了する）
+    """
+    say = print if banner else (lambda *args, **kwargs: None)
+    profile = LOG_PROFILES[log_profile]
+    sample_rate = profile['sample_rate'] if log_sample_rate is None else log_sample_rate
+    log_stream = open(access_log, 'a', encoding='utf-8') if access_log else sys.stdout
+    logger = AccessLogger(log_stream, sample_rate=sample_rate, debug=profile['debug'])
+    SpineHTTPRequestHandler.access_logger = logger
+    SpineHTTPRequestHandler.metrics = ServerMetrics()
+    SpineHTTPRequestHandler.early_hints = early_hints
+    index = None
+    if keepalive_timeout and keepalive_timeout > 0:
+        SpineHTTPRequestHandler.protocol_version = "HTTP/1.1"
+        SpineHTTPRequestHandler.timeout = keepalive_timeout
+        SpineHTTPRequestHandler.keepalive_max_requests = max(1, keepalive_max_requests)
+        # ヘッダーと本文を別々に書き込むため、接続を切らない keep-alive では Nagle と
+        # 遅延 ACK が噛み合って1応答ごとに約40ms待たされる。TCP_NODELAY で回避
+        SpineHTTPRequestHandler.disable_nagle_algorithm = True
+    else:
+        SpineHTTPRequestHandler.protocol_version = "HTTP/1.0"
+        SpineHTTPRequestHandler.timeout = None
+        SpineHTTPRequestHandler.disable_nagle_algorithm = False
+    if cache_mb > 0:
+        SpineHTTPRequestHandler.content_cache = FileContentCache(int(cache_mb * 1024 * 1024))
+    else:
+        SpineHTTPRequestHandler.content_cache = None
+    if sendfile_min_kb is not None and sendfile_min_kb >= 0:
+        SpineHTTPRequestHandler.sendfile_min_size = int(sendfile_min_kb * 1024)
+    else:
+        SpineHTTPRequestHandler.sendfile_min_size = None
+    
+    try:
+        with create_server(port, engine, workers, max_connections, listen_socket, reuse_port) as httpd:
+            say(f"[SERVER] Spine対応HTTPサーバー起動:")
+            say(f"   [PORT] ポート: {port}")
+            if engine == "threadpool":
+                say(f"   [ENGINE] 処理方式: threadpool (ワーカー {workers} / 最大接続 {httpd.max_connections})")
+            else:
+                say(f"   [ENGINE] 処理方式: single (逐次処理)")
+            if cache_mb > 0:
+                say(f"   [CACHE] ファイルキャッシュ: {cache_mb}MB (統計: /__cache)")
+            else:
+                say(f"   [CACHE] ファイルキャッシュ: 無効")
+            encodings = "gzip, br" if brotli is not None else "gzip（brotli未インストール）"
+            say(f"   [COMPRESS] 圧縮配信: {encodings} / 事前圧縮 .gz/.br 優先")
+            if SpineHTTPRequestHandler.sendfile_min_size is not None:
+                say(f"   [SENDFILE] sendfile送信: {sendfile_min_kb}KB以上のファイル")
+            else:
+                say(f"   [SENDFILE] sendfile送信: 無効")
+            if SpineHTTPRequestHandler.protocol_version == "HTTP/1.1":
+                say(f"   [KEEPALIVE] HTTP/1.1 keep-alive: アイドル {keepalive_timeout}秒 / "
+                      f"最大 {SpineHTTPRequestHandler.keepalive_max_requests}リクエスト/接続")
+            else:
+                say(f"   [KEEPALIVE] HTTP/1.0 (リクエストごとに切断)")
+            say(f"   [LOG] アクセスログ: {log_profile} (JSON Lines, 正常応答の記録率 {sample_rate:g}, "
+                  f"出力先 {access_log or 'stdout'})")
+            say(f"   [METRICS] メトリクス: /__metrics (JSON) / /__metrics?format=prometheus")
+            say(f"   [URL] URL: http://localhost:{port}")
+            say(f"   [ATLAS] .atlasファイルサポート: 有効")
+            say(f"   [MIME] MIMEタイプ設定: .atlas -> text/plain")
+            say(f"   [READY] ぷらっとくん用サーバー準備完了!")
+            say(f"   [STOP] 停止: Ctrl+C")
+            say()
             
             # 現在のディレクトリ確認
             current_dir = os.getcwd()
-            print(f"[DIR] 作業ディレクトリ: {current_dir}")
+            say(f"[DIR] 作業ディレクトリ: {current_dir}")
+            
+            # フィンガープリント付きアセットの確認
+            try:
+                immutable_count = load_asset_manifest(current_dir)
+                if immutable_count:
+                    say(f"[MANIFEST] {ASSET_MANIFEST_NAME}: {immutable_count}ファイルを immutable で配信")
+            except (OSError, ValueError) as e:
+                say(f"[WARNING] {ASSET_MANIFEST_NAME} の読み込みに失敗: {e}")
+            
+            # 重要アセットのプリロードヒント
+            try:
+                preload_count = load_preload_manifest(current_dir)
+                if preload_count:
+                    hints = " + 103 Early Hints" if early_hints else ""
+                    say(f"[PRELOAD] {PRELOAD_MANIFEST_NAME}: {preload_count}件を Link ヘッダーで通知{hints}")
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                say(f"[WARNING] {PRELOAD_MANIFEST_NAME} の読み込みに失敗: {e}")
+            
+            # 配信ツリーのインデックス化（以降は表を引くだけで stat しない）
+            if asset_index:
+                index = AssetIndex(current_dir, interval=index_interval)
+                index.refresh()
+                SpineHTTPRequestHandler.asset_index = index
+                index.start()
+                polling = f"{index_interval:g}秒ごとに再走査" if index_interval > 0 else "再走査なし"
+                say(f"[INDEX] アセットインデックス: {len(index)}ファイル / "
+                      f"{index.total_bytes():,} bytes ({index.last_refresh_ms:.1f}ms, {polling})")
             
             # Spineファイルの存在確認
             spine_path = "assets/spine/characters/purattokun/"
             if os.path.exists(spine_path):
                 files = os.listdir(spine_path)
-                print(f"[FILES] Spineファイル確認: {files}")
+                say(f"[FILES] Spineファイル確認: {files}")
             else:
-                print(f"[WARNING] Spineパスが見つかりません: {spine_path}")
+                say(f"[WARNING] Spineパスが見つかりません: {spine_path}")
             
-            print("-" * 50)
+            say("-" * 50)
+            if worker is not None:
+                # serve_forever を止める shutdown() は別スレッドから呼ぶ必要がある
+                signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(
+                    target=httpd.shutdown, daemon=True).start())
+                print(f"[PREFORK] ワーカー {worker} (pid {os.getpid()}) 待ち受け開始")
             httpd.serve_forever()
+            if worker is not None and hasattr(httpd, 'drain') and not httpd.drain(grace):
+                print(f"[WARNING] ワーカー {worker}: {grace:g}秒以内に終わらなかった接続を切断します")
             
     except KeyboardInterrupt:
         print("\n[STOP] サーバーを停止しました")
+        if SpineHTTPRequestHandler.content_cache is not None:
+            print(f"[CACHE] キャッシュ統計: {SpineHTTPRequestHandler.content_cache.stats()}")
     except OSError as e:
         print(f"[ERROR] サーバー起動エラー: {e}")
         print(f"[INFO] ポート {port} が既に使用中の可能性があります")
+    finally:
+        if index is not None:
+            index.close()
+            SpineHTTPRequestHandler.asset_index = None
+        logger.close()
+        SpineHTTPRequestHandler.access_logger = None
+        print(f"[LOG] アクセスログ統計: {logger.stats()}")
+        if access_log:
+            log_stream.close()
 
-if __name__ == "__main__":
-    import sys
+def parse_args(argv=None):
+    """コマンドライン引数の解析"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Spine対応HTTPサーバー")
+    parser.add_argument("port_arg", nargs="?", metavar="PORT",
+                        help="ポート番号（--port と同じ、互換用）")
+    parser.add_argument("--port", type=int, default=None, help="ポート番号（デフォルト8000）")
+    parser.add_argument("--engine", choices=SERVER_ENGINES, default="threadpool",
+                        help="リクエスト処理方式（デフォルト threadpool）")
+    parser.add_argument("--workers", type=int, default=8, help="ワーカースレッド数")
+    parser.add_argument("--max-connections", type=int, default=64,
+                        help="同時処理する最大接続数")
+    parser.add_argument("--cache-mb", type=float, default=32,
+                        help="ファイルキャッシュの上限（MB、0で無効）")
+    parser.add_argument("--sendfile-min-kb", type=float, default=64,
+                        help="sendfile で送信するファイルサイズの下限（KB、負の値で無効）")
+    parser.add_argument("--keepalive-timeout", type=float, default=KEEPALIVE_TIMEOUT,
+                        help=f"keep-alive 接続のアイドルタイムアウト（秒、0でHTTP/1.0、デフォルト{KEEPALIVE_TIMEOUT}）")
+    parser.add_argument("--keepalive-max", type=int, default=KEEPALIVE_MAX_REQUESTS,
+                        help=f"1接続あたりの最大リクエスト数（デフォルト{KEEPALIVE_MAX_REQUESTS}）")
+    parser.add_argument("--log-profile", choices=LOG_PROFILES, default="default",
+                        help="アクセスログ: verbose（詳細ログ付き）/ default / quiet（エラーのみ）")
+    parser.add_argument("--log-sample", type=float, default=None, metavar="RATE",
+                        help="正常応答を記録する割合 0〜1（プロファイルの既定値を上書き）")
+    parser.add_argument("--access-log", default=None, metavar="PATH",
+                        help="アクセスログの出力先ファイル（デフォルト: 標準出力）")
+    parser.add_argument("--cache-control", action="append", default=[], metavar="CLASS=VALUE",
+                        help="アセット種別ごとの Cache-Control を上書き（例: png='public, max-age=604800'）"
+                             f" 種別: {', '.join(CACHE_CONTROL_POLICY)}")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="ワーカープロセス数（2以上で prefork モード、デフォルト: 1）")
+    parser.add_argument("--prefork-mode", choices=PREFORK_MODES, default="auto",
+                        help="prefork の待ち受け方式（auto: SO_REUSEPORT があれば reuseport、なければ inherit）")
+    parser.add_argument("--early-hints", action="store_true",
+                        help=f"{PRELOAD_MANIFEST_NAME} のあるページに 103 Early Hints を送信")
+    parser.add_argument("--no-index", action="store_true",
+                        help="起動時アセットインデックスを使わず、リクエストごとに stat する")
+    parser.add_argument("--index-interval", type=float, default=ASSET_INDEX_INTERVAL, metavar="SEC",
+                        help=f"アセットインデックスの再走査間隔（秒、0で再走査なし、デフォルト: {ASSET_INDEX_INTERVAL:g}）")
+    args = parser.parse_args(argv)
     
     # ポート番号を引数から取得（デフォルト8000）
-    port = 8000
-    if len(sys.argv) > 1:
+    port = args.port if args.port is not None else 8000
+    if args.port is None and args.port_arg is not None:
         try:
-            port = int(sys.argv[1])
+            port = int(args.port_arg)
             print(f"[INFO] コマンドライン引数でポート指定: {port}")
         except ValueError:
-            print(f"[WARNING] 無効なポート番号: {sys.argv[1]} (デフォルト8000を使用)")
+            print(f"[WARNING] 無効なポート番号: {args.port_arg} (デフォルト8000を使用)")
+    args.port = port
     
-    run_server(port)
\ No newline at end of file
+    if args.workers < 1:
+        parser.error("--workers は1以上を指定してください")
+    for item in args.cache_control:
+        asset_class, sep, value = item.partition('=')
+        asset_class = asset_class.strip()
+        if not sep or asset_class not in CACHE_CONTROL_POLICY:
+            parser.error(f"--cache-control の形式が不正です: {item}")
+        CACHE_CONTROL_POLICY[asset_class] = value.strip()
+    
+    if args.cache_mb < 0:
+        parser.error("--cache-mb は0以上を指定してください")
+    if args.max_connections < 1:
+        parser.error("--max-connections は1以上を指定してください")
+    if args.log_sample is not None and not 0 <= args.log_sample <= 1:
+        parser.error("--log-sample は0〜1を指定してください")
+    if args.keepalive_max < 1:
+        parser.error("--keepalive-max は1以上を指定してください")
+    if args.processes < 1:
+        parser.error("--processes は1以上を指定してください")
+    if args.index_interval < 0:
+        parser.error("--index-interval は0以上を指定してください")
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    options = dict(
+        port=args.port,
+        engine=args.engine,
+        workers=args.workers,
+        max_connections=args.max_connections,
+        cache_mb=args.cache_mb,
+        sendfile_min_kb=args.sendfile_min_kb,
+        keepalive_timeout=args.keepalive_timeout,
+        keepalive_max_requests=args.keepalive_max,
+        log_profile=args.log_profile,
+        log_sample_rate=args.log_sample,
+        access_log=args.access_log,
+        asset_index=not args.no_index,
+        index_interval=args.index_interval,
+        early_hints=args.early_hints,
+    )
+    if args.processes > 1:
+        run_prefork(args.processes, args.prefork_mode, **options)
+    else:
+        run_server(**options)
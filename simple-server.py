@@ -7,6 +7,61 @@
 import http.server
 import socketserver
 import os
+import uuid
+
+# 単独で動かせるよう server.py には依存しない
+COPY_BUFSIZE = 64 * 1024
+MAX_RANGES = 16
+
+def parse_range_header(value, size):
+    """Range ヘッダーを (start, end) のリストに変換
+
+    None: 不正・未対応（全体を返す） / []: 満たせる範囲がない（416）
+    """
+    unit, sep, spec = value.partition('=')
+    if not sep or unit.strip().lower() != 'bytes':
+        return None
+    ranges = []
+    for part in spec.split(','):
+        if not part.strip():
+            continue
+        first, dash, last = (s.strip() for s in part.strip().partition('-'))
+        if not dash or not (first.isdigit() or first == '') or not (last.isdigit() or last == ''):
+            return None
+        if first == '':
+            # サフィックス指定: 末尾 N バイト
+            if last == '':
+                return None
+            if int(last) > 0 and size > 0:
+                ranges.append((max(0, size - int(last)), size - 1))
+        elif last and int(last) < int(first):
+            return None
+        elif int(first) < size:
+            ranges.append((int(first), min(int(last) if last else size - 1, size - 1)))
+    if len(ranges) > MAX_RANGES:
+        return None
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def plan_byte_ranges(ranges, size, ctype):
+    """206 応答の (Content-Type, Content-Length, [(前置き, start, end)], 終端) を計算"""
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        return ctype, end - start + 1, [(b'', start, end)], b''
+    boundary = uuid.uuid4().hex
+    parts = []
+    for start, end in ranges:
+        prefix = (f"\r\n--{boundary}\r\nContent-Type: {ctype}\r\n"
+                  f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n").encode('latin-1')
+        parts.append((prefix, start, end))
+    trailer = f"\r\n--{boundary}--\r\n".encode('latin-1')
+    length = sum(len(prefix) + end - start + 1 for prefix, start, end in parts) + len(trailer)
+    return f"multipart/byteranges; boundary={boundary}", length, parts, trailer
 
 class SimpleAtlasHandler(http.server.SimpleHTTPRequestHandler):
     """シンプルなAtlas対応ハンドラー"""
@@ -16,12 +71,21 @@ class SimpleAtlasHandler(http.server.SimpleHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Origin', '*')
         super().end_headers()
     
+    def send_header(self, keyword, value):
+        super().send_header(keyword, value)
+        # SimpleHTTPRequestHandler が Last-Modified を送るのは通常ファイルの 200 応答だけ
+        if keyword == 'Last-Modified':
+            super().send_header('Accept-Ranges', 'bytes')
+    
     def do_GET(self):
         """GETリクエストの処理をカスタマイズ"""
         try:
             # .atlasファイルの特別処理
             if self.path.endswith('.atlas'):
                 self.send_atlas_file()
+            elif self.headers.get('Range') and os.path.isfile(self.translate_path(self.path)):
+                # Range 指定のある通常ファイル
+                self.send_range_file()
             else:
                 # 通常のファイル処理
                 super().do_GET()
@@ -32,8 +96,8 @@ class SimpleAtlasHandler(http.server.SimpleHTTPRequestHandler):
     def send_atlas_file(self):
         """Atlasファイルの送信"""
         try:
-            # ファイルパスの処理
-            path = self.path.lstrip('/')
+            # ファイルパスの処理（クエリ文字列を除き、配信ディレクトリ基準で解決）
+            path = self.translate_path(self.path)
             if os.path.exists(path):
                 print(f"🔧 Serving Atlas file: {path}")
                 
@@ -41,11 +105,7 @@ class SimpleAtlasHandler(http.server.SimpleHTTPRequestHandler):
                     content = f.read()
                 
                 # レスポンス送信
-                self.send_response(200)
-                self.send_header('Content-Type', 'text/plain; charset=utf-8')
-                self.send_header('Content-Length', str(len(content.encode('utf-8'))))
-                self.end_headers()
-                self.wfile.write(content.encode('utf-8'))
+                self.send_content(content.encode('utf-8'), 'text/plain; charset=utf-8')
                 
                 print(f"✅ Atlas file served successfully: {len(content)} characters")
             else:
@@ -56,6 +116,66 @@ class SimpleAtlasHandler(http.server.SimpleHTTPRequestHandler):
             print(f"❌ Error serving atlas file: {e}")
             self.send_error(500, f"Error serving atlas file: {e}")
     
+    def send_range_file(self):
+        """Range 指定された通常ファイルの送信（範囲ごとにシークして分割コピー）"""
+        path = self.translate_path(self.path)
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            
+            def write_segment(start, end):
+                f.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    chunk = f.read(min(COPY_BUFSIZE, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+            
+            self.send_ranges(size, self.guess_type(path), write_segment)
+    
+    def send_content(self, content, ctype):
+        """メモリ上の本文送信（Range があれば 206 / 416）"""
+        body = memoryview(content)
+        self.send_ranges(len(content), ctype, lambda start, end: self.wfile.write(body[start:end + 1]))
+    
+    def send_ranges(self, size, ctype, write_segment):
+        """Range に応じて 200 / 206 / 416 を送信（本文は write_segment(start, end) で書く）"""
+        range_header = self.headers.get('Range')
+        ranges = parse_range_header(range_header, size) if range_header else None
+        
+        if ranges == []:
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        
+        if not ranges:
+            self.send_response(200)
+            self.send_header('Content-Type', ctype)
+            self.send_header('Content-Length', str(size))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.end_headers()
+            if size:
+                write_segment(0, size - 1)
+            return
+        
+        content_type, length, parts, trailer = plan_byte_ranges(ranges, size, ctype)
+        self.send_response(206)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(length))
+        if len(parts) == 1:
+            _, start, end = parts[0]
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        
+        for prefix, start, end in parts:
+            self.wfile.write(prefix)
+            write_segment(start, end)
+        self.wfile.write(trailer)
+    
     def log_message(self, format, *args):
         """ログメッセージ"""
         message = format % args
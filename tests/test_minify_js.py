@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+create_package.minify_js のログ除去の動作確認
+- 副作用のありうる引数を持つ console.log は残す
+- 呼び出しの後に式が続く場合は文を除去しない
+
+使い方:
+  python3 -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from create_package import minify_js
+
+
+def minified(source):
+    return minify_js(source)[0].strip()
+
+
+class LogRemovalTests(unittest.TestCase):
+    def test_plain_log_statement_is_removed(self):
+        self.assertEqual(minify_js("a();\nconsole.log('x', y);\nb();"), ("a();\nb();\n", 1))
+
+    def test_log_at_end_of_block_is_removed(self):
+        self.assertEqual(minified("function f(){ console.log(x) }"), "function f(){}")
+
+    def test_log_without_semicolon_before_newline_is_removed(self):
+        self.assertEqual(minified("a();\nconsole.log(x)\nb();"), "a();\nb();")
+
+    def test_warn_and_error_are_kept(self):
+        source = "console.warn(x);console.error(y);"
+        self.assertEqual(minified(source), source)
+
+    def test_log_in_expression_becomes_void(self):
+        self.assertEqual(minified("x = console.log(1), y;"), "x=void 0,y;")
+
+    def test_call_arguments_are_kept(self):
+        source = "function f(){console.log('n',counter.next());console.log(arr.pop());}"
+        self.assertEqual(minify_js(source), (source + "\n", 0))
+
+    def test_new_and_assignment_arguments_are_kept(self):
+        for source in ("console.log(new Foo);", "console.log(a=1);", "console.log(i++);"):
+            with self.subTest(source=source):
+                self.assertEqual(minified(source), source)
+
+    def test_template_substitution_with_call_is_kept(self):
+        source = "console.log(`${next()}`);"
+        self.assertEqual(minified(source), source)
+
+    def test_parentheses_inside_strings_are_not_calls(self):
+        self.assertEqual(minify_js("console.log('f(x)');"), ("\n", 1))
+
+    def test_statement_followed_by_operator_is_kept(self):
+        source = "function f(){ console.log(x) || g(); }"
+        self.assertEqual(minify_js(source), ("function f(){console.log(x)||g();}\n", 0))
+
+    def test_statement_continued_on_next_line_is_kept(self):
+        # 改行の後の "(" は前の行の呼び出し結果への呼び出しになる
+        self.assertEqual(minified("a();\nconsole.log(x)\n(c)"), "a();\nconsole.log(x)\n(c)")
+
+    def test_regex_literal_arguments_are_kept(self):
+        # 正規表現内の ")" や引用符で呼び出しの終わりを見誤らないよう、そのまま残す
+        for source in ("console.log(/\\)/,x);y();", "console.log(/\"/,x);y();"):
+            with self.subTest(source=source):
+                self.assertEqual(minify_js(source), (source + "\n", 0))
+
+    def test_comment_in_arguments_does_not_block_removal(self):
+        self.assertEqual(minify_js("console.log(x /* note */);z();"), ("z();\n", 1))
+
+    def test_slash_inside_string_does_not_block_removal(self):
+        self.assertEqual(minify_js("console.log('a/b');"), ("\n", 1))
+
+    def test_strip_logs_disabled(self):
+        self.assertEqual(minify_js("console.log(x);", strip_logs=False), ("console.log(x);\n", 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
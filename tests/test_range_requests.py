@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Range リクエストの動作確認（server.py / simple-server.py の両方）
+- 実際のアセット（PNG・JSON・atlas）と空ファイルを一時ディレクトリから配信
+- 単一範囲・サフィックス・複数範囲（multipart/byteranges）・416・空ファイルを確認
+- .atlas は両サーバーとも専用の送信処理を通るため別途確認
+
+使い方:
+  python3 -m unittest discover -s tests
+"""
+
+import functools
+import http.client
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import server
+
+# 配信する実アセット（リポジトリからのパス）
+ASSETS = [
+    "assets/spine/characters/nezumi/nezumi.png",
+    "assets/spine/characters/nezumi/nezumi.json",
+    "assets/spine/characters/nezumi/nezumi.atlas",
+]
+PNG = "/" + ASSETS[0]
+ATLAS = "/" + ASSETS[2]
+EMPTY = "/empty.bin"
+
+
+def load_simple_server():
+    """simple-server.py をモジュールとして読み込む（ファイル名にハイフンがあるため）"""
+    spec = importlib.util.spec_from_file_location("simple_server", os.path.join(ROOT, "simple-server.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class QuietSpineHandler(server.SpineHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class SendfileSpineHandler(QuietSpineHandler):
+    # 小さいファイルでも sendfile 経路を通す
+    sendfile_min_size = 1
+
+
+class CachedSpineHandler(QuietSpineHandler):
+    content_cache = server.FileContentCache()
+
+
+def parse_byteranges(content_type, body):
+    """multipart/byteranges の本文を [(Content-Range, データ)] に分解"""
+    boundary = content_type.split("boundary=", 1)[1].encode("ascii")
+    parts = []
+    for chunk in body.split(b"--" + boundary)[1:]:
+        if chunk.startswith(b"--"):
+            break
+        head, _, data = chunk[2:].partition(b"\r\n\r\n")
+        headers = dict(line.split(": ", 1) for line in head.decode("ascii").split("\r\n"))
+        parts.append((headers["Content-Range"], data[:-2]))
+    return parts
+
+
+class RangeRequestTests:
+    """各サーバー共通のテスト（handler_class / make_server をサブクラスで指定）"""
+
+    handler_class = None
+
+    @classmethod
+    def make_server(cls, handler):
+        return server.ThreadPoolHTTPServer(("127.0.0.1", 0), handler, workers=2, max_connections=4)
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tempdir = tempfile.mkdtemp(prefix="range-test-")
+        for rel_path in ASSETS:
+            target = os.path.join(cls.tempdir, rel_path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(os.path.join(ROOT, rel_path), target)
+        open(os.path.join(cls.tempdir, EMPTY.lstrip("/")), "wb").close()
+        with open(os.path.join(ROOT, ASSETS[0]), "rb") as f:
+            cls.png = f.read()
+        with open(os.path.join(ROOT, ASSETS[2]), "rb") as f:
+            cls.atlas = f.read()
+
+        handler = functools.partial(cls.handler_class, directory=cls.tempdir)
+        cls.httpd = cls.make_server(handler)
+        cls.port = cls.httpd.server_address[1]
+        cls.thread = threading.Thread(target=cls.httpd.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.httpd.shutdown()
+        cls.httpd.server_close()
+        cls.thread.join(timeout=5)
+        shutil.rmtree(cls.tempdir, ignore_errors=True)
+
+    def request(self, path, range_header=None):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+        try:
+            headers = {"Range": range_header} if range_header else {}
+            conn.request("GET", path, headers=headers)
+            response = conn.getresponse()
+            return response, response.read()
+        finally:
+            conn.close()
+
+    def test_full_response_advertises_ranges(self):
+        response, body = self.request(PNG)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("Accept-Ranges"), "bytes")
+        self.assertEqual(body, self.png)
+
+    def test_single_range(self):
+        response, body = self.request(PNG, "bytes=100-1123")
+        self.assertEqual(response.status, 206)
+        self.assertEqual(response.getheader("Content-Range"), f"bytes 100-1123/{len(self.png)}")
+        self.assertEqual(response.getheader("Content-Length"), "1024")
+        self.assertEqual(response.getheader("Accept-Ranges"), "bytes")
+        self.assertEqual(body, self.png[100:1124])
+
+    def test_open_ended_range(self):
+        start = len(self.png) - 10
+        response, body = self.request(PNG, f"bytes={start}-")
+        self.assertEqual(response.status, 206)
+        self.assertEqual(body, self.png[start:])
+
+    def test_suffix_range(self):
+        response, body = self.request(PNG, "bytes=-500")
+        self.assertEqual(response.status, 206)
+        size = len(self.png)
+        self.assertEqual(response.getheader("Content-Range"), f"bytes {size - 500}-{size - 1}/{size}")
+        self.assertEqual(body, self.png[-500:])
+
+    def test_suffix_range_longer_than_file(self):
+        response, body = self.request(PNG, f"bytes=-{len(self.png) * 2}")
+        self.assertEqual(response.status, 206)
+        self.assertEqual(body, self.png)
+
+    def test_multiple_ranges(self):
+        response, body = self.request(PNG, "bytes=0-9, 2000-2099, -16")
+        self.assertEqual(response.status, 206)
+        content_type = response.getheader("Content-Type")
+        self.assertTrue(content_type.startswith("multipart/byteranges; boundary="))
+        self.assertIsNone(response.getheader("Content-Range"))
+        self.assertEqual(int(response.getheader("Content-Length")), len(body))
+
+        size = len(self.png)
+        self.assertEqual(parse_byteranges(content_type, body), [
+            (f"bytes 0-9/{size}", self.png[0:10]),
+            (f"bytes 2000-2099/{size}", self.png[2000:2100]),
+            (f"bytes {size - 16}-{size - 1}/{size}", self.png[-16:]),
+        ])
+
+    def test_overlapping_ranges_are_merged(self):
+        response, body = self.request(PNG, "bytes=0-99,50-199")
+        self.assertEqual(response.status, 206)
+        self.assertEqual(response.getheader("Content-Range"), f"bytes 0-199/{len(self.png)}")
+        self.assertEqual(body, self.png[:200])
+
+    def test_unsatisfiable_range(self):
+        size = len(self.png)
+        response, body = self.request(PNG, f"bytes={size}-{size + 100}")
+        self.assertEqual(response.status, 416)
+        self.assertEqual(response.getheader("Content-Range"), f"bytes */{size}")
+        self.assertEqual(body, b"")
+
+    def test_malformed_range_is_ignored(self):
+        response, body = self.request(PNG, "bytes=abc")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body, self.png)
+
+    def test_atlas_single_range(self):
+        response, body = self.request(ATLAS, "bytes=10-109")
+        self.assertEqual(response.status, 206)
+        self.assertTrue(response.getheader("Content-Type").startswith("text/plain"))
+        self.assertEqual(response.getheader("Content-Range"), f"bytes 10-109/{len(self.atlas)}")
+        self.assertEqual(body, self.atlas[10:110])
+
+    def test_atlas_suffix_range(self):
+        response, body = self.request(ATLAS, "bytes=-50")
+        self.assertEqual(response.status, 206)
+        self.assertEqual(body, self.atlas[-50:])
+
+    def test_atlas_multiple_ranges(self):
+        response, body = self.request(ATLAS, "bytes=0-4,100-119")
+        self.assertEqual(response.status, 206)
+        content_type = response.getheader("Content-Type")
+        self.assertTrue(content_type.startswith("multipart/byteranges; boundary="))
+        self.assertEqual(int(response.getheader("Content-Length")), len(body))
+        size = len(self.atlas)
+        self.assertEqual(parse_byteranges(content_type, body), [
+            (f"bytes 0-4/{size}", self.atlas[0:5]),
+            (f"bytes 100-119/{size}", self.atlas[100:120]),
+        ])
+
+    def test_atlas_unsatisfiable_range(self):
+        size = len(self.atlas)
+        response, body = self.request(ATLAS, f"bytes={size}-")
+        self.assertEqual(response.status, 416)
+        self.assertEqual(response.getheader("Content-Range"), f"bytes */{size}")
+        self.assertEqual(body, b"")
+
+    def test_atlas_without_range(self):
+        response, body = self.request(ATLAS)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body, self.atlas)
+
+    def test_empty_file_without_range(self):
+        response, body = self.request(EMPTY)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body, b"")
+
+    def test_empty_file_suffix_range(self):
+        response, body = self.request(EMPTY, "bytes=-5")
+        self.assertEqual(response.status, 416)
+        self.assertEqual(response.getheader("Content-Range"), "bytes */0")
+        self.assertEqual(body, b"")
+
+    def test_empty_file_open_range(self):
+        response, _ = self.request(EMPTY, "bytes=0-")
+        self.assertEqual(response.status, 416)
+        self.assertEqual(response.getheader("Content-Range"), "bytes */0")
+
+
+class SpineServerRangeTests(RangeRequestTests, unittest.TestCase):
+    handler_class = QuietSpineHandler
+
+
+class SpineServerSendfileRangeTests(RangeRequestTests, unittest.TestCase):
+    handler_class = SendfileSpineHandler
+
+
+class SpineServerCachedRangeTests(RangeRequestTests, unittest.TestCase):
+    handler_class = CachedSpineHandler
+
+
+class SimpleServerRangeTests(RangeRequestTests, unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        simple_server = load_simple_server()
+
+        class QuietSimpleHandler(simple_server.SimpleAtlasHandler):
+            def log_message(self, format, *args):
+                pass
+
+        cls.handler_class = QuietSimpleHandler
+        super().setUpClass()
+
+    @classmethod
+    def make_server(cls, handler):
+        return server.socketserver.ThreadingTCPServer(("127.0.0.1", 0), handler)
+
+
+if __name__ == "__main__":
+    unittest.main()